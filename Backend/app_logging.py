@@ -0,0 +1,227 @@
+"""
+Structured logging for the server and update_database.py.
+
+configure() sends every logger through one QueueHandler. The calling
+thread only formats the message (and the traceback, if there is one)
+and puts the record on a bounded queue. A QueueListener thread does the
+actual writing to stdout. A request therefore never waits on stdout. If
+the writer falls behind by LOG_QUEUE_SIZE records, new records are
+dropped and counted instead of blocking.
+
+Each record is written as one JSON object per line: ts, level, logger,
+msg, request_id, any `extra={...}` fields, and exc when there is a
+traceback. LOG_FORMAT=text gives plain lines for reading at a terminal.
+
+init_app() gives each request an id. It is taken from an incoming
+X-Request-ID header, or generated otherwise, and echoed back on the
+response. Every record logged while handling the request carries it.
+
+LOG_SAMPLE="typeahead=100,server=10" keeps 1 in N records below WARNING
+from those loggers and their children. Kept records carry a `sampled`
+field holding N. Warnings and errors are never sampled.
+"""
+
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'request_id'}
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+access_log = logging.getLogger('access')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the current request's id on each record, in the calling thread before it is queued"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps 1 in N records below WARNING from the configured loggers"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates  # logger name -> N
+        self._counters = {name: itertools.count() for name in rates}
+
+    @classmethod
+    def parse(cls, spec):
+        rates = {}
+        for part in (spec or '').split(','):
+            if '=' in part:
+                name, rate = part.split('=', 1)
+                if int(rate) > 1:
+                    rates[name.strip()] = int(rate)
+        return cls(rates)
+
+    def _rule(self, name):
+        while name:
+            if name in self.rates:
+                return name
+            name = name.rpartition('.')[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rule = self._rule(record.name)
+        if rule is None:
+            return True
+        if next(self._counters[rule]) % self.rates[rule]:
+            return False
+        record.sampled = self.rates[rule]
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records rather than wait when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render args and the traceback here, while the frames still exist; keep extras intact
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # at shutdown, wait for room rather than fail on a full queue
+
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _start_listener(output):
+    global _listener
+    _listener = _Listener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The writer thread does not survive fork(); give the child its own queue and thread
+    if _handler is not None:
+        output = _listener.handlers[0]
+        _handler.queue = queue.Queue(_handler.queue.maxsize)
+        _start_listener(output)
+
+
+def configure(level=None, fmt=None, sample=None, stream=None):
+    """Route all logging through the background writer; safe to call more than once"""
+    global _handler
+    with _lock:
+        if _handler is not None:
+            return _handler
+        output = logging.StreamHandler(stream or sys.stdout)
+        fmt = fmt or os.environ.get('LOG_FORMAT', 'json')
+        output.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+
+        _handler = NonBlockingQueueHandler(queue.Queue(int(os.environ.get('LOG_QUEUE_SIZE', 10000))))
+        _handler.addFilter(SamplingFilter.parse(sample if sample is not None else os.environ.get('LOG_SAMPLE')))
+        _handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger()
+        root.handlers[:] = [_handler]
+        root.setLevel((level or os.environ.get('LOG_LEVEL', 'INFO')).upper())
+
+        _start_listener(output)
+        atexit.register(shutdown)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_after_fork)
+        return _handler
+
+
+def shutdown():
+    """Flush queued records; called at exit"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def dropped():
+    """Records discarded because the queue was full"""
+    return _handler.dropped if _handler is not None else 0
+
+
+def init_app(app):
+    """Request ids on g, records and the X-Request-ID header, plus a DEBUG access line per request"""
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get('X-Request-ID', '')
+        g.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        g.log_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        if 'log_started' in g and access_log.isEnabledFor(logging.DEBUG):
+            access_log.debug('%s %s %s', request.method, request.path, response.status_code,
+                             extra={'status': response.status_code,
+                                    'duration_ms': round((time.perf_counter() - g.log_started) * 1000, 3)})
+        return response
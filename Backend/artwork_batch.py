@@ -0,0 +1,217 @@
+"""
+Batch updates and deletes of a user's own artworks, for POST /artworks/batch.
+
+The body is {"operations": [{"op": "update", "id": 1, "price": 120}, {"op":
+"delete", "id": 2}, ...]}. Updates are partial: only the fields given
+change. The whole batch is one transaction, and the SQL is set-based
+whatever the batch size:
+
+- one SELECT ... FOR UPDATE reads and locks every target row;
+- one UPDATE sets each column with CASE id WHEN ... over all the updates;
+- one DELETE removes every deleted row;
+- one user_stats delta covers the whole batch.
+
+Both write statements also filter on created_by, so rows are only
+changed when they belong to the caller. Every operation gets its own
+result, in request order. The statuses are updated, deleted, not_found,
+forbidden and invalid. Invalid, missing and foreign rows are skipped,
+and the rest of the batch still applies.
+
+`status` can't be edited here. It belongs to purchases and reservations
+(purchase.py, reservations.py), which set it together with the sale or
+the hold's reserved_by/reserved_until.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+import user_stats
+from artwork_import import MAX_PRICE
+
+MAX_OPERATIONS = 1000
+
+
+class InvalidBatchRequest(ValueError):
+    """Raised when the body as a whole can't be used"""
+
+
+def _title(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError('title must be a non-empty string')
+    if len(value) > 255:
+        raise ValueError('title is longer than 255 characters')
+    return value
+
+
+def _optional_text(max_length):
+    def clean(value):
+        if value is not None and not isinstance(value, str):
+            raise ValueError('must be a string or null')
+        if max_length and value and len(value) > max_length:
+            raise ValueError(f'is longer than {max_length} characters')
+        return value
+    return clean
+
+
+def _price(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError('price must be a number')
+    try:
+        price = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError('price must be a number')
+    if not price.is_finite() or price < 0 or price > MAX_PRICE:
+        raise ValueError(f'price must be between 0 and {MAX_PRICE}')
+    return price
+
+
+def _reference(value):
+    if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+        raise ValueError('must be an integer id or null')
+    return value
+
+
+# Updatable column -> validator; the UPDATE sets them in this order
+UPDATABLE = {
+    'title': _title,
+    'description': _optional_text(None),
+    'price': _price,
+    'image_url': _optional_text(500),
+    'category_id': _reference,
+    'artist_id': _reference,
+}
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def parse_operations(body):
+    """One item dict per requested operation; malformed ones already carry status 'invalid'"""
+    operations = body.get('operations') if isinstance(body, dict) else None
+    if not isinstance(operations, list):
+        raise InvalidBatchRequest('Body must be {"operations": [...]}')
+    if len(operations) > MAX_OPERATIONS:
+        raise InvalidBatchRequest(f'At most {MAX_OPERATIONS} operations per batch')
+
+    items, seen = [], set()
+    for raw in operations:
+        item = {'id': None, 'op': None}
+        items.append(item)
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError('Each operation must be an object')
+            item['op'] = raw.get('op')
+            if item['op'] not in ('update', 'delete'):
+                raise ValueError("op must be 'update' or 'delete'")
+            item['id'] = raw.get('id')
+            if not isinstance(item['id'], int) or isinstance(item['id'], bool) or item['id'] < 1:
+                raise ValueError('id must be a positive integer')
+            if item['id'] in seen:
+                raise ValueError('id appears more than once in the batch')
+            seen.add(item['id'])
+            if item['op'] == 'update':
+                unknown = sorted(set(raw) - set(UPDATABLE) - {'op', 'id'})
+                if unknown:
+                    raise ValueError(f'Unknown field: {unknown[0]}')
+                fields = {}
+                for name, clean in UPDATABLE.items():
+                    if name in raw:
+                        try:
+                            fields[name] = clean(raw[name])
+                        except ValueError as e:
+                            message = str(e)
+                            raise ValueError(message if message.startswith(name) else f'{name} {message}')
+                if not fields:
+                    raise ValueError('Nothing to update')
+                item['fields'] = fields
+        except ValueError as e:
+            item['status'], item['error'] = 'invalid', str(e)
+    return items
+
+
+def _existing(cursor, table, ids):
+    if not ids:
+        return set()
+    cursor.execute(f'SELECT id FROM {table} WHERE id IN ({_placeholders(ids)})', tuple(ids))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply(cursor, user_id, items):
+    """Apply parsed items inside the caller's transaction, setting each item's status"""
+    pending = [item for item in items if 'status' not in item]
+    if not pending:
+        return
+    ids = [item['id'] for item in pending]
+    cursor.execute(f'SELECT id, created_by, price FROM artworks WHERE id IN ({_placeholders(ids)}) FOR UPDATE',
+                   tuple(ids))
+    rows = {row[0]: row for row in cursor.fetchall()}
+
+    # Unknown category/artist ids would fail the whole UPDATE on its foreign key
+    categories = _existing(cursor, 'categories', {item['fields']['category_id'] for item in pending
+                                                   if item['op'] == 'update'
+                                                   and item['fields'].get('category_id') is not None})
+    artists = _existing(cursor, 'artists', {item['fields']['artist_id'] for item in pending
+                                             if item['op'] == 'update'
+                                             and item['fields'].get('artist_id') is not None})
+
+    updates, deletes = [], []
+    for item in pending:
+        row = rows.get(item['id'])
+        if row is None:
+            item['status'] = 'not_found'
+        elif row[1] != user_id:
+            item['status'] = 'forbidden'
+        elif item['op'] == 'delete':
+            deletes.append(item)
+        elif item['fields'].get('category_id') not in categories | {None}:
+            item['status'], item['error'] = 'invalid', f"Unknown category_id: {item['fields']['category_id']}"
+        elif item['fields'].get('artist_id') not in artists | {None}:
+            item['status'], item['error'] = 'invalid', f"Unknown artist_id: {item['fields']['artist_id']}"
+        else:
+            updates.append(item)
+
+    total_value = Decimal(0)
+    if updates:
+        assignments, params = [], []
+        for column in UPDATABLE:
+            changing = [item for item in updates if column in item['fields']]
+            if not changing:
+                continue
+            assignments.append(f"{column} = CASE id {' '.join(['WHEN %s THEN %s'] * len(changing))} "
+                               f"ELSE {column} END")
+            for item in changing:
+                params += (item['id'], item['fields'][column])
+        update_ids = [item['id'] for item in updates]
+        cursor.execute(f"UPDATE artworks SET {', '.join(assignments)} "
+                       f"WHERE created_by = %s AND id IN ({_placeholders(update_ids)})",
+                       (*params, user_id, *update_ids))
+        for item in updates:
+            item['status'] = 'updated'
+            if 'price' in item['fields']:
+                total_value += (user_stats.as_amount(item['fields']['price'])
+                                - user_stats.as_amount(rows[item['id']][2]))
+
+    sales_count, earnings = 0, Decimal(0)
+    if deletes:
+        delete_ids = [item['id'] for item in deletes]
+        # Completed sales of these artworks cascade away with them
+        cursor.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM transactions
+            WHERE artwork_id IN ({_placeholders(delete_ids)}) AND status = 'completed'
+        ''', tuple(delete_ids))
+        sales_count, earnings = cursor.fetchone()
+        cursor.execute(f'DELETE FROM artworks WHERE created_by = %s AND id IN ({_placeholders(delete_ids)})',
+                       (user_id, *delete_ids))
+        for item in deletes:
+            item['status'] = 'deleted'
+            total_value -= user_stats.as_amount(rows[item['id']][2])
+
+    user_stats.apply_delta(cursor, user_id, artwork_count=-len(deletes), total_value=total_value,
+                           sales_count=-sales_count, total_earnings=-earnings)
+
+
+def results(items):
+    """Per-operation results for the response, in request order"""
+    return [{key: item[key] for key in ('id', 'op', 'status', 'error') if key in item} for item in items]
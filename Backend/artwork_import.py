@@ -0,0 +1,295 @@
+"""
+Bulk artwork import for POST /artworks/import.
+
+The body is CSV with a header row or NDJSON (one object per line), read
+as a stream. Rows are validated and collected into batches of
+IMPORT_BATCH_SIZE. Each batch does four things:
+
+- resolves its category and artist names (or ids) with one query per
+  table, for values not already seen earlier in the import;
+- inserts with a single executemany() (one multi-row INSERT), whose
+  ids are taken as lastrowid onwards. That needs the server's
+  innodb_autoinc_lock_mode at 0 or 1 (consecutive allocation for
+  multi-row inserts); at 2 concurrent inserts can interleave ids;
+- applies its user_stats delta;
+- commits.
+
+A batch the database rejects is retried row by row, so only the bad rows
+fail. Errors are reported per line, and batches committed before a fatal
+error stay committed.
+
+Columns: title (required), description, price, image_url, status, and
+category / artist by name or category_id / artist_id. Artworks are
+imported as available; a sold or reserved row is rejected, since only a
+sale or a hold sets that status, together with its transaction or
+reserved_until.
+"""
+
+import csv
+import io
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from mysql.connector import errors as db_errors
+
+import user_stats
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+MAX_ERRORS = 1000  # per-row errors included in the report; the rest are only counted
+
+STATUSES = ('available', 'sold', 'reserved')
+MAX_PRICE = Decimal('99999999.99')  # DECIMAL(10,2)
+FORMATS = {
+    'csv': 'csv',
+    'text/csv': 'csv',
+    'ndjson': 'ndjson',
+    'jsonl': 'ndjson',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+
+class InvalidImportRequest(Exception):
+    """The request can't be imported at all (as opposed to a bad row)"""
+
+
+def import_format(name, content_type):
+    """'csv' or 'ndjson' from ?format= or the Content-Type"""
+    key = (name or content_type or '').split(';')[0].strip().lower()
+    if key not in FORMATS:
+        raise InvalidImportRequest('Send CSV or NDJSON (format=csv|ndjson or a text/csv / '
+                                   'application/x-ndjson Content-Type)')
+    return FORMATS[key]
+
+
+def read_records(stream, fmt):
+    """(line number, record dict or error message) for each record of a byte stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for record in reader:
+                if None in record:
+                    yield reader.line_num, 'More values than header columns'
+                else:
+                    yield reader.line_num, record
+            return
+        for line_number, line in enumerate(text, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, f'Invalid JSON: {e}'
+                continue
+            if isinstance(record, dict):
+                yield line_number, record
+            else:
+                yield line_number, 'Expected a JSON object'
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise InvalidImportRequest(f'Unreadable {fmt} body: {e}')
+    finally:
+        text.detach()  # leave the request stream to the server
+
+
+def _text(record, name, max_length=None, required=False):
+    value = record.get(name)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f'{name} is required')
+        return None
+    value = str(value).strip()
+    if max_length and len(value) > max_length:
+        raise ValueError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def _price(record):
+    raw = record.get('price')
+    if raw is None or raw == '':
+        return None
+    try:
+        price = Decimal(str(raw).strip())
+    except InvalidOperation:
+        raise ValueError(f'price is not a number: {raw}')
+    if not price.is_finite() or price < 0 or price > MAX_PRICE:
+        raise ValueError(f'price must be between 0 and {MAX_PRICE}')
+    return price
+
+
+def _reference(record, name):
+    """('id', n) or ('name', text) for a category/artist column, or None"""
+    raw_id = record.get(f'{name}_id')
+    if raw_id is not None and raw_id != '':
+        try:
+            return 'id', int(raw_id)
+        except (TypeError, ValueError):
+            raise ValueError(f'{name}_id must be an integer')
+    label = _text(record, name, max_length=100)
+    return ('name', label) if label else None
+
+
+def parse_record(record):
+    """Validated (title, description, price, image_url, status, category ref, artist ref)"""
+    status = _text(record, 'status') or 'available'
+    if status not in STATUSES:
+        raise ValueError(f'Unknown status: {status}')
+    if status != 'available':
+        raise ValueError(f"status {status} can't be imported; only a sale or a hold sets it")
+    return (_text(record, 'title', max_length=255, required=True),
+            _text(record, 'description'),
+            _price(record),
+            _text(record, 'image_url', max_length=500),
+            status,
+            _reference(record, 'category'),
+            _reference(record, 'artist'))
+
+
+class LookupCache:
+    """Category or artist ids resolved so far in one import"""
+
+    def __init__(self, table, label, user_id):
+        self.table = table
+        self.label = label
+        self.user_id = user_id
+        self.names = {}  # lowercased name -> id, or None when there is no such row
+        self.ids = {}    # id -> whether the row exists
+
+    def resolve(self, cursor, references):
+        """Look up every name and id not seen before, one query each"""
+        names = {value.lower() for kind, value in references if kind == 'name'} - self.names.keys()
+        if names:
+            # Names are not unique; the importer's own row wins, then the oldest
+            cursor.execute(f'''
+                SELECT id, name FROM {self.table}
+                WHERE name IN ({', '.join(['%s'] * len(names))})
+                ORDER BY created_by = %s DESC, id
+            ''', (*names, self.user_id))
+            for row_id, name in cursor.fetchall():
+                self.names.setdefault(name.lower(), row_id)
+            for name in names:
+                self.names.setdefault(name, None)
+        ids = {value for kind, value in references if kind == 'id'} - self.ids.keys()
+        if ids:
+            cursor.execute(f"SELECT id FROM {self.table} WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                           tuple(ids))
+            found = {row[0] for row in cursor.fetchall()}
+            self.ids.update((row_id, row_id in found) for row_id in ids)
+
+    def get(self, reference):
+        if reference is None:
+            return None
+        kind, value = reference
+        row_id = self.names.get(value.lower()) if kind == 'name' else (value if self.ids.get(value) else None)
+        if row_id is None:
+            raise ValueError(f'Unknown {self.label}: {value}' if kind == 'name'
+                             else f'Unknown {self.label}_id: {value}')
+        return row_id
+
+
+class ArtworkImport:
+    """One import run for one user over one connection"""
+
+    def __init__(self, conn, user_id, dry_run=False, batch_size=IMPORT_BATCH_SIZE,
+                 artworks='artworks', on_commit=None):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.user_id = user_id
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.artworks = artworks
+        self.on_commit = on_commit  # called with [(id, title), ...] after each committed batch
+        self.categories = LookupCache('categories', 'category', user_id)
+        self.artists = LookupCache('artists', 'artist', user_id)
+        self.report = {'imported': 0, 'failed': 0, 'errors': [], 'batches': 0, 'dry_run': dry_run}
+        self.bad_request = False  # the report's error is the client's body, not the database
+
+    def fail(self, line, message):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < MAX_ERRORS:
+            self.report['errors'].append({'line': line, 'error': message})
+
+    def run(self, records):
+        """Import (line, record) pairs from read_records(); returns the report"""
+        started = time.perf_counter()
+        batch = []
+        try:
+            for line, record in records:
+                if isinstance(record, str):
+                    self.fail(line, record)
+                    continue
+                try:
+                    batch.append((line, parse_record(record)))
+                except ValueError as e:
+                    self.fail(line, str(e))
+                    continue
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+            self._flush(batch)
+        except InvalidImportRequest as e:
+            self.report['error'] = str(e)
+            self.bad_request = True
+        except Exception as e:
+            # Batches committed before this stay imported
+            self.report['error'] = f'Import stopped: {e}'
+        finally:
+            self.cursor.close()
+        self.report['errors'].sort(key=lambda error: error['line'])  # name lookups fail a batch later
+        seconds = time.perf_counter() - started
+        self.report['seconds'] = round(seconds, 3)
+        self.report['rows_per_second'] = round(self.report['imported'] / seconds) if seconds else 0
+        return self.report
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        self.categories.resolve(self.cursor, [parsed[5] for _, parsed in batch if parsed[5]])
+        self.artists.resolve(self.cursor, [parsed[6] for _, parsed in batch if parsed[6]])
+        rows = []
+        for line, (title, description, price, image_url, status, category, artist) in batch:
+            try:
+                rows.append((line, (title, description, price, image_url,
+                                    self.categories.get(category), self.artists.get(artist),
+                                    self.user_id, status)))
+            except ValueError as e:
+                self.fail(line, str(e))
+        if not rows:
+            return
+        if self.dry_run:
+            self.report['imported'] += len(rows)
+            return
+        self.report['batches'] += 1
+        try:
+            self._insert(rows)
+        except (db_errors.IntegrityError, db_errors.DataError):
+            self.conn.rollback()
+            for line, values in rows:  # find the offending rows and keep the rest
+                try:
+                    self._insert([(line, values)])
+                except (db_errors.IntegrityError, db_errors.DataError) as e:
+                    self.conn.rollback()
+                    self.fail(line, str(e))
+
+    def _insert(self, rows):
+        """Insert rows and their user_stats delta in one transaction"""
+        self.cursor.executemany(f'''
+            INSERT INTO {self.artworks}
+                (title, description, price, image_url, category_id, artist_id, created_by, status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ''', [values for _, values in rows])
+        # One multi-row INSERT: lastrowid is its first id and, with innodb_autoinc_lock_mode
+        # 0 or 1, the rest follow consecutively in VALUES order, whatever else is inserting
+        first_id, count = self.cursor.lastrowid, self.cursor.rowcount
+        user_stats.apply_delta(self.cursor, self.user_id, artwork_count=len(rows),
+                               total_value=sum(values[2] or 0 for _, values in rows))
+        inserted = []
+        if first_id and count == len(rows):
+            inserted = [(first_id + i, values[0]) for i, (_, values) in enumerate(rows)]
+        self.conn.commit()
+        self.report['imported'] += len(rows)
+        if self.on_commit:
+            self.on_commit(inserted)
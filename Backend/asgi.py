@@ -0,0 +1,181 @@
+"""
+Optional ASGI entry point: `uvicorn asgi:app --workers 4`.
+
+Under WSGI every request holds a worker thread while it waits on
+MySQL. This app instead serves the DB-bound dashboard routes natively
+on asyncio, using an aiomysql pool, so a waiting request costs a
+coroutine rather than a thread:
+
+- GET /dashboard/stats and GET /dashboard/artist-stats run the
+  branches of their UNION ALL (see dashboard_stats.py) concurrently on
+  separate pooled connections. The response is the one the Flask route
+  builds, cached in the same stats_cache.
+
+Every other route, and any dashboard request without a valid Bearer
+token (session cookies are a Flask feature), goes to the Flask app
+through asgiref's WsgiToAsgi, which runs it in a thread pool as before.
+Without aiomysql, the whole Flask app is served that way.
+
+Needs `pip install asgiref uvicorn`, plus `aiomysql` for the native
+routes. ASYNC_DB_POOL_SIZE (default 20) caps the aiomysql pool per
+process.
+"""
+
+import asyncio
+import fnmatch
+import logging
+import os
+import re
+import time
+import uuid
+
+import dashboard_stats
+
+try:
+    import aiomysql  # optional; without it every route goes through WSGI
+except ImportError:
+    aiomysql = None
+
+from asgiref.wsgi import WsgiToAsgi
+
+log = logging.getLogger(__name__)
+
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+
+_LITERAL_PERCENT = re.compile(r'%(?!s)')
+
+
+def pymysql_sql(sql):
+    """PyMySQL interpolates with %, so literal % signs (DATE_FORMAT patterns) are doubled"""
+    return _LITERAL_PERCENT.sub('%%', sql)
+
+
+def aiomysql_config(config):
+    """server.DB_CONFIG in aiomysql's keyword names"""
+    return {'host': config['host'], 'port': int(config['port']), 'user': config['user'],
+            'password': config['password'], 'db': config['database'], 'autocommit': True}
+
+
+def allowed_origin(origin, patterns):
+    """The Origin to echo back if it matches one of the CORS patterns ('*' globs allowed)"""
+    if origin and any(fnmatch.fnmatchcase(origin.lower(), p.lower()) for p in patterns):
+        return origin
+    return None
+
+
+class AsyncApp:
+    """Natively async dashboard routes on an async pool; everything else through the Flask app"""
+
+    def __init__(self, flask_app, create_pool, auth, stats_cache, dumps,
+                 cors_origins=(), instrumentation=None):
+        self.wsgi = WsgiToAsgi(flask_app)
+        self._create_pool = create_pool  # coroutine function returning an aiomysql-style pool
+        self.pool = None
+        self._pool_lock = asyncio.Lock()
+        self.auth = auth
+        self.stats_cache = stats_cache
+        self.dumps = dumps
+        self.cors_origins = cors_origins
+        self.instrumentation = instrumentation
+        self.routes = {
+            ('GET', '/dashboard/stats'): (
+                'dashboard/stats', dashboard_stats.COLLECTOR_BRANCHES, dashboard_stats.collector_stats_from_rows),
+            ('GET', '/dashboard/artist-stats'): (
+                'dashboard/artist-stats', dashboard_stats.ARTIST_BRANCHES, dashboard_stats.artist_stats_from_rows),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        route = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if route is not None:
+            headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+            user_id = self._bearer_user(headers)
+            if user_id is not None:
+                return await self._dashboard(scope, send, headers, user_id, *route)
+        return await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.pool is not None:
+                    self.pool.close()
+                    await self.pool.wait_closed()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _get_pool(self):
+        if self.pool is None:
+            async with self._pool_lock:
+                if self.pool is None:
+                    self.pool = await self._create_pool()
+        return self.pool
+
+    def _bearer_user(self, headers):
+        authorization = headers.get('authorization', '')
+        if not authorization.startswith('Bearer '):
+            return None
+        payload = self.auth.verify_token(authorization[len('Bearer '):])
+        return payload['user_id'] if payload else None
+
+    async def _fetch(self, pool, sql, user_id):
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(pymysql_sql(sql), dashboard_stats.params(sql, user_id))
+                return [dict(zip(dashboard_stats.ROW_COLUMNS, row)) for row in await cursor.fetchall()]
+
+    async def _dashboard(self, scope, send, headers, user_id, endpoint, branches, build):
+        started = time.perf_counter()
+        try:
+            # The cache may be Redis; keep its round trip off the event loop
+            result = await asyncio.to_thread(self.stats_cache.get, endpoint, user_id)
+            if result is None:
+                generation = self.stats_cache.generation(user_id)
+                pool = await self._get_pool()
+                sections = await asyncio.gather(*(self._fetch(pool, sql, user_id) for sql in branches))
+                result = build([row for rows in sections for row in rows])
+                await asyncio.to_thread(self.stats_cache.set, endpoint, user_id, result, generation)
+            status, body = 200, result
+        except Exception as e:
+            log.exception("Async %s error: %s", endpoint, e)
+            status, body = 500, {'error': str(e)}
+
+        response_headers = [(b'content-type', b'application/json'),
+                            (b'x-request-id', uuid.uuid4().hex.encode('ascii'))]
+        origin = allowed_origin(headers.get('origin'), self.cors_origins)
+        if origin:
+            response_headers += [(b'access-control-allow-origin', origin.encode('latin-1')),
+                                 (b'access-control-allow-credentials', b'true'),
+                                 (b'vary', b'Origin')]
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': self.dumps(body).encode('utf-8')})
+        if self.instrumentation is not None:
+            self.instrumentation.record_request(scope['method'], scope['path'], status,
+                                                time.perf_counter() - started)
+
+
+def create_app():
+    import server
+
+    if aiomysql is None:
+        log.warning("aiomysql is not installed; serving every route through the WSGI app")
+        return WsgiToAsgi(server.app)
+
+    async def create_pool():
+        return await aiomysql.create_pool(minsize=1, maxsize=ASYNC_DB_POOL_SIZE,
+                                          **aiomysql_config(server.DB_CONFIG))
+
+    return AsyncApp(server.app, create_pool, server.auth, server.stats_cache, server.app.json.dumps,
+                    cors_origins=server.CORS_ORIGINS, instrumentation=server.instrumentation)
+
+
+def __getattr__(name):
+    # `uvicorn asgi:app` builds the app (and imports server) on first access
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(name)
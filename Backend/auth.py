@@ -0,0 +1,268 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+import jwt
+from flask import g, jsonify, request, session
+
+log = logging.getLogger(__name__)
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified JWT payloads, keyed by token digest, kept until each token's exp"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # digest -> payload
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is None:
+                return None
+            if payload.get('exp', 0) <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return payload
+
+    def put(self, digest, payload):
+        if not isinstance(payload.get('exp'), (int, float)):
+            return  # without an exp there's no point at which the entry may be dropped
+        with self._lock:
+            self._entries[digest] = payload
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedRevocations:
+    """Revoked-token keys in anonymous shared memory, inherited by forked workers.
+
+    Created at import, so under gunicorn_conf.py's preload every worker on
+    the host sees every revocation. It is a fixed hash table of 64-bit key
+    digests and expiry times. A slot whose entry has expired is reused.
+    A key is stored within `probes` slots of its hash. If none of them is
+    free, the entry closest to expiring is overwritten, and a warning is
+    logged: size the table (REVOKED_TOKENS_MAX) above the logouts expected
+    within a token lifetime.
+    """
+
+    def __init__(self, slots=65536, probes=32):
+        self.slots = slots
+        self.probes = min(probes, slots)
+        self._keys = multiprocessing.RawArray('q', slots)  # 0 = never used
+        self._expires = multiprocessing.RawArray('d', slots)
+        self._lock = multiprocessing.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(slots=int(os.environ.get('REVOKED_TOKENS_MAX', 65536)))
+
+    @staticmethod
+    def _digest(key):
+        digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+        return digest or 1
+
+    def _slots_for(self, digest):
+        start = digest % self.slots
+        return [(start + i) % self.slots for i in range(self.probes)]
+
+    def set(self, key, value, ttl):
+        """Cache-backend interface: remember `key` for `ttl` seconds (`value` is ignored)"""
+        digest, now = self._digest(key), time.time()
+        # A worker killed inside this block would leave the lock held for good
+        locked = self._lock.acquire(timeout=1)
+        try:
+            candidates = self._slots_for(digest)
+            free = [i for i in candidates if self._keys[i] in (0, digest) or self._expires[i] <= now]
+            if free:
+                slot = free[0]
+            else:
+                slot = min(candidates, key=lambda i: self._expires[i])
+                log.warning("Revoked token table is full; dropped a revocation expiring in %.0fs",
+                            self._expires[slot] - now)
+            self._keys[slot] = digest
+            self._expires[slot] = now + ttl
+        finally:
+            if locked:
+                self._lock.release()
+
+    def get(self, key):
+        digest, now = self._digest(key), time.time()
+        for i in self._slots_for(digest):
+            if self._keys[i] == 0:
+                return None
+            if self._keys[i] == digest and self._expires[i] > now:
+                return 1
+        return None
+
+
+class TokenDenylist:
+    """Revoked token ids (jti) until their exp.
+
+    Revocations are checked in-process first, then in the shared backend:
+    SharedRevocations for the workers on one host (the default from
+    Authenticator.from_env), or the Redis cache backend across hosts.
+    """
+
+    def __init__(self, shared=None):
+        self.shared = shared
+        self._local = {}  # jti -> exp
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, exp):
+        ttl = exp - time.time()
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._local[jti] = exp
+        if self.shared is not None:
+            self.shared.set(f'revoked:{jti}', 1, ttl)
+
+    def is_revoked(self, jti):
+        with self._lock:
+            exp = self._local.get(jti)
+            if exp is not None:
+                if exp > time.time():
+                    return True
+                del self._local[jti]
+        return self.shared is not None and self.shared.get(f'revoked:{jti}') is not None
+
+
+class Authenticator:
+    """Resolves the current user from a Bearer JWT or the session cookie.
+
+    Every protected route uses require_auth; the resolved identity is on
+    g.user_id / g.user_role. Time spent resolving it is reported in a
+    Server-Timing header and in stats().
+    """
+
+    def __init__(self, secret, cache_size=10000, denylist_backend=None, token_days=7):
+        self.secret = secret
+        self.token_days = token_days
+        self.verified = VerifiedTokenCache(cache_size)
+        self.denylist = TokenDenylist(denylist_backend)
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'cache_hits': 0, 'cache_misses': 0,
+                          'revoked': 0, 'rejected': 0, 'auth_seconds': 0.0}
+
+    def init_app(self, app):
+        app.after_request(self._add_server_timing)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._counters[name] += delta
+
+    def create_token(self, user_id, role):
+        """Create a JWT token for the user"""
+        now = datetime.now(timezone.utc)
+        payload = {
+            'user_id': user_id,
+            'role': role,
+            'jti': uuid.uuid4().hex,
+            'exp': now + timedelta(days=self.token_days),
+            'iat': now,
+        }
+        return jwt.encode(payload, self.secret, algorithm='HS256')
+
+    def verify_token(self, token):
+        """Verified payload for a token, or None if invalid, expired or revoked"""
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        payload = self.verified.get(digest)
+        if payload is None:
+            self._count(cache_misses=1)
+            try:
+                payload = jwt.decode(token, self.secret, algorithms=['HS256'])
+            except jwt.InvalidTokenError:  # includes ExpiredSignatureError
+                self._count(rejected=1)
+                return None
+            self.verified.put(digest, payload)
+        else:
+            self._count(cache_hits=1)
+
+        jti = payload.get('jti')
+        if jti and self.denylist.is_revoked(jti):
+            self._count(revoked=1)
+            return None
+        return payload
+
+    def revoke(self, token):
+        """Revoke a Bearer token until it would have expired"""
+        payload = self.verify_token(token)
+        if payload and payload.get('jti'):
+            self.denylist.revoke(payload['jti'], payload.get('exp') or time.time() + self.token_days * 86400)
+
+    @staticmethod
+    def bearer_token():
+        auth_header = request.headers.get('Authorization')
+        if auth_header and auth_header.startswith('Bearer '):
+            return auth_header[len('Bearer '):]
+        return None
+
+    def current_user(self):
+        """(user_id, role) for this request, resolved once and kept on g"""
+        if 'user_id' in g:
+            return g.user_id, g.user_role
+
+        started = time.perf_counter()
+        user_id = role = None
+        # Bearer tokens (cross-domain clients) are a cache lookup once verified,
+        # so try them before deserializing the session cookie
+        token = self.bearer_token()
+        payload = self.verify_token(token) if token else None
+        if payload:
+            user_id, role = payload['user_id'], payload['role']
+        elif 'user_id' in session:
+            user_id, role = session['user_id'], session.get('role')
+
+        g.user_id, g.user_role = user_id, role
+        g.auth_seconds = time.perf_counter() - started
+        self._count(requests=1, auth_seconds=g.auth_seconds)
+        return user_id, role
+
+    def require_auth(self, f):
+        """Decorator to require authentication via JWT or session"""
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user_id, _ = self.current_user()
+            if user_id is None:
+                return jsonify({'error': 'Unauthorized'}), 401
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    @staticmethod
+    def _add_server_timing(response):
+        if 'auth_seconds' in g:
+            response.headers.add('Server-Timing', f'auth;dur={g.auth_seconds * 1000:.3f}')
+        return response
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['cached_tokens'] = len(self.verified)
+        stats['avg_auth_ms'] = (round(stats['auth_seconds'] * 1000 / stats['requests'], 4)
+                                if stats['requests'] else 0.0)
+        stats['auth_seconds'] = round(stats['auth_seconds'], 6)
+        return stats
+
+    @classmethod
+    def from_env(cls, secret, denylist_backend=None):
+        """Revocations go to `denylist_backend` (e.g. Redis), or else to shared memory for this host's workers"""
+        if denylist_backend is None:
+            denylist_backend = SharedRevocations.from_env()
+        return cls(secret, cache_size=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000)),
+                   denylist_backend=denylist_backend)
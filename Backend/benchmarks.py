@@ -0,0 +1,812 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for backend hot paths. Run one with:
+
+    python benchmarks.py <name> [options]
+
+Benchmarks that need MySQL use the same DB_* environment variables as server.py.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import time
+
+
+def db_config():
+    from server import DB_CONFIG
+    return DB_CONFIG
+
+
+def connect():
+    import mysql.connector
+    return mysql.connector.connect(**db_config())
+
+
+def report(label, samples):
+    """Print mean/p50/p99 for a list of durations in seconds"""
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<40} n={len(samples):<6} mean={statistics.mean(samples) * 1000:8.2f}ms "
+          f"p50={statistics.median(samples) * 1000:8.2f}ms p99={p99 * 1000:8.2f}ms")
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+# --- dashboard ---------------------------------------------------------------
+
+def seven_query_stats(cursor, user_id):
+    """The original per-scalar /dashboard/stats path, kept as the baseline"""
+    cursor.execute('SELECT COUNT(*) as total_categories FROM categories WHERE created_by = %s', (user_id,))
+    cursor.fetchone()
+    cursor.execute('SELECT COUNT(*) as total_artists FROM artists WHERE created_by = %s', (user_id,))
+    cursor.fetchone()
+    cursor.execute('SELECT COUNT(*) as total_artworks FROM artworks WHERE created_by = %s', (user_id,))
+    cursor.fetchone()
+    cursor.execute('SELECT COALESCE(SUM(price), 0) as total_value FROM artworks WHERE created_by = %s', (user_id,))
+    cursor.fetchone()
+    cursor.execute('''
+        SELECT c.name as category_name, COUNT(a.id) as artwork_count
+        FROM categories c
+        LEFT JOIN artworks a ON c.id = a.category_id AND a.created_by = %s
+        WHERE c.created_by = %s
+        GROUP BY c.id, c.name
+        ORDER BY artwork_count DESC
+    ''', (user_id, user_id))
+    cursor.fetchall()
+    cursor.execute('''
+        SELECT a.title, a.price, c.name as category_name, ar.name as artist_name, a.created_at
+        FROM artworks a
+        LEFT JOIN categories c ON a.category_id = c.id
+        LEFT JOIN artists ar ON a.artist_id = ar.id
+        WHERE a.created_by = %s
+        ORDER BY a.created_at DESC
+        LIMIT 5
+    ''', (user_id,))
+    cursor.fetchall()
+    cursor.execute('''
+        SELECT DATE_FORMAT(created_at, '%Y-%m') as month, COUNT(*) as count
+        FROM artworks
+        WHERE created_by = %s
+        AND created_at >= DATE_SUB(NOW(), INTERVAL 6 MONTH)
+        GROUP BY DATE_FORMAT(created_at, '%Y-%m')
+        ORDER BY month
+    ''', (user_id,))
+    cursor.fetchall()
+
+
+def bench_dashboard(args):
+    """Cold (new connection) and warm (reused connection) /dashboard/stats latency"""
+    import dashboard_stats
+
+    paths = [('seven-query', seven_query_stats), ('aggregated', dashboard_stats.collector_stats)]
+    for label, func in paths:
+        cold = []
+        for _ in range(args.cold_runs):
+            started = time.perf_counter()
+            conn = connect()
+            cursor = conn.cursor(dictionary=True)
+            func(cursor, args.user_id)
+            cold.append(time.perf_counter() - started)
+            cursor.close()
+            conn.close()
+        report(f"{label} cold", cold)
+
+        conn = connect()
+        cursor = conn.cursor(dictionary=True)
+        func(cursor, args.user_id)
+        report(f"{label} warm", [timed(func, cursor, args.user_id) for _ in range(args.runs)])
+        cursor.close()
+        conn.close()
+
+
+# --- transaction history -----------------------------------------------------
+
+OR_HISTORY_SQL = '''
+    SELECT t.id FROM bench_transactions t
+    WHERE t.buyer_id = %s OR t.seller_id = %s
+    ORDER BY t.transaction_date DESC, t.id DESC
+    LIMIT 51
+'''
+
+UNION_HISTORY_SQL = '''
+    SELECT side.id FROM (
+        (SELECT t.id, t.transaction_date FROM bench_transactions t
+         WHERE t.buyer_id = %s ORDER BY t.transaction_date DESC, t.id DESC LIMIT 51)
+        UNION ALL
+        (SELECT t.id, t.transaction_date FROM bench_transactions t
+         WHERE t.seller_id = %s AND t.buyer_id != %s ORDER BY t.transaction_date DESC, t.id DESC LIMIT 51)
+    ) side
+    ORDER BY side.transaction_date DESC, side.id DESC
+    LIMIT 51
+'''
+
+
+def fill_bench_transactions(conn, rows, users, batch=10000):
+    """Synthetic copy of transactions (same indexes, no foreign keys)"""
+    cursor = conn.cursor()
+    cursor.execute('DROP TABLE IF EXISTS bench_transactions')
+    cursor.execute('CREATE TABLE bench_transactions LIKE transactions')
+    rng = random.Random(42)
+    started = time.perf_counter()
+    for offset in range(0, rows, batch):
+        values = []
+        for _ in range(min(batch, rows - offset)):
+            buyer = rng.randint(1, users)
+            seller = rng.randint(1, users - 1)
+            seller += seller >= buyer  # never the buyer
+            values.append((buyer, seller, rng.randint(1, 100000), rng.randint(100, 50000) / 100,
+                           f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} '
+                           f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00'))
+        cursor.executemany('''
+            INSERT INTO bench_transactions (buyer_id, seller_id, artwork_id, amount, transaction_date, status)
+            VALUES (%s, %s, %s, %s, %s, 'completed')
+        ''', values)
+        conn.commit()
+    cursor.execute('ANALYZE TABLE bench_transactions')
+    cursor.fetchall()
+    cursor.close()
+    print(f"Inserted {rows} synthetic transactions in {time.perf_counter() - started:.1f}s")
+
+
+def bench_transactions(args):
+    """OR-predicate vs UNION ALL history page over --rows synthetic transactions"""
+    conn = connect()
+    if not args.reuse:
+        fill_bench_transactions(conn, args.rows, args.users)
+    cursor = conn.cursor()
+    rng = random.Random(7)
+    user_ids = [rng.randint(1, args.users) for _ in range(args.runs)]
+
+    def run(sql, params):
+        cursor.execute(sql, params)
+        cursor.fetchall()
+
+    report('OR predicate', [timed(run, OR_HISTORY_SQL, (u, u)) for u in user_ids])
+    report('UNION ALL merge', [timed(run, UNION_HISTORY_SQL, (u, u, u)) for u in user_ids])
+    cursor.close()
+    conn.close()
+
+
+# --- marketplace search ------------------------------------------------------
+
+SEARCH_WORDS = ('blue', 'river', 'portrait', 'sunset', 'abstract', 'city', 'forest', 'ocean', 'golden',
+                'silent', 'morning', 'storm', 'garden', 'mountain', 'shadow', 'light', 'winter',
+                'harbor', 'dream', 'crimson', 'meadow', 'desert', 'night', 'figure', 'still', 'life',
+                'bridge', 'window', 'horizon', 'velvet', 'marble', 'echo', 'lantern', 'willow')
+ARTIST_NAMES = ('Ada', 'Bruno', 'Chidi', 'Dana', 'Emeka', 'Frida', 'Grace', 'Hugo', 'Imani', 'Jonas',
+                'Keza', 'Luca', 'Mira', 'Nia', 'Omar', 'Pia', 'Quinn', 'Rosa', 'Sami', 'Tomas')
+
+
+def fill_bench_search(conn, rows, users, artists=20000, batch=5000):
+    """Synthetic copies of artworks/artists (no foreign keys); full-text indexes built after the load"""
+    from migrations import add_index, index_exists
+    import importlib
+    fulltext = importlib.import_module('migrations.0004_fulltext_search').FULLTEXT_INDEXES
+
+    cursor = conn.cursor()
+    rng = random.Random(42)
+    started = time.perf_counter()
+    for table in ('artworks', 'artists'):
+        cursor.execute(f'DROP TABLE IF EXISTS bench_{table}')
+        cursor.execute(f'CREATE TABLE bench_{table} LIKE {table}')
+        for _, index, _ in (f for f in fulltext if f[0] == table):
+            if index_exists(cursor, f'bench_{table}', index):
+                cursor.execute(f'ALTER TABLE bench_{table} DROP INDEX {index}')
+
+    names = [(f'{rng.choice(ARTIST_NAMES)} {rng.choice(ARTIST_NAMES)}son', rng.randint(1, users))
+             for _ in range(artists)]
+    cursor.executemany('INSERT INTO bench_artists (name, created_by) VALUES (%s, %s)', names)
+    for offset in range(0, rows, batch):
+        values = []
+        for _ in range(min(batch, rows - offset)):
+            values.append((' '.join(rng.sample(SEARCH_WORDS, 3)).title(),
+                           ' '.join(rng.choice(SEARCH_WORDS) for _ in range(20)),
+                           rng.randint(100, 1000000) / 100, rng.randint(1, 10), rng.randint(1, artists),
+                           rng.randint(1, users), rng.choice(('available',) * 8 + ('sold', 'reserved')),
+                           f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00'))
+        cursor.executemany('''
+            INSERT INTO bench_artworks (title, description, price, category_id, artist_id, created_by, status, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ''', values)
+        conn.commit()
+    print(f"Inserted {rows} synthetic artworks in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    for table, index, columns in fulltext:
+        add_index(cursor, f'bench_{table}', index, columns, kind='FULLTEXT INDEX')
+    cursor.execute('ANALYZE TABLE bench_artworks, bench_artists')
+    cursor.fetchall()
+    cursor.close()
+    print(f"Built full-text indexes in {time.perf_counter() - started:.1f}s")
+
+
+def bench_search(args):
+    """/marketplace/search over --rows synthetic artworks (e.g. --rows 500000) vs downloading everything"""
+    import marketplace_search
+
+    conn = connect()
+    if not args.reuse:
+        fill_bench_search(conn, args.rows, args.users)
+    cursor = conn.cursor()
+    rng = random.Random(7)
+    tables = {'artworks': 'bench_artworks', 'artists': 'bench_artists'}
+
+    def run_search(search_args):
+        marketplace_search.search(cursor, rng.randint(1, args.users), search_args, **tables)
+
+    def download_all():
+        cursor.execute("SELECT * FROM bench_artworks WHERE status = 'available' AND created_by != %s "
+                       "ORDER BY created_at DESC", (rng.randint(1, args.users),))
+        cursor.fetchall()
+
+    report('search q (1 word)', [timed(run_search, {'q': rng.choice(SEARCH_WORDS)})
+                                 for _ in range(args.runs)])
+    report('search q (2 words) + category + price', [
+        timed(run_search, {'q': ' '.join(rng.sample(SEARCH_WORDS, 2)), 'category_id': str(rng.randint(1, 10)),
+                           'min_price': '100', 'max_price': '5000'})
+        for _ in range(args.runs)])
+    report('search artist name', [timed(run_search, {'q': rng.choice(ARTIST_NAMES) + 'son'})
+                                  for _ in range(args.runs)])
+    report('browse (no q) + facets', [timed(run_search, {}) for _ in range(max(1, args.runs // 10))])
+    report('download whole marketplace', [timed(download_all) for _ in range(args.cold_runs)])
+    cursor.close()
+    conn.close()
+
+
+# --- typeahead ---------------------------------------------------------------
+
+def synthetic_labels(count, rng, vocabulary=20000):
+    """(kind, id, label) entries with 2-4 word labels over a Zipf-ish vocabulary"""
+    syllables = [c + v for c in 'bcdfghjklmnprstvwz' for v in 'aeiou'] + list('aeiou')
+    vocab = [''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).title()
+             for _ in range(vocabulary)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+    for row_id in range(1, count + 1):
+        kind = 'artwork' if row_id % 10 else ('artist' if row_id % 100 else 'category')
+        yield kind, row_id, ' '.join(rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(2, 4)))
+
+
+def bench_typeahead(args):
+    """Build time, memory and /typeahead lookup latency over --rows synthetic entries"""
+    import resource
+    import typeahead
+
+    rng = random.Random(42)
+    entries = list(synthetic_labels(args.rows, rng))
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = typeahead.TypeaheadIndex()
+    started = time.perf_counter()
+    index.rebuild(iter(entries))
+    built = time.perf_counter() - started
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    stats = index.stats()
+    print(f"Built {stats['entries']} entries, {stats['keys']} keys, {stats['postings']} postings "
+          f"in {built:.1f}s (peak RSS +{grown / 1024:.0f}MiB)")
+
+    # Every keystroke of randomly chosen labels: 'k', 'ka', 'kal', ...
+    queries = []
+    while len(queries) < args.runs * 10:
+        label = rng.choice(entries)[2].lower()
+        queries.extend(label[:n] for n in range(1, len(label) + 1) if not label[n - 1].isspace())
+    report('typeahead keystroke', [timed(index.search, q) for q in queries])
+    report('typeahead keystroke (artists only)', [timed(index.search, q, ('artist',)) for q in queries])
+    stats = index.stats()
+    print(f"{stats['truncated']} of {stats['searches']} searches hit the {typeahead.MAX_STEPS}-step budget")
+
+    updates = [rng.choice(entries) for _ in range(args.runs)]
+    report('incremental update', [timed(index.add, kind, row_id, label + ' Revised')
+                                  for kind, row_id, label in updates])
+
+
+# --- bulk import -------------------------------------------------------------
+
+def synthetic_import(rows, rng, categories):
+    """CSV body with a title, price, status and (when there are any) a category name per row"""
+    import csv
+    import io
+
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(['title', 'description', 'price', 'status', 'category'])
+    for _ in range(rows):
+        writer.writerow([' '.join(rng.sample(SEARCH_WORDS, 3)).title(),
+                         ' '.join(rng.choice(SEARCH_WORDS) for _ in range(12)),
+                         rng.randint(100, 1000000) / 100, 'available',
+                         rng.choice(categories) if categories else ''])
+    return text.getvalue().encode('utf-8')
+
+
+def bench_import(args):
+    """Rows/sec of the bulk import at several batch sizes vs one INSERT + commit per row (e.g. --rows 20000)"""
+    import io
+    import artwork_import
+    import user_stats
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute('DROP TABLE IF EXISTS bench_import')
+    cursor.execute('CREATE TABLE bench_import LIKE artworks')
+    cursor.execute('SELECT name FROM categories LIMIT 50')
+    categories = [row[0] for row in cursor.fetchall()]
+    body = synthetic_import(args.rows, random.Random(42), categories)
+
+    # Baseline: what create_artwork() does per request, on an already open connection
+    single = min(args.rows, 2000)
+    records = list(artwork_import.read_records(io.BytesIO(body), 'csv'))[:single]
+    started = time.perf_counter()
+    for _, record in records:
+        title, description, price, image_url, status, _, _ = artwork_import.parse_record(record)
+        cursor.execute('INSERT INTO bench_import (title, description, price, image_url, created_by, status) '
+                       'VALUES (%s, %s, %s, %s, %s, %s)', (title, description, price, image_url, args.user_id, status))
+        conn.commit()
+    seconds = time.perf_counter() - started
+    print(f"{'one INSERT + commit per row':<40} {single:>8} rows {single / seconds:>10.0f} rows/s")
+
+    for batch_size in (100, 1000, 5000):
+        job = artwork_import.ArtworkImport(conn, args.user_id, batch_size=batch_size, artworks='bench_import')
+        report = job.run(artwork_import.read_records(io.BytesIO(body), 'csv'))
+        print(f"{f'import, batches of {batch_size}':<40} {report['imported']:>8} rows "
+              f"{report['rows_per_second']:>10} rows/s ({report['failed']} failed)")
+
+    cursor = conn.cursor()
+    cursor.execute('DROP TABLE bench_import')
+    user_stats.reconcile(cursor, args.user_id)  # the imports added their rows to this user's counters
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+# --- login storm -------------------------------------------------------------
+
+def http_request(url, body=None):
+    """(status, seconds) for one request; errors count as their HTTP status"""
+    import json
+    import urllib.error
+    import urllib.request
+
+    data = None if body is None else json.dumps(body).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def bench_login_storm(args):
+    """/health latency against a running server, idle and while --concurrency clients hammer /login"""
+    import collections
+    import threading
+
+    probe = f"{args.url}/health"
+    report('/health idle', [http_request(probe)[1] for _ in range(args.runs)])
+
+    statuses = collections.Counter()
+    stop = threading.Event()
+
+    def storm():
+        while not stop.is_set():
+            status, _ = http_request(f"{args.url}/login", {'email': args.email, 'password': args.password})
+            statuses[status] += 1
+
+    threads = [threading.Thread(target=storm, daemon=True) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1)  # let the password queue fill up
+    report(f'/health during {args.concurrency}-client login storm',
+           [http_request(probe)[1] for _ in range(args.runs)])
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print(f"/login responses: {dict(statuses)} (429 = shed by the password pool)")
+
+
+# --- asgi ------------------------------------------------------------------------
+
+async def _read_response(reader):
+    """(status, keep_alive) after reading one HTTP/1.x response"""
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    version, status = head[0].split()[:2]
+    headers = {k.strip().lower(): v.strip() for k, v in (line.split(':', 1) for line in head[1:] if ':' in line)}
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return int(status), False
+    return int(status), version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+
+async def _http_load(url, token, concurrency, seconds):
+    """Latencies and status counts from `concurrency` keep-alive clients requesting url for `seconds`"""
+    import asyncio
+    import collections
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(url)
+    request = (f"GET {parts.path or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+               f"Authorization: Bearer {token}\r\n\r\n").encode('latin-1')
+    latencies, statuses = [], collections.Counter()
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        writer = None
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+                writer.write(request)
+                status, keep_alive = await _read_response(reader)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                statuses[type(e).__name__] += 1
+                if writer is not None:
+                    writer.close()
+                writer = None
+                await asyncio.sleep(0.01)
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+def login_token(url, email, password):
+    import json
+    import urllib.request
+
+    req = urllib.request.Request(f"{url}/login", data=json.dumps({'email': email, 'password': password}).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=60) as response:
+        return json.loads(response.read())['token']
+
+
+def bench_asgi(args):
+    """Requests/sec and latency at --concurrency clients: threaded WSGI (--url) against ASGI (--asgi-url)"""
+    import asyncio
+
+    token = args.token or login_token(args.url, args.email, args.password)
+    for label, base in (('WSGI', args.url), ('ASGI', args.asgi_url)):
+        latencies, statuses = asyncio.run(_http_load(f"{base}{args.path}", token, args.concurrency, args.seconds))
+        if latencies:
+            report(f'{label} {args.path}', latencies)
+        print(f"{'':<40} {len(latencies) / args.seconds:.0f} requests/s, responses {dict(statuses)}")
+
+
+# --- worker scaling ----------------------------------------------------------
+
+def _wait_until_up(url, seconds=60):
+    import urllib.request
+
+    deadline = time.perf_counter() + seconds
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1):
+                return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def bench_workers(args):
+    """Throughput under gunicorn_conf.py at 1, 2, 4 ... --max-workers processes, relative to one worker"""
+    import asyncio
+    import os
+    import signal
+    import subprocess
+
+    counts = [1]
+    while counts[-1] * 2 <= args.max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    url = f"http://127.0.0.1:{args.port}"
+    token = args.token
+    baseline = None
+    for workers in counts:
+        env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{args.port}")
+        proc = subprocess.Popen(['gunicorn', '-c', args.config], env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_until_up(url)
+            token = token or login_token(url, args.email, args.password)
+            latencies, statuses = asyncio.run(_http_load(f"{url}{args.path}", token, args.concurrency, args.seconds))
+        finally:
+            proc.send_signal(signal.SIGTERM)  # graceful stop, as in production
+            proc.wait()
+        rate = len(latencies) / args.seconds
+        baseline = baseline or rate
+        if latencies:
+            report(f'{workers} workers {args.path}', latencies)
+        print(f"{'':<40} {rate:.0f} requests/s, x{rate / baseline:.2f} vs 1 worker "
+              f"({rate / baseline / workers:.0%} per worker), responses {dict(statuses)}")
+
+
+# --- list serialization ------------------------------------------------------
+
+SYNTHETIC_FIELDS = {'id': 'id', 'title': 'title', 'description': 'description', 'price': 'price',
+                    'status': 'status', 'created_at': 'created_at'}
+
+
+class SyntheticCursor:
+    """Yields --rows artwork-shaped tuples on demand, like an unbuffered cursor"""
+
+    column_names = tuple(SYNTHETIC_FIELDS)
+
+    def __init__(self, rows):
+        from datetime import datetime
+        from decimal import Decimal
+        self._next = 0
+        self._rows = rows
+        self._make = lambda i: (rows - i, f'Artwork {i}', 'x' * 200, Decimal('1234.50'), 'available',
+                                datetime(2024, 1, 1))
+
+    def fetchmany(self, size):
+        batch = [self._make(i) for i in range(self._next, min(self._next + size, self._rows))]
+        self._next += len(batch)
+        return batch
+
+    def fetchall(self):
+        return self.fetchmany(self._rows)
+
+    def close(self):
+        pass
+
+
+class SyntheticConnection:
+    def invalidate(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def uncapped_page(args):
+    from pagination import Page
+    page = Page({}, SYNTHETIC_FIELDS)
+    page.limit = args.rows  # what an uncapped page would hold
+    return page
+
+
+def dict_rows_response(args, app):
+    """The previous list path: dictionary cursor, Decimal loop, Flask's stdlib provider"""
+    from flask.json.provider import DefaultJSONProvider
+
+    cursor = SyntheticCursor(args.rows)
+    artworks = [dict(zip(cursor.column_names, row)) for row in cursor.fetchall()]
+    for artwork in artworks:
+        if 'price' in artwork and hasattr(artwork['price'], '__float__'):
+            artwork['price'] = float(artwork['price'])
+    return DefaultJSONProvider(app).response({'artworks': artworks, 'next_cursor': None})
+
+
+def row_objects_response(args, app):
+    """Tuple cursor, Row objects, FastJSONProvider"""
+    artworks, next_cursor = uncapped_page(args).finish(SyntheticCursor(args.rows).fetchall())
+    return app.json.response({'artworks': artworks, 'next_cursor': next_cursor})
+
+
+def measure(label, func, *args):
+    import tracemalloc
+    tracemalloc.start()
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<32} peak={peak / 2 ** 20:8.1f}MiB time={elapsed:.3f}s")
+
+
+def bench_serialize(args):
+    """Build a --rows list response: dict rows + stdlib JSON vs Row objects + FastJSONProvider"""
+    import json_provider
+    import server
+
+    print(f"rows={args.rows} orjson={'yes' if json_provider.orjson else 'no'}")
+    with server.app.app_context():
+        for _ in range(3):
+            report('dict rows + stdlib json', [timed(dict_rows_response, args, server.app)])
+            report('Row objects + FastJSONProvider', [timed(row_objects_response, args, server.app)])
+        measure('dict rows + stdlib json', dict_rows_response, args, server.app)
+        measure('Row objects + FastJSONProvider', row_objects_response, args, server.app)
+
+
+def synthetic_catalogue_page(rows, rng):
+    """An /artworks page with varied text, less compressible than SyntheticCursor's rows"""
+    from datetime import datetime, timedelta
+    start = datetime(2024, 1, 1)
+    return {'artworks': [{
+        'id': 100000 - i,
+        'title': ' '.join(rng.sample(SEARCH_WORDS, 3)).title(),
+        'description': ' '.join(rng.choice(SEARCH_WORDS) for _ in range(rng.randint(10, 40))),
+        'price': rng.randint(1000, 500000) / 100,
+        'image_url': f'https://images.example.com/{rng.getrandbits(64):016x}.jpg',
+        'category_id': rng.randint(1, 40),
+        'artist_id': rng.randint(1, 5000),
+        'created_by': rng.randint(1, 20000),
+        'created_at': start + timedelta(minutes=rng.randint(0, 10 ** 6)),
+        'status': rng.choice(('available', 'available', 'available', 'sold')),
+        'category_name': rng.choice(('Painting', 'Sculpture', 'Photography', 'Print', 'Drawing')),
+        'artist_name': f'{rng.choice(ARTIST_NAMES)} {rng.choice(ARTIST_NAMES)}son',
+    } for i in range(rows)], 'next_cursor': 'eyJpZCI6IDk5OTUxfQ'}
+
+
+def bench_compression(args):
+    """Bytes on the wire and CPU per response for gzip/brotli levels, and for precompressed cache hits"""
+    from flask import Flask
+
+    import compression
+    import http_cache
+    from json_provider import FastJSONProvider
+
+    rng = random.Random(42)
+    for rows in (50, 200):
+        app = Flask(__name__)
+        app.json = FastJSONProvider(app)
+        with app.app_context():
+            data = app.json.response(synthetic_catalogue_page(rows, rng)).get_data()
+        print(f"{rows}-row page: {len(data)} bytes uncompressed")
+        for encoding in ('gzip', 'br'):
+            if encoding == 'br' and compression.brotli is None:
+                print("  br: skipped (pip install brotli)")
+                continue
+            for level in sorted(set(compression.LEVELS[encoding])):
+                started = time.thread_time()
+                for _ in range(args.runs):
+                    body = compression.compress(data, encoding, level)
+                cpu = (time.thread_time() - started) / args.runs
+                print(f"  {encoding:<4} level {level}: {len(body):>7} bytes ({len(body) / len(data):.1%}) "
+                      f"cpu={cpu * 1e6:8.1f}us/response")
+
+    # Whole request through Flask: untagged responses are compressed every time, tagged ones once
+    page = synthetic_catalogue_page(50, rng)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    compressor = compression.Compressor()
+    compressor.init_app(app)
+    catalogue = http_cache.ConditionalGet(http_cache.SharedCounters(http_cache.TABLES))
+    app.add_url_rule('/plain', 'plain', lambda: app.json.response(page))
+    app.add_url_rule('/tagged', 'tagged', catalogue.conditional('artworks')(lambda: app.json.response(page)))
+    client = app.test_client()
+    for label, path, accept in (('uncompressed', '/plain', 'identity'), ('gzip every time', '/plain', 'gzip'),
+                                ('gzip precompressed hit', '/tagged', 'gzip'), ('br every time', '/plain', 'br'),
+                                ('br precompressed hit', '/tagged', 'br')):
+        if 'br' in accept and compression.brotli is None:
+            continue
+        client.get(path, headers={'Accept-Encoding': accept})  # warm
+        started = time.thread_time()
+        for _ in range(args.runs):
+            size = len(client.get(path, headers={'Accept-Encoding': accept}).data)
+        cpu = (time.thread_time() - started) / args.runs
+        print(f"{'50-row request, ' + label:<44} {size:>7} bytes cpu={cpu * 1e6:8.1f}us/request")
+
+
+def bench_stream_memory(args):
+    """Peak Python heap for a buffered list response vs ?stream=1, over --rows rows"""
+    import server
+    import streaming
+    from pagination import Page
+
+    def streamed():
+        page = Page({'stream': '1'}, SYNTHETIC_FIELDS)
+        for chunk in streaming.json_chunks('artworks', SyntheticConnection(), SyntheticCursor(args.rows),
+                                           page, dumps=server.app.json.dumps):
+            len(chunk)
+
+    with server.app.app_context():
+        measure('buffered', row_objects_response, args, server.app)
+        measure('stream=1', streamed)
+
+
+class SyntheticKeysetCursor:
+    """Answers the export's artworks keyset query for `rows` synthetic artworks"""
+
+    def __init__(self, rows):
+        from datetime import datetime
+        from decimal import Decimal
+        self._rows = rows
+        self._range = iter(())
+        self._make = lambda i: (i, f'Artwork {i}', 'x' * 200, Decimal('1234.50'), None, 'available',
+                                datetime(2024, 1, 1), 3, 'Painting', 7, 'Some Artist')
+
+    def execute(self, sql, params):
+        _, after, limit = params
+        self._range = iter(range(after + 1, min(after + limit, self._rows) + 1))
+
+    def fetchmany(self, size):
+        return [self._make(i) for i in itertools.islice(self._range, size)]
+
+    def close(self):
+        pass
+
+
+def bench_export_memory(args):
+    """Peak Python heap of GET /export (NDJSON and gzip) at --rows/100, --rows/10 and --rows artworks"""
+    import collection_export
+    import server
+
+    class Connection(SyntheticConnection):
+        def __init__(self, rows):
+            self.rows = rows
+
+        def cursor(self, buffered=True):
+            return SyntheticKeysetCursor(self.rows)
+
+    def export(params, rows):
+        size = 0
+        for chunk in collection_export.Export(params).body(lambda: Connection(rows), 1, dumps=server.app.json.dumps):
+            size += len(chunk)
+        print(f"  {rows} rows -> {size / 2 ** 20:.1f}MiB body")
+
+    with server.app.app_context():
+        for params in ({'sections': 'artworks'}, {'sections': 'artworks', 'gzip': '1'},
+                       {'sections': 'artworks', 'format': 'csv', 'gzip': '1'}):
+            for rows in (args.rows // 100, args.rows // 10, args.rows):
+                measure(f"export {params.get('format', 'ndjson')}{' gzip' if 'gzip' in params else ''} "
+                        f"{rows}", export, params, rows)
+
+
+BENCHMARKS = {
+    'dashboard': bench_dashboard,
+    'transactions': bench_transactions,
+    'login-storm': bench_login_storm,
+    'stream-memory': bench_stream_memory,
+    'serialize': bench_serialize,
+    'search': bench_search,
+    'typeahead': bench_typeahead,
+    'import': bench_import,
+    'export-memory': bench_export_memory,
+    'asgi': bench_asgi,
+    'workers': bench_workers,
+    'compression': bench_compression,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('name', choices=sorted(BENCHMARKS))
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--cold-runs', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--reuse', action='store_true', help='reuse previously generated rows')
+    parser.add_argument('--url', default='http://localhost:5000', help='server under test')
+    parser.add_argument('--email', default='loadtest@example.com')
+    parser.add_argument('--password', default='loadtest-password')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--asgi-url', default='http://localhost:8000', help='same app under uvicorn asgi:app')
+    parser.add_argument('--path', default='/dashboard/stats')
+    parser.add_argument('--token', help='Bearer token; logs in with --email/--password if omitted')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--config', default='gunicorn_conf.py', help='gunicorn config for the workers benchmark')
+    parser.add_argument('--port', type=int, default=8100)
+    args = parser.parse_args()
+
+    print(f"=== Benchmark: {args.name} ===\n")
+    BENCHMARKS[args.name](args)
+    print("\n=== Benchmark Complete ===")
@@ -0,0 +1,186 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """In-process LRU store with per-entry expiry"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared store on any Redis-compatible server; values are JSON-encoded.
+
+    Eviction is left to the server's maxmemory-policy (allkeys-lru).
+    """
+
+    def __init__(self, url, dumps=json.dumps, loads=json.loads, prefix='artspace:'):
+        import redis  # optional dependency, only needed for CACHE_BACKEND=redis
+        self._client = redis.Redis.from_url(url)
+        self._dumps = dumps
+        self._loads = loads
+        self._prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return None if raw is None else self._loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.setex(self._prefix + key, max(1, int(ttl)), self._dumps(value))
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*(self._prefix + key for key in keys))
+
+    def size(self):
+        return self._client.dbsize()
+
+
+def backend_from_env(dumps=json.dumps, loads=json.loads, prefix='artspace:'):
+    """Backend selected by CACHE_BACKEND (memory or redis)"""
+    if os.environ.get('CACHE_BACKEND', 'memory') == 'redis':
+        return RedisBackend(os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+                            dumps=dumps, loads=loads, prefix=prefix)
+    return MemoryBackend(int(os.environ.get('CACHE_MAX_ENTRIES', 10000)))
+
+
+class SharedGenerations:
+    """Per-user invalidation counters in anonymous shared memory, inherited by forked workers.
+
+    Created at import, so under gunicorn_conf.py's preload a bump in one
+    worker is seen by every worker on the host. Users whose ids collide
+    modulo `slots` share a counter; a bump for one also expires the
+    other's entries, which only costs a recomputation.
+    """
+
+    def __init__(self, slots=65536):
+        self._values = multiprocessing.RawArray('q', slots)
+        self._lock = multiprocessing.Lock()
+
+    def _slot(self, user_id):
+        return hash(user_id) % len(self._values)
+
+    def get(self, user_id):
+        return self._values[self._slot(user_id)]
+
+    def bump(self, *user_ids):
+        # A worker killed inside this block would leave the lock held for good
+        locked = self._lock.acquire(timeout=1)
+        try:
+            for user_id in user_ids:
+                self._values[self._slot(user_id)] += 1
+        finally:
+            if locked:
+                self._lock.release()
+
+
+class ResultCache:
+    """Per-user cache of endpoint results, keyed by (endpoint, user_id).
+
+    With a per-process backend, pass `generations` (SharedGenerations) so
+    that invalidate() in one worker reaches the others: each entry is
+    stored with its user's generation and is a miss once that has moved on.
+    """
+
+    def __init__(self, backend, ttl=300, endpoints=(), generations=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.endpoints = tuple(endpoints)
+        self.generations = generations
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self.on_invalidate = None  # called with the user ids, e.g. to pin their reads to the primary
+
+    @classmethod
+    def from_env(cls, endpoints, dumps=json.dumps, loads=json.loads):
+        """Build a cache from CACHE_* environment variables"""
+        backend = backend_from_env(dumps, loads)
+        # Redis is one store for every worker and host; the memory backend needs shared invalidation
+        generations = SharedGenerations() if isinstance(backend, MemoryBackend) else None
+        return cls(backend, ttl=int(os.environ.get('CACHE_TTL', 300)), endpoints=endpoints,
+                   generations=generations)
+
+    @staticmethod
+    def _key(endpoint, user_id):
+        return f'{endpoint}:{user_id}'
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def generation(self, user_id):
+        """Read before computing a value, and pass to set(), so a write in between isn't cached over"""
+        return None if self.generations is None else self.generations.get(user_id)
+
+    def get(self, endpoint, user_id):
+        value = self.backend.get(self._key(endpoint, user_id))
+        if value is not None and self.generations is not None:
+            generation, value = value
+            if generation != self.generations.get(user_id):
+                value = None
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def set(self, endpoint, user_id, value, generation=None):
+        if self.generations is not None:
+            value = (self.generation(user_id) if generation is None else generation, value)
+        self.backend.set(self._key(endpoint, user_id), value, self.ttl)
+
+    def invalidate(self, *user_ids):
+        """Drop every cached endpoint for the given users"""
+        users = {user_id for user_id in user_ids if user_id is not None}
+        keys = [self._key(endpoint, user_id) for user_id in users for endpoint in self.endpoints]
+        if keys:
+            if self.generations is not None:
+                self.generations.bump(*users)
+            self.backend.delete(*keys)
+            self._count('invalidations')
+        if self.on_invalidate is not None:
+            self.on_invalidate(*user_ids)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['entries'] = self.backend.size()
+        stats['evictions'] = self.backend.evictions
+        stats['backend'] = type(self.backend).__name__
+        return stats
@@ -0,0 +1,233 @@
+"""
+Streaming export of one user's collection, for GET /export.
+
+There are three sections:
+- the user's artworks, with category and artist names;
+- their transactions as buyer or seller;
+- their portfolio entries.
+
+Each section is read in id order, in chunks of EXPORT_CHUNK_SIZE rows,
+with a keyset query (`... AND id > <last id> ORDER BY id LIMIT n`). The
+single-column created_by, buyer_id, seller_id and artist_id indexes end
+in the primary key, so each chunk is an index range read with no sort.
+Rows come from an unbuffered cursor in batches and are written out as
+they arrive. Memory use therefore does not depend on collection size.
+
+NDJSON output has one object per row, with a "type" field. After every
+chunk it writes a {"type": "checkpoint", "token": ...} line, and it ends
+with {"type": "end", ...}. Passing a checkpoint token back as ?token=
+continues right after it. CSV output holds a single section, and
+?after_id=<last id in the file> continues it, without a second header.
+Both formats can be
+gzip-compressed. A resumed gzip download is another gzip member, so
+appending it to the partial file still gives a valid .gz.
+"""
+
+import base64
+import csv
+import io
+import json
+import os
+import zlib
+
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+FETCH_SIZE = 500  # rows per fetchmany() within a chunk
+
+ARTWORKS_SQL = '''
+    SELECT a.id, a.title, a.description, a.price, a.image_url, a.status, a.created_at,
+           a.category_id, c.name AS category_name, a.artist_id, ar.name AS artist_name
+    FROM {artworks} a
+    LEFT JOIN categories c ON a.category_id = c.id
+    LEFT JOIN artists ar ON a.artist_id = ar.id
+    WHERE a.created_by = %s AND a.id > %s
+    ORDER BY a.id
+    LIMIT %s
+'''
+
+# Buyer side and seller side each walk their own index; the merge is at most 2 chunks
+TRANSACTIONS_SQL = '''
+    SELECT t.id, t.artwork_id, a.title AS artwork_title, IF(t.buyer_id = %s, 'bought', 'sold') AS side,
+           t.buyer_id, t.seller_id, t.amount, t.transaction_date, t.status, t.payment_method, t.notes
+    FROM (
+        (SELECT id FROM transactions WHERE buyer_id = %s AND id > %s ORDER BY id LIMIT %s)
+        UNION ALL
+        (SELECT id FROM transactions WHERE seller_id = %s AND buyer_id != %s AND id > %s ORDER BY id LIMIT %s)
+    ) mine
+    JOIN transactions t ON t.id = mine.id
+    LEFT JOIN artworks a ON t.artwork_id = a.id
+    ORDER BY t.id
+    LIMIT %s
+'''
+
+PORTFOLIOS_SQL = '''
+    SELECT id, title, description, image_url, portfolio_type, created_at, external_link
+    FROM artist_portfolios
+    WHERE artist_id = %s AND id > %s
+    ORDER BY id
+    LIMIT %s
+'''
+
+# section -> (columns, SQL, params for (user_id, after_id, limit))
+SECTIONS = {
+    'artworks': (('id', 'title', 'description', 'price', 'image_url', 'status', 'created_at',
+                  'category_id', 'category_name', 'artist_id', 'artist_name'),
+                 ARTWORKS_SQL,
+                 lambda user, after, n: (user, after, n)),
+    'transactions': (('id', 'artwork_id', 'artwork_title', 'side', 'buyer_id', 'seller_id', 'amount',
+                      'transaction_date', 'status', 'payment_method', 'notes'),
+                     TRANSACTIONS_SQL,
+                     lambda user, after, n: (user, user, after, n, user, user, after, n, n)),
+    'portfolios': (('id', 'title', 'description', 'image_url', 'portfolio_type', 'created_at',
+                    'external_link'),
+                   PORTFOLIOS_SQL,
+                   lambda user, after, n: (user, after, n)),
+}
+
+FORMATS = ('ndjson', 'csv')
+
+
+class InvalidExportRequest(ValueError):
+    """Raised for an unknown format or section, or a bad resume token"""
+
+
+def encode_token(section, after_id):
+    raw = json.dumps([section, after_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        section, after_id = json.loads(raw)
+        if section not in SECTIONS:
+            raise ValueError(section)
+        return section, int(after_id)
+    except (ValueError, TypeError):
+        raise InvalidExportRequest('Invalid export token')
+
+
+class Export:
+    """A parsed export request: format, sections and where to start"""
+
+    def __init__(self, args):
+        self.format = args.get('format') or 'ndjson'
+        if self.format not in FORMATS:
+            raise InvalidExportRequest('format must be ndjson or csv')
+        self.gzip = args.get('gzip') in ('1', 'true')
+
+        requested = args.get('sections')
+        self.sections = [s for s in requested.split(',') if s] if requested else list(SECTIONS)
+        unknown = [s for s in self.sections if s not in SECTIONS]
+        if unknown:
+            raise InvalidExportRequest(f'Unknown section: {unknown[0]}')
+        if self.format == 'csv' and len(self.sections) != 1:
+            raise InvalidExportRequest('CSV exports hold one section; pass sections=<name>')
+
+        # Resume point: skip the sections before it, start that one after its id
+        self.start = (self.sections[0], 0)
+        if args.get('token'):
+            self.start = decode_token(args['token'])
+            if self.start[0] not in self.sections:
+                raise InvalidExportRequest('Export token is for a section not being exported')
+        elif args.get('after_id'):
+            try:
+                self.start = (self.sections[0], int(args['after_id']))
+            except ValueError:
+                raise InvalidExportRequest('after_id must be an integer')
+
+    @property
+    def mimetype(self):
+        if self.gzip:
+            return 'application/gzip'
+        return 'text/csv' if self.format == 'csv' else 'application/x-ndjson'
+
+    @property
+    def filename(self):
+        name = self.sections[0] if self.format == 'csv' else 'collection'
+        return f"{name}.{self.format}{'.gz' if self.gzip else ''}"
+
+    def rows(self, cursor, user_id, artworks='artworks', chunk_size=EXPORT_CHUNK_SIZE):
+        """(section, batch of tuples) for the rows to export, and (section, last id) after each chunk"""
+        start_section, after_id = self.start
+        sections = self.sections[self.sections.index(start_section):]
+        for section in sections:
+            _, sql, params = SECTIONS[section]
+            sql = sql.format(artworks=artworks)
+            if section != start_section:
+                after_id = 0
+            while True:
+                cursor.execute(sql, params(user_id, after_id, chunk_size))
+                count = 0
+                while True:
+                    batch = cursor.fetchmany(FETCH_SIZE)
+                    if not batch:
+                        break
+                    count += len(batch)
+                    after_id = batch[-1][0]
+                    yield section, batch
+                yield section, after_id
+                if count < chunk_size:
+                    break
+
+    def body(self, connect, user_id, dumps=json.dumps, **kwargs):
+        """Yield the response body, on a connection from connect() that is closed when done.
+
+        The connection is only checked out once the body starts, so a HEAD
+        request or a client gone before the first chunk never takes one.
+        A client that disconnects mid-chunk leaves unread rows on the
+        connection, so it is discarded instead of going back to the pool.
+        """
+        finished = False
+        cursor = None
+        conn = connect()
+        try:
+            cursor = conn.cursor(buffered=False)
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if self.gzip else None
+            for text in self._text(self.rows(cursor, user_id, **kwargs), dumps):
+                if compressor is None:
+                    yield text
+                else:
+                    data = compressor.compress(text.encode('utf-8'))
+                    if data:
+                        yield data
+            if compressor is not None:
+                yield compressor.flush()
+            finished = True
+        finally:
+            if not finished:
+                conn.invalidate()
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    conn.invalidate()
+            conn.close()
+
+    def _text(self, rows, dumps):
+        total = 0
+        if self.format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if not self.start[1]:
+                writer.writerow(SECTIONS[self.sections[0]][0])  # a resumed file already has it
+            for _, batch in rows:
+                if isinstance(batch, int):
+                    continue  # CSV has no checkpoints; resume with after_id
+                writer.writerows(batch)
+                total += len(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if total == 0:
+                yield buffer.getvalue()
+            return
+
+        for section, batch in rows:
+            if isinstance(batch, int):
+                yield dumps({'type': 'checkpoint', 'token': encode_token(section, batch)}) + '\n'
+                continue
+            columns = SECTIONS[section][0]
+            kind = section[:-1]
+            yield ''.join(dumps(dict(zip(columns, row), type=kind)) + '\n' for row in batch)
+            total += len(batch)
+        yield dumps({'type': 'end', 'rows': total}) + '\n'
@@ -0,0 +1,153 @@
+"""
+Negotiated gzip / brotli compression of JSON responses.
+
+- Only application/json bodies of at least COMPRESS_MIN_SIZE bytes
+  (default 1024) are compressed. Below that the saving is a few hundred
+  bytes at best, and Vary makes the response harder to cache.
+- br is used when the client accepts it and the optional `brotli` package
+  is installed (pip install brotli). Otherwise gzip is used, honouring
+  Accept-Encoding q-values.
+- The level follows the 1-minute load average per core, sampled once a
+  second. An idle host spends CPU on ratio, and a saturated host falls
+  back to the fastest level.
+- A response with an ETag (see http_cache.py) has one body per tag, so its
+  compressed bytes are kept in an LRU keyed by (ETag, encoding), up to
+  COMPRESS_CACHE_MB (default 32). A popular page is compressed once, not
+  on every hit. Such an ETag gets an encoding suffix and becomes weak,
+  as nginx does, because bytes can differ with the level.
+
+Streamed responses (stream=1 lists, exports) are sent as they are.
+"""
+
+import gzip
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli  # optional; better ratios than gzip at the same CPU cost
+except ImportError:
+    brotli = None
+
+CORES = os.cpu_count() or 1
+
+# Level per load band: < 0.5, < 1 and >= 1 runnable processes per core
+LEVELS = {'br': (5, 4, 1), 'gzip': (6, 4, 1)}
+ETAG_SUFFIXES = {'br': 'br', 'gzip': 'gz'}
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class Compressor:
+    """after_request hook compressing JSON bodies for clients that accept it"""
+
+    def __init__(self, min_size=1024, cache_bytes=32 * 2 ** 20, mimetypes=('application/json',)):
+        self.min_size = min_size
+        self.cache_bytes = cache_bytes
+        self.mimetypes = mimetypes
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self._cache = OrderedDict()  # (etag, encoding) -> compressed body
+        self._cached_bytes = 0
+        self._band = (float('-inf'), 0)  # (sampled_at, band)
+        self._lock = threading.Lock()
+        self._counters = {'compressed': 0, 'cache_hits': 0, 'too_small': 0, 'not_accepted': 0,
+                          'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0}
+
+    @classmethod
+    def from_env(cls):
+        """Build from COMPRESS_MIN_SIZE / COMPRESS_CACHE_MB"""
+        return cls(min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 1024)),
+                   cache_bytes=int(float(os.environ.get('COMPRESS_CACHE_MB', 32)) * 2 ** 20))
+
+    def init_app(self, app):
+        app.after_request(self._compress)
+
+    def level_band(self):
+        now = time.monotonic()
+        sampled_at, band = self._band
+        if now - sampled_at >= 1:
+            try:
+                per_core = os.getloadavg()[0] / CORES
+            except OSError:  # not available on this platform
+                per_core = 0.0
+            band = 0 if per_core < 0.5 else 1 if per_core < 1 else 2
+            self._band = (now, band)
+        return band
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._counters[name] += delta
+
+    def _cached(self, key):
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+            return body
+
+    def _store(self, key, body):
+        if len(body) > self.cache_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = body
+            self._cached_bytes += len(body)
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def _compress(self, response):
+        if response.status_code == 304:
+            response.vary.add('Accept-Encoding')  # validates a representation that may be compressed
+            return response
+        if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+                or 'Content-Encoding' in response.headers or response.mimetype not in self.mimetypes):
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            self._count(too_small=1)
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            self._count(not_accepted=1)
+            return response
+
+        tag, _ = response.get_etag()
+        key = (tag, encoding) if tag else None
+        body = self._cached(key) if key else None
+        if body is not None:
+            self._count(cache_hits=1)
+        else:
+            started = time.thread_time()
+            body = compress(data, encoding, LEVELS[encoding][self.level_band()])
+            self._count(compressed=1, cpu_seconds=time.thread_time() - started)
+            if key:
+                self._store(key, body)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if tag:
+            response.set_etag(f'{tag}-{ETAG_SUFFIXES[encoding]}', weak=True)
+        self._count(bytes_in=len(data), bytes_out=len(body))
+        return response
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['cache_entries'] = len(self._cache)
+            stats['cache_bytes'] = self._cached_bytes
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 4) if stats['bytes_in'] else 0.0
+        stats['cpu_seconds'] = round(stats['cpu_seconds'], 6)
+        stats['encodings'] = list(self.encodings)
+        stats['level_band'] = self._band[1]
+        return stats
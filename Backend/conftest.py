@@ -0,0 +1,59 @@
+"""
+Shared stand-ins for the tests in this directory: a fake DB-API cursor
+that records each statement with its params bound in, so a param in the
+wrong position shows up in the wrong place in the SQL
+"""
+
+from datetime import datetime
+
+import pytest
+
+
+def bind(sql, params):
+    """The statement with every %s replaced by its param, whitespace collapsed"""
+    pieces = sql.split('%s')
+    assert len(pieces) - 1 == len(params), f'{len(pieces) - 1} placeholders for {len(params)} params'
+    bound = [pieces[0]]
+    for value, piece in zip(params, pieces[1:]):
+        bound.append(f"'{value}'" if isinstance(value, (str, datetime)) else str(value))
+        bound.append(piece)
+    return ' '.join(''.join(bound).split())
+
+
+class FakeCursor:
+    """Keeps every bound statement in `statements`.
+
+    Rows come from respond(bound_sql, params) when given, else the canned
+    `rows`; tuples or dicts, whichever the code under test expects.
+    """
+
+    def __init__(self, rows=(), respond=None):
+        self.rows = list(rows)
+        self.respond = respond
+        self.statements = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        bound = bind(sql, params)
+        self.statements.append(bound)
+        if self.respond is not None:
+            self.rows = self.respond(bound, params)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_cursor():
+    """FakeCursor factory: fake_cursor(rows) or fake_cursor(respond=...)"""
+    return FakeCursor
@@ -0,0 +1,165 @@
+"""
+Dashboard aggregation: every number on /dashboard/stats and
+/dashboard/artist-stats comes back from a single UNION ALL statement.
+
+Each branch fills a shared row shape (section, label, label2, label3,
+n1, n2, n3, amount, ts) and the rows are folded back into the
+response dict in Python. The scalar totals are a primary-key lookup
+on the user_stats rollup (see user_stats.py). The result is a plain
+dict that can be cached as-is.
+
+The branches are also kept separately (COLLECTOR_BRANCHES,
+ARTIST_BRANCHES). The async server (asgi.py) runs them concurrently on
+separate connections, then builds the same dict with
+collector_stats_from_rows() / artist_stats_from_rows().
+"""
+
+ROW_COLUMNS = ('section', 'label', 'label2', 'label3', 'n1', 'n2', 'n3', 'amount', 'ts')
+
+CATEGORY_BRANCH = '''
+    SELECT 'category', c.name, NULL, NULL, COUNT(a.id), NULL, NULL, NULL, NULL
+    FROM categories c
+    LEFT JOIN artworks a ON c.id = a.category_id AND a.created_by = %s
+    WHERE c.created_by = %s
+    GROUP BY c.id, c.name
+'''
+
+COLLECTOR_BRANCHES = (
+    '''
+    SELECT 'totals' AS section, NULL AS label, NULL AS label2, NULL AS label3,
+           category_count AS n1, artist_count AS n2, artwork_count AS n3,
+           total_value AS amount, NULL AS ts
+    FROM user_stats
+    WHERE user_id = %s
+    ''',
+    CATEGORY_BRANCH,
+    '''
+    (SELECT 'recent', a.title, c.name, ar.name, NULL, NULL, NULL, a.price, a.created_at
+     FROM artworks a
+     LEFT JOIN categories c ON a.category_id = c.id
+     LEFT JOIN artists ar ON a.artist_id = ar.id
+     WHERE a.created_by = %s
+     ORDER BY a.created_at DESC
+     LIMIT 5)
+    ''',
+    '''
+    SELECT 'monthly', DATE_FORMAT(created_at, '%Y-%m'), NULL, NULL, COUNT(*), NULL, NULL, NULL, NULL
+    FROM artworks
+    WHERE created_by = %s
+    AND created_at >= DATE_SUB(NOW(), INTERVAL 6 MONTH)
+    GROUP BY DATE_FORMAT(created_at, '%Y-%m')
+    ''',
+)
+
+ARTIST_BRANCHES = (
+    '''
+    SELECT 'totals' AS section, NULL AS label, NULL AS label2, NULL AS label3,
+           artwork_count AS n1, sales_count AS n2, NULL AS n3,
+           total_earnings AS amount, NULL AS ts
+    FROM user_stats
+    WHERE user_id = %s
+    ''',
+    CATEGORY_BRANCH,
+    '''
+    (SELECT 'recent', a.title, c.name, a.status, NULL, NULL, NULL, a.price, a.created_at
+     FROM artworks a
+     LEFT JOIN categories c ON a.category_id = c.id
+     WHERE a.created_by = %s
+     ORDER BY a.created_at DESC
+     LIMIT 5)
+    ''',
+    '''
+    SELECT 'monthly', DATE_FORMAT(t.transaction_date, '%Y-%m'), NULL, NULL, COUNT(*), NULL, NULL, NULL, NULL
+    FROM transactions t
+    JOIN artworks a ON t.artwork_id = a.id
+    WHERE a.created_by = %s AND t.status = 'completed'
+    AND t.transaction_date >= DATE_SUB(NOW(), INTERVAL 6 MONTH)
+    GROUP BY DATE_FORMAT(t.transaction_date, '%Y-%m')
+    ''',
+)
+
+COLLECTOR_STATS_SQL = 'UNION ALL'.join(COLLECTOR_BRANCHES)
+ARTIST_STATS_SQL = 'UNION ALL'.join(ARTIST_BRANCHES)
+
+
+def params(sql, user_id):
+    """Every placeholder in these statements is the user id"""
+    return (user_id,) * sql.count('%s')
+
+
+def _to_float(value):
+    return float(value) if value is not None else 0.0
+
+
+# A user with no writes yet has no user_stats row
+NO_TOTALS = {'n1': 0, 'n2': 0, 'n3': 0, 'amount': 0}
+
+
+def _split_sections(rows):
+    sections = {'totals': [], 'category': [], 'recent': [], 'monthly': []}
+    for row in rows:
+        sections[row['section']].append(row)
+    # UNION ALL gives no ordering guarantee across branches
+    sections['category'].sort(key=lambda r: r['n1'], reverse=True)
+    sections['recent'].sort(key=lambda r: r['ts'], reverse=True)
+    sections['monthly'].sort(key=lambda r: r['label'])
+    return sections
+
+
+def _categories(rows):
+    return [{'category_name': r['label'], 'artwork_count': r['n1']} for r in rows]
+
+
+def _months(rows):
+    return [{'month': r['label'], 'count': r['n1']} for r in rows]
+
+
+def collector_stats(cursor, user_id):
+    """Stats for /dashboard/stats in one round trip; cursor must be dictionary=True"""
+    cursor.execute(COLLECTOR_STATS_SQL, params(COLLECTOR_STATS_SQL, user_id))
+    return collector_stats_from_rows(cursor.fetchall())
+
+
+def collector_stats_from_rows(rows):
+    sections = _split_sections(rows)
+    totals = sections['totals'][0] if sections['totals'] else NO_TOTALS
+    return {
+        'total_categories': totals['n1'],
+        'total_artists': totals['n2'],
+        'total_artworks': totals['n3'],
+        'total_value': _to_float(totals['amount']),
+        'artworks_by_category': _categories(sections['category']),
+        'recent_artworks': [{
+            'title': r['label'],
+            'price': float(r['amount']) if r['amount'] is not None else None,
+            'category_name': r['label2'],
+            'artist_name': r['label3'],
+            'created_at': r['ts'],
+        } for r in sections['recent']],
+        'monthly_artworks': _months(sections['monthly']),
+    }
+
+
+def artist_stats(cursor, user_id):
+    """Stats for /dashboard/artist-stats in one round trip; cursor must be dictionary=True"""
+    cursor.execute(ARTIST_STATS_SQL, params(ARTIST_STATS_SQL, user_id))
+    return artist_stats_from_rows(cursor.fetchall())
+
+
+def artist_stats_from_rows(rows):
+    sections = _split_sections(rows)
+    totals = sections['totals'][0] if sections['totals'] else NO_TOTALS
+    return {
+        'total_artworks': totals['n1'],
+        'total_sales': totals['n2'],
+        'total_earnings': _to_float(totals['amount']),
+        'artworks_by_category': _categories(sections['category']),
+        'recent_artworks': [{
+            'title': r['label'],
+            'price': float(r['amount']) if r['amount'] is not None else None,
+            'category_name': r['label2'],
+            'status': r['label3'],
+            'created_at': r['ts'],
+        } for r in sections['recent']],
+        'monthly_sales': _months(sections['monthly']),
+    }
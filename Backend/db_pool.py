@@ -0,0 +1,429 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the wait timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections with overflow, pre-ping and recycling.
+
+    `connect` is any zero-argument callable returning a DB-API connection
+    (normally `functools.partial(mysql.connector.connect, **DB_CONFIG)`).
+    `wrap_cursor`, if given, is applied to every cursor handed out, e.g.
+    to time the statements run through it.
+    """
+
+    def __init__(self, connect, size=5, max_overflow=10, timeout=30.0,
+                 recycle=3600, pre_ping=True, wrap_cursor=None):
+        self._connect = connect
+        self.wrap_cursor = wrap_cursor
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()  # (raw connection, created_at) - most recently used on the right
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._inherited = []  # see after_fork()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            'checkouts': 0,
+            'connects': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'wait_seconds': 0.0,
+        }
+
+    @classmethod
+    def from_env(cls, connect, wrap_cursor=None):
+        """Build a pool configured from DB_POOL_* environment variables"""
+        return cls(
+            connect,
+            wrap_cursor=wrap_cursor,
+            size=int(os.environ.get('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+            timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            recycle=int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+            pre_ping=os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+        )
+
+    def connection(self):
+        """Check out a connection; close() on the returned object gives it back"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._opened < self.size + self.max_overflow:
+                    # Reserve the slot now, open the socket outside the lock
+                    self._opened += 1
+                    raw = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'Timed out after {self.timeout}s waiting for a database connection '
+                        f'(size={self.size}, overflow={self.max_overflow})'
+                    )
+                self._cond.wait(remaining)
+            self._stats['checkouts'] += 1
+            self._stats['wait_seconds'] += time.monotonic() - started
+
+        try:
+            if raw is not None:
+                raw, created_at = self._validate(raw, created_at)
+            if raw is None:
+                raw, created_at = self._open()
+        except Exception:
+            self._release_slot()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _open(self):
+        raw = self._connect()
+        with self._cond:
+            self._stats['connects'] += 1
+        return raw, time.monotonic()
+
+    def _validate(self, raw, created_at):
+        """Return (raw, created_at) if the idle connection is usable, (None, None) otherwise"""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._close_quietly(raw)
+            with self._cond:
+                self._stats['recycled'] += 1
+            return None, None
+        if self.pre_ping and not self._ping(raw):
+            self._close_quietly(raw)
+            with self._cond:
+                self._stats['ping_failures'] += 1
+            return None, None
+        return raw, created_at
+
+    @staticmethod
+    def _ping(raw):
+        try:
+            if hasattr(raw, 'ping'):
+                raw.ping(reconnect=False)
+            elif hasattr(raw, 'is_connected'):
+                return raw.is_connected()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release_slot(self):
+        with self._cond:
+            self._opened -= 1
+            self._cond.notify()
+
+    def _checkin(self, raw, created_at, broken=False):
+        if not broken:
+            # Never hand the next request an open transaction or a stale snapshot
+            try:
+                raw.rollback()
+            except Exception:
+                broken = True
+
+        with self._cond:
+            if not broken and len(self._idle) < self.size:
+                self._idle.append((raw, created_at))
+                self._cond.notify()
+                return
+            self._opened -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+        self._close_quietly(raw)
+
+    def dispose(self):
+        """Close every idle connection; checked-out connections close on return"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    def warm(self, count=None):
+        """Open connections until `count` (default: size) are idle, so the first requests skip the handshake"""
+        count = self.size if count is None else min(count, self.size)
+        opened = []
+        try:
+            while True:
+                with self._cond:
+                    if len(self._idle) + len(opened) >= count or self._opened >= self.size + self.max_overflow:
+                        break
+                    self._opened += 1
+                try:
+                    opened.append(self._open())
+                except Exception:
+                    self._release_slot()
+                    raise
+        finally:
+            with self._cond:
+                self._idle.extendleft(opened)
+                self._cond.notify_all()
+        return len(opened)
+
+    def after_fork(self):
+        """Forget connections inherited from the parent process.
+
+        The sockets are shared with the parent, so they are neither closed nor
+        garbage collected here: mysql.connector shuts the socket down on
+        collection, which would end the parent's session.
+        """
+        self._inherited.extend(raw for raw, _ in self._idle)
+        # A parent thread may have held the lock at fork time; never wait on it here
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._opened = 0
+        self._reset_stats()
+
+    def status(self):
+        """Snapshot of pool state and counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'opened': self._opened,
+                'idle': len(self._idle),
+                'in_use': self._opened - len(self._idle),
+                'overflow': max(0, self._opened - self.size),
+            })
+        stats['wait_seconds'] = round(stats['wait_seconds'], 6)
+        return stats
+
+
+class PooledConnection:
+    """Proxy around a pooled connection; close() returns it to the pool"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._broken = False
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise AttributeError(f'Connection already returned to the pool ({name})')
+        return getattr(raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.__getattr__('cursor')(*args, **kwargs)
+        wrap = self._pool.wrap_cursor
+        return wrap(cursor) if wrap is not None else cursor
+
+    def invalidate(self):
+        """Mark the connection as unusable so it is discarded instead of pooled"""
+        self._broken = True
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._checkin(raw, self._created_at, self._broken)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def replica_hosts(value, default_port=3306):
+    """[(host, port)] from a comma-separated 'host[:port]' list such as DB_REPLICA_HOSTS"""
+    hosts = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        host, _, port = item.partition(':')
+        hosts.append((host, int(port or default_port)))
+    return hosts
+
+
+class ReplicaRouter:
+    """A primary pool plus read-replica pools.
+
+    connection(readonly=True) is served by a healthy replica, round robin,
+    except in these cases:
+    - the user wrote within `read_your_writes` seconds (see note_write());
+    - the tables the handler reads changed within that window
+      (`changed_at`), so a lagging replica could still miss the change;
+    - no replica is healthy.
+    Writes always go to the primary.
+
+    A replica is skipped for `cooldown` seconds after a failed checkout, or
+    when it lags more than `max_lag` seconds. Lag is checked at most every
+    `check_interval` seconds per replica (0 turns the check off).
+
+    Recent writes are kept per hashed user in memory shared with forked
+    workers, so a write in one gunicorn worker is seen by the others. A
+    hash collision only sends a read to the primary.
+    """
+
+    def __init__(self, primary, replicas=(), read_your_writes=5.0, max_lag=None, check_interval=10.0,
+                 cooldown=30.0, slots=4096):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.read_your_writes = read_your_writes
+        self.max_lag = read_your_writes if max_lag is None else max_lag
+        self.check_interval = check_interval
+        self.cooldown = cooldown
+        self._health = [{'down_until': 0.0, 'checked_at': float('-inf'), 'lag': None, 'error': None}
+                        for _ in self.replicas]
+        self._next = 0
+        self._recent = multiprocessing.RawArray('d', slots)  # time.time() of the latest write per user bucket
+        self._lock = threading.Lock()
+        self._counters = {'primary_checkouts': 0, 'replica_reads': 0, 'read_your_writes': 0,
+                          'fresh_tables': 0, 'no_healthy_replica': 0, 'replica_failures': 0}
+
+    @classmethod
+    def from_env(cls, primary, replicas=()):
+        """Build a router configured from DB_READ_YOUR_WRITES / DB_REPLICA_* environment variables"""
+        max_lag = os.environ.get('DB_REPLICA_MAX_LAG')
+        return cls(
+            primary, replicas,
+            read_your_writes=float(os.environ.get('DB_READ_YOUR_WRITES', 5)),
+            max_lag=float(max_lag) if max_lag else None,
+            check_interval=float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 10)),
+            cooldown=float(os.environ.get('DB_REPLICA_COOLDOWN', 30)),
+        )
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def note_write(self, *user_ids):
+        """Send these users' reads to the primary for the next `read_your_writes` seconds"""
+        now = time.time()
+        for user_id in user_ids:
+            if user_id is not None:
+                self._recent[hash(user_id) % len(self._recent)] = now
+
+    def _wrote_recently(self, user_id):
+        return (user_id is not None
+                and time.time() - self._recent[hash(user_id) % len(self._recent)] < self.read_your_writes)
+
+    def connection(self, readonly=False, user_id=None, changed_at=None):
+        """Check out a connection from the primary, or from a replica for a read-only handler"""
+        if not readonly or not self.replicas:
+            if not readonly:
+                self._count('primary_checkouts')
+            return self.primary.connection()
+        if self._wrote_recently(user_id):
+            self._count('read_your_writes')
+            return self.primary.connection()
+        if changed_at is not None and time.time() - changed_at < self.read_your_writes:
+            self._count('fresh_tables')
+            return self.primary.connection()
+
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            if self._health[index]['down_until'] > time.monotonic():
+                continue
+            try:
+                conn = self.replicas[index].connection()
+            except Exception as e:
+                self._mark_down(index, e)
+                continue
+            if self._lag_ok(index, conn):
+                self._count('replica_reads')
+                return conn
+            conn.close()
+        self._count('no_healthy_replica')
+        return self.primary.connection()
+
+    def _mark_down(self, index, error):
+        with self._lock:
+            self._health[index].update(down_until=time.monotonic() + self.cooldown, error=str(error))
+            self._counters['replica_failures'] += 1
+
+    def _lag_ok(self, index, conn):
+        health = self._health[index]
+        if not self.check_interval or time.monotonic() - health['checked_at'] < self.check_interval:
+            return True  # 0 disables lag checks (they need the REPLICATION CLIENT privilege)
+        try:
+            lag = replication_lag(conn)
+        except Exception as e:
+            conn.invalidate()
+            self._mark_down(index, e)
+            return False
+        with self._lock:
+            health.update(checked_at=time.monotonic(), lag=lag, error=None)
+        if lag is not None and lag <= self.max_lag:
+            return True
+        self._mark_down(index, 'replication stopped' if lag is None else f'{lag}s behind the primary')
+        return False
+
+    def pools(self):
+        return [self.primary] + self.replicas
+
+    def warm(self):
+        opened = self.primary.warm()
+        for index, pool in enumerate(self.replicas):
+            try:
+                opened += pool.warm()
+            except Exception as e:
+                self._mark_down(index, e)
+        return opened
+
+    def dispose(self):
+        for pool in self.pools():
+            pool.dispose()
+
+    def after_fork(self):
+        for pool in self.pools():
+            pool.after_fork()
+        self._lock = threading.Lock()
+
+    def status(self):
+        """Primary pool status, plus each replica's pool and health and the routing counters"""
+        status = self.primary.status()
+        with self._lock:
+            status['routing'] = dict(self._counters)
+            health = [dict(h) for h in self._health]
+        now = time.monotonic()
+        status['replicas'] = [dict(pool.status(), healthy=h['down_until'] <= now, lag=h['lag'], error=h['error'])
+                              for pool, h in zip(self.replicas, health)]
+        return status
+
+
+def replication_lag(conn):
+    """Seconds_Behind_Source of a replica connection: None if replication is stopped, 0 if not a replica"""
+    cursor = conn.cursor()
+    try:
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except Exception:
+            cursor.execute('SHOW SLAVE STATUS')  # MySQL < 8.0.22
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        status = dict(zip(cursor.column_names, row))
+        return status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    finally:
+        cursor.close()
@@ -0,0 +1,107 @@
+"""
+Production launcher: `gunicorn -c gunicorn_conf.py` (pip install gunicorn).
+
+`python server.py` starts Flask's single-process debug server. This
+config runs the same app under gunicorn, as follows:
+
+- preload_app imports server.py once in the master. Workers fork from
+  it with the modules and the typeahead index already in memory. The
+  master builds the index and then closes its DB connections before any
+  worker exists, so no worker inherits a MySQL socket.
+  Workers also inherit the shared memory that server.py creates at
+  import: token revocations, ETag counters, dashboard cache generations
+  and read-your-writes windows. A write in one worker is then seen by
+  all of them, though each keeps its own dashboard cache entries.
+- There are WEB_CONCURRENCY worker processes (default 2 x cores + 1),
+  each with WEB_THREADS threads (default 4). Processes let CPU-bound
+  work such as JSON encoding use every core, and threads cover time
+  spent waiting on MySQL. DB_POOL_SIZE defaults to the thread count, so
+  every thread can hold a pooled connection without overflow.
+- Each worker re-creates its pool, warms it, and starts its own
+  background threads (threads don't survive fork()).
+- Workers are recycled after MAX_REQUESTS requests (default 1000, plus
+  up to MAX_REQUESTS_JITTER). A recycled worker finishes the requests
+  it already accepted before exiting, and the master replaces it.
+- On SIGTERM, the master closes the listening socket and the workers
+  finish in-flight requests within GRACEFUL_TIMEOUT seconds (default
+  30). Each worker then returns its MySQL connections and password
+  hashing processes before exiting.
+"""
+
+import logging
+import os
+import time
+
+log = logging.getLogger('gunicorn_conf')
+
+CORES = os.cpu_count() or 1
+
+
+def worker_count(cores=CORES):
+    return int(os.environ.get('WEB_CONCURRENCY', 0)) or cores * 2 + 1
+
+
+def thread_count():
+    return int(os.environ.get('WEB_THREADS', 4))
+
+
+wsgi_app = 'server:app'
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+worker_class = 'gthread'
+workers = worker_count()
+threads = thread_count()
+preload_app = True
+max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 100))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('KEEPALIVE', 5))
+
+# Read by server.py when the master imports it
+os.environ['BACKGROUND_TASKS'] = 'post_fork'
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+# One bcrypt process pool per worker; together they should not exceed the cores
+os.environ.setdefault('PASSWORD_WORKERS', str(max(1, CORES // workers)))
+
+
+def when_ready(arbiter):
+    """Master, after preloading and before forking: warm shared caches, then drop DB connections"""
+    import server
+
+    started = time.perf_counter()
+    try:
+        server.typeahead_index.rebuild(server.load_typeahead_entries())
+        log.info("Typeahead index built in the master: %s entries in %.1fs",
+                 server.typeahead_index.stats()['entries'], time.perf_counter() - started)
+    except Exception as e:
+        log.error("Typeahead index build failed, workers will retry: %s", e)
+        arbiter.typeahead_failed = True
+    server.db.dispose()
+    log.info("Serving with %s workers x %s threads", arbiter.num_workers, threads)
+
+
+def post_fork(arbiter, worker):
+    import server
+
+    server.db.after_fork()
+    # The first workers inherit the master's index; a replacement would inherit a stale one
+    first_generation = worker.age <= arbiter.num_workers and not getattr(arbiter, 'typeahead_failed', False)
+    server.start_background_tasks(build_index=not first_generation)
+
+
+def post_worker_init(worker):
+    import server
+
+    try:
+        server.db.warm()
+    except Exception as e:
+        log.warning("Could not warm the DB pool in worker %s: %s", worker.pid, e)
+
+
+def worker_exit(arbiter, worker):
+    """Runs once in-flight requests are done (graceful stop or max_requests)"""
+    import server
+
+    server.db.dispose()
+    server.passwords.shutdown()
+    log.info("Worker %s exited after draining", worker.pid)
@@ -0,0 +1,195 @@
+"""
+ETags and conditional GETs for the catalogue reads (/categories,
+/artists, /artworks).
+
+Each cached route names the tables its response is built from. Every
+table has a version counter, which the write handlers bump after they
+commit. A route's ETag hashes those versions with the request path and
+query string. So the tag is known before any SQL runs, and a request
+whose If-None-Match still matches gets a 304 without touching MySQL.
+
+By default the counters live in shared memory that is created at import.
+Under gunicorn_conf.py's preload that import happens in the master, so
+every worker on the host sees every bump. With several hosts, set
+CACHE_BACKEND=redis to keep the counters in Redis instead. A random
+epoch is part of every tag, so counters restarting from zero (after a
+redeploy or a flushed Redis) never repeat an old tag.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+log = logging.getLogger(__name__)
+
+TABLES = ('categories', 'artists', 'artworks')
+
+
+class SharedCounters:
+    """Version counters in anonymous shared memory, inherited by forked workers"""
+
+    def __init__(self, names):
+        self._slots = {name: i for i, name in enumerate(names)}
+        self._values = multiprocessing.RawArray('q', len(names))
+        self._bumped = multiprocessing.RawArray('d', len(names))  # time.time() of each table's last bump
+        self._lock = multiprocessing.Lock()
+        self.epoch = secrets.token_hex(4)
+
+    def get(self, names):
+        return [self._values[self._slots[name]] for name in names]
+
+    def bumped_at(self, names):
+        return max(self._bumped[self._slots[name]] for name in names)
+
+    def incr(self, names):
+        # A worker killed inside this block would leave the lock held for good
+        locked = self._lock.acquire(timeout=1)
+        if not locked:
+            log.warning("Version counter lock timed out; bumping %s unlocked", ', '.join(names))
+        try:
+            for name in names:
+                self._values[self._slots[name]] += 1
+                self._bumped[self._slots[name]] = time.time()
+        finally:
+            if locked:
+                self._lock.release()
+
+
+class RedisCounters:
+    """Version counters shared by every host through Redis"""
+
+    def __init__(self, url, prefix='artspace:version:'):
+        import redis  # optional dependency, only needed for CACHE_BACKEND=redis
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._client.set(prefix + 'epoch', secrets.token_hex(4), nx=True)
+        self.epoch = self._client.get(prefix + 'epoch').decode('ascii')
+
+    def get(self, names):
+        return [int(value or 0) for value in self._client.mget([self._prefix + name for name in names])]
+
+    def bumped_at(self, names):
+        return max(float(value or 0) for value in self._client.mget([self._prefix + name + ':at' for name in names]))
+
+    def incr(self, names):
+        pipe = self._client.pipeline(transaction=False)
+        for name in names:
+            pipe.incr(self._prefix + name)
+            pipe.set(self._prefix + name + ':at', time.time())
+        pipe.execute()
+
+
+def counters_from_env(names=TABLES):
+    """Counters selected by CACHE_BACKEND, like the dashboard cache"""
+    if os.environ.get('CACHE_BACKEND', 'memory') == 'redis':
+        return RedisCounters(os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+    return SharedCounters(names)
+
+
+class ConditionalGet:
+    """Strong ETags from table versions, with If-None-Match answered before the view runs.
+
+    `cache_control` defaults to `no-cache`: browsers keep the body and
+    revalidate it on every use. Shared caches don't store responses to
+    requests carrying Authorization, so a CDN passes revalidations through
+    to the app. Vary keeps a CDN set up to cache these responses (e.g.
+    `public, s-maxage=30`) from serving one user's entry to another
+    request, or to an anonymous one.
+    """
+
+    def __init__(self, counters, cache_control='no-cache', vary='Authorization, Cookie', max_sizes=10000):
+        self.counters = counters
+        self.cache_control = cache_control
+        self.vary = vary
+        self.max_sizes = max_sizes
+        self._sizes = OrderedDict()  # ETag -> body size of the last full response, to count bytes saved
+        self._lock = threading.Lock()
+        self._counters = {'not_modified': 0, 'full': 0, 'bytes_sent': 0, 'bytes_saved': 0, 'bumps': 0}
+
+    @classmethod
+    def from_env(cls, names=TABLES):
+        """Build from CACHE_BACKEND and CATALOGUE_CACHE_CONTROL"""
+        return cls(counters_from_env(names), cache_control=os.environ.get('CATALOGUE_CACHE_CONTROL', 'no-cache'))
+
+    def bump(self, *tables):
+        """Call after committing a write to these tables"""
+        self.counters.incr(tables)
+        with self._lock:
+            self._counters['bumps'] += 1
+
+    def etag(self, tables):
+        versions = ','.join(map(str, self.counters.get(tables)))
+        key = f'{self.counters.epoch}|{versions}|{request.full_path}'
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
+
+    @staticmethod
+    def _matching_tag(tag):
+        """The If-None-Match entry that validates `tag`, if any.
+
+        compression.py tags a compressed body `<tag>-gz` or `<tag>-br`, and
+        those validate `tag` too. The 304 echoes the client's entry.
+        """
+        if_none_match = request.if_none_match
+        if if_none_match.star_tag:
+            return tag
+        for candidate in if_none_match.as_set(include_weak=True):
+            if candidate == tag or candidate.startswith(tag + '-'):
+                return candidate
+        return None
+
+    def _headers(self, response, tag):
+        response.set_etag(tag)
+        response.headers['Cache-Control'] = self.cache_control
+        response.vary.update(v.strip() for v in self.vary.split(','))
+
+    def conditional(self, *tables):
+        """Decorator for a GET view whose response depends only on `tables` and the URL"""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                tag = self.etag(tables)
+                matched = self._matching_tag(tag)
+                if matched is not None:
+                    response = Response(status=304)
+                    self._headers(response, tag)
+                    response.set_etag(matched, weak=request.if_none_match.is_weak(matched))
+                    with self._lock:
+                        self._counters['not_modified'] += 1
+                        self._counters['bytes_saved'] += self._sizes.get(tag, 0)
+                    return response
+                # Read by get_db_connection(): a replica may not have these changes yet
+                g.tables_changed_at = self.counters.bumped_at(tables)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    self._headers(response, tag)
+                    size = None if response.is_streamed else response.calculate_content_length()
+                    with self._lock:
+                        self._counters['full'] += 1
+                        if size is not None:
+                            self._counters['bytes_sent'] += size
+                            self._sizes[tag] = size
+                            self._sizes.move_to_end(tag)
+                            if len(self._sizes) > self.max_sizes:
+                                self._sizes.popitem(last=False)
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        revalidations = stats['not_modified'] + stats['full']
+        stats['hit_ratio'] = round(stats['not_modified'] / revalidations, 4) if revalidations else 0.0
+        stats['counters'] = type(self.counters).__name__
+        return stats
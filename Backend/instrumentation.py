@@ -0,0 +1,317 @@
+"""
+Request and SQL timing, exposed in Prometheus text format at /metrics.
+
+Each request is timed, and the time goes into a histogram per (method,
+route). The route is the URL rule, e.g. /artworks/<int:artwork_id>, not
+the raw path. Every statement run through a pooled cursor is timed too,
+and goes into a histogram per normalized statement. Normalizing collapses
+whitespace, replaces literals with ? and shortens IN (%s, %s, ...) to
+IN (...), so a query shape counts once however many ids it is run with.
+
+A statement slower than SLOW_QUERY_MS is logged with its parameters
+redacted to their types, so no user data reaches the log. Responses
+also get a Server-Timing `db` entry with the request's query count and
+total time.
+
+The sampling profiler is opt-in. It is off unless PROFILE_DIR is set.
+A request then opts in with an `X-Profile: 1` header, and a background
+thread records the handler thread's stack every PROFILE_INTERVAL_MS.
+The folded stacks (the input format of flamegraph.pl and speedscope)
+are written to PROFILE_DIR, and the response names the file in an
+X-Profile header.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from flask import Response, g, has_request_context, request
+
+log = logging.getLogger(__name__)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+MAX_STATEMENTS = 500  # distinct statement shapes tracked; the rest share one series
+STATEMENT_LENGTH = 200
+
+# counter -> (Prometheus name, help)
+COUNTERS = {
+    'slow_queries': ('db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS'),
+    'failed_queries': ('db_failed_queries_total', 'Statements that raised'),
+    'profiles': ('request_profiles_total', 'Profiled requests written to PROFILE_DIR'),
+}
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'(\((?:\s*%s\s*,?)+\))(?:\s*,\s*\((?:\s*%s\s*,?)+\))+')
+
+
+def normalize(sql):
+    """The shape of a statement: no literals, no whitespace runs, IN lists collapsed"""
+    sql = ' '.join(sql.split())
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _VALUES_LIST.sub(r'\1, ...', sql)
+    return sql[:STATEMENT_LENGTH]
+
+
+def redact(params):
+    """Parameter types only, e.g. (<int>, <str:12>), for the slow query log"""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{k}: {_redact_value(v)}' for k, v in params.items()) + '}'
+    return '(' + ', '.join(_redact_value(v) for v in params) + ')'
+
+
+def _redact_value(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, (str, bytes)):
+        return f'<{type(value).__name__}:{len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, one series per label tuple (not thread-safe on its own)"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # labels -> [bucket counts..., +Inf count, sum, max]
+
+    def observe(self, labels, seconds):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0.0]
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-2] += seconds
+        series[-1] = max(series[-1], seconds)
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} histogram')
+        for labels, series in sorted(self.series.items()):
+            label_text = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+
+
+class TimedCursor:
+    """Cursor proxy that reports the duration of every execute()/executemany()"""
+
+    def __init__(self, cursor, instrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        return self._timed(self._cursor.execute, sql, params, params, 1, *args, **kwargs)
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        return self._timed(self._cursor.executemany, sql, seq_params, seq_params[0] if seq_params else None,
+                           len(seq_params), *args, **kwargs)
+
+    def _timed(self, method, sql, params, sample_params, rows, *args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = method(sql, params, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._instrumentation.record_query(sql, sample_params, time.perf_counter() - started,
+                                               rows=rows, failed=failed)
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer; counts folded stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+class Instrumentation:
+    """Per-route and per-statement latency histograms, slow query log and request profiling"""
+
+    def __init__(self, slow_query_seconds=0.2, profile_dir=None, profile_interval=0.002):
+        self.slow_query_seconds = slow_query_seconds
+        self.profile_dir = profile_dir
+        self.profile_interval = profile_interval
+        self._lock = threading.Lock()
+        self.requests = Histogram('http_request_duration_seconds', 'Request latency by route',
+                                  ('method', 'route'), REQUEST_BUCKETS)
+        self.queries = Histogram('db_query_duration_seconds', 'SQL statement latency by normalized statement',
+                                 ('statement',), QUERY_BUCKETS)
+        self.responses = Counter()  # (method, route, status) -> count
+        self._shapes = {}  # raw SQL text -> normalized statement
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    @classmethod
+    def from_env(cls):
+        return cls(slow_query_seconds=float(os.environ.get('SLOW_QUERY_MS', 200)) / 1000,
+                   profile_dir=os.environ.get('PROFILE_DIR') or None,
+                   profile_interval=float(os.environ.get('PROFILE_INTERVAL_MS', 2)) / 1000)
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._stop_profiler)
+
+    def cursor(self, cursor):
+        """Wrap a DB-API cursor so its statements are timed (ConnectionPool's wrap_cursor)"""
+        return TimedCursor(cursor, self)
+
+    def _statement(self, sql):
+        shape = self._shapes.get(sql)
+        if shape is None:
+            shape = normalize(sql)
+            if len(self._shapes) < MAX_STATEMENTS * 4:
+                self._shapes[sql] = shape
+            if (shape,) not in self.queries.series and len(self.queries.series) >= MAX_STATEMENTS:
+                shape = 'other'
+        return shape
+
+    def record_query(self, sql, params, seconds, rows=1, failed=False):
+        with self._lock:
+            statement = self._statement(sql)
+            self.queries.observe((statement,), seconds)
+            slow = seconds >= self.slow_query_seconds
+            self._counters['slow_queries'] += slow
+            self._counters['failed_queries'] += failed
+        if has_request_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_seconds = g.get('db_seconds', 0.0) + seconds
+        if slow:
+            route = f'{request.method} {request.path}' if has_request_context() else None
+            log.warning("Slow query (%.1fms): %s", seconds * 1000, statement,
+                        extra={'duration_ms': round(seconds * 1000, 3), 'route': route,
+                               'params': redact(params), 'rows': rows})
+
+    def record_request(self, method, route, status, seconds):
+        with self._lock:
+            self.requests.observe((method, route), seconds)
+            self.responses[(method, route, status)] += 1
+
+    def _start_request(self):
+        g.request_started = time.perf_counter()
+        if self.profile_dir and request.headers.get('X-Profile') == '1':
+            g.profiler = StackSampler(threading.get_ident(), self.profile_interval).start()
+
+    def _finish_request(self, response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        self.record_request(request.method, route, response.status_code, time.perf_counter() - started)
+        if 'db_queries' in g:
+            response.headers.add('Server-Timing',
+                                 f'db;dur={g.db_seconds * 1000:.3f};desc="{g.db_queries} queries"')
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            response.headers['X-Profile'] = self._write_profile(route, profiler.stop())
+        return response
+
+    @staticmethod
+    def _stop_profiler(exc=None):
+        # after_request is skipped when an exception propagates; don't leave the sampler running
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+
+    def _write_profile(self, route, samples):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{slug}-{threading.get_ident()}.folded'
+        with open(os.path.join(self.profile_dir, name), 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        with self._lock:
+            self._counters['profiles'] += 1
+        return name
+
+    def render(self, gauges=None):
+        """Prometheus text exposition of every metric"""
+        lines = []
+        with self._lock:
+            self.requests.render(lines)
+            lines.append('# HELP http_responses_total Responses by route and status')
+            lines.append('# TYPE http_responses_total counter')
+            for labels, count in sorted(self.responses.items()):
+                lines.append(f'http_responses_total{{{_labels(("method", "route", "status"), labels)}}} {count}')
+            self.queries.render(lines)
+            for counter, value in self._counters.items():
+                name, help_text = COUNTERS[counter]
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {value}']
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def response(self, gauges=None):
+        """/metrics response; `gauges` adds point-in-time values such as pool occupancy"""
+        return Response(self.render(gauges), mimetype='text/plain; version=0.0.4')
+
+    def slowest_statements(self, limit=20):
+        """Statements by total time spent, for /debug/queries"""
+        rows = []
+        with self._lock:
+            for (statement,), counts in self.queries.series.items():
+                count = sum(counts[:-2])
+                rows.append({'statement': statement, 'count': count,
+                             'total_ms': round(counts[-2] * 1000, 3),
+                             'avg_ms': round(counts[-2] * 1000 / count, 3),
+                             'max_ms': round(counts[-1] * 1000, 3)})
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows[:limit]
@@ -0,0 +1,227 @@
+"""
+Ranked marketplace search with facet counts, for GET /marketplace/search.
+
+The `matched` CTE finds every candidate artwork once: full-text matches
+on title/description plus artworks whose artist name matches, with their
+relevance summed. One UNION ALL statement then reads that set for the
+result page and for every facet count. Each facet is counted with every
+filter except its own, so a client can still offer the other categories
+while one is selected.
+
+Rows share one shape: (section, facet_key, facet_label, facet_count,
+<page columns...>). Facet rows leave the page columns NULL, and hit rows
+leave the facet columns NULL.
+"""
+
+from pagination import InvalidPageRequest, Page
+
+# Marketplace listing fields, plus the relevance score of each hit
+FIELDS = {
+    'id': 'a.id',
+    'title': 'a.title',
+    'description': 'a.description',
+    'price': 'a.price',
+    'image_url': 'a.image_url',
+    'category_id': 'a.category_id',
+    'artist_id': 'a.artist_id',
+    'created_by': 'a.created_by',
+    'created_at': 'a.created_at',
+    'status': 'a.status',
+    'category_name': 'c.name',
+    'artist_name': 'ar.name',
+    'seller_name': 'u.name',
+    'relevance': 'm.score',
+}
+
+STATUSES = ('available', 'sold', 'reserved')
+
+# Lower bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = (0, 100, 500, 1000, 5000)
+PRICE_BUCKET_MAX = dict(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:]))
+
+MATCHED_SQL = '''
+    matched AS (
+        SELECT a.id, a.category_id, a.artist_id, a.price, a.status, SUM(hit.score) AS score
+        FROM (
+            SELECT id, MATCH(title, description) AGAINST (%s) AS score
+            FROM {artworks}
+            WHERE MATCH(title, description) AGAINST (%s)
+            UNION ALL
+            SELECT aw.id, MATCH(ar.name) AGAINST (%s)
+            FROM {artists} ar
+            JOIN {artworks} aw ON aw.artist_id = ar.id
+            WHERE MATCH(ar.name) AGAINST (%s)
+        ) hit
+        JOIN {artworks} a ON a.id = hit.id
+        WHERE a.created_by != %s
+        GROUP BY a.id, a.category_id, a.artist_id, a.price, a.status
+    )
+'''
+
+# Without a query every other seller's artwork is a candidate, newest first
+BROWSE_SQL = '''
+    matched AS (
+        SELECT a.id, a.category_id, a.artist_id, a.price, a.status, 0 AS score
+        FROM {artworks} a
+        WHERE a.created_by != %s
+    )
+'''
+
+
+def _int_list(args, name):
+    raw = args.get(name)
+    if not raw:
+        return []
+    try:
+        return [int(value) for value in raw.split(',') if value.strip()]
+    except ValueError:
+        raise InvalidPageRequest(f'{name} must be a comma-separated list of ids')
+
+
+def _price(args, name):
+    raw = args.get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        raise InvalidPageRequest(f'{name} must be a number')
+    if value < 0:
+        raise InvalidPageRequest(f'{name} must not be negative')
+    return value
+
+
+def _price_bucket_sql():
+    whens = ' '.join(f'WHEN m.price < {upper} THEN {lower}'
+                     for lower, upper in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:]))
+    return f'CASE WHEN m.price IS NULL THEN NULL {whens} ELSE {PRICE_BUCKETS[-1]} END'
+
+
+class Search:
+    """A parsed search request: query text, facet filters and the result page"""
+
+    def __init__(self, args):
+        self.q = (args.get('q') or '').strip()
+        # A browse cursor (a date) can't continue a ranked search (a score), or the other way round
+        if self.q:
+            self.page = Page(args, FIELDS, sort_field='relevance', sort_types=(int, float))
+        else:
+            self.page = Page(args, FIELDS, sort_field='created_at')
+
+        statuses = [s for s in (args.get('status') or 'available').split(',') if s]
+        unknown = [s for s in statuses if s not in STATUSES]
+        if unknown:
+            raise InvalidPageRequest(f'Unknown status: {unknown[0]}')
+
+        # facet -> (SQL predicate on the matched row m, params)
+        self.filters = {}
+        category_ids = _int_list(args, 'category_id')
+        if category_ids:
+            self.filters['category'] = (f"m.category_id IN ({', '.join(['%s'] * len(category_ids))})",
+                                        tuple(category_ids))
+        artist_ids = _int_list(args, 'artist_id')
+        if artist_ids:
+            self.filters['artist'] = (f"m.artist_id IN ({', '.join(['%s'] * len(artist_ids))})",
+                                      tuple(artist_ids))
+        min_price, max_price = _price(args, 'min_price'), _price(args, 'max_price')
+        if min_price is not None or max_price is not None:
+            bounds = [('m.price >= %s', min_price), ('m.price <= %s', max_price)]
+            self.filters['price'] = (' AND '.join(sql for sql, value in bounds if value is not None),
+                                     tuple(value for _, value in bounds if value is not None))
+        self.filters['status'] = (f"m.status IN ({', '.join(['%s'] * len(statuses))})",
+                                  tuple(statuses))
+
+    def _where(self, skip=None):
+        """WHERE body and params for every filter except `skip`"""
+        parts = [(sql, params) for facet, (sql, params) in self.filters.items() if facet != skip]
+        if not parts:
+            return '1 = 1', ()
+        return ' AND '.join(f'({sql})' for sql, _ in parts), sum((params for _, params in parts), ())
+
+    def query(self, user_id, artworks='artworks', artists='artists'):
+        """(sql, params) for the page of hits, the total and every facet, in one statement"""
+        page = self.page
+        width = len(page.selected)
+        pad = ', '.join(['NULL'] * width)
+
+        if self.q:
+            cte = MATCHED_SQL.format(artworks=artworks, artists=artists)
+            params = (self.q,) * 4 + (user_id,)
+        else:
+            cte = BROWSE_SQL.format(artworks=artworks)
+            params = (user_id,)
+
+        branches = []
+        where, where_params = self._where()
+        keyset_sql, keyset_params = page.keyset()
+        branches.append(f'''
+            (SELECT 'hit', NULL, NULL, NULL, {page.select_list()}
+             FROM matched m
+             JOIN {artworks} a ON a.id = m.id
+             LEFT JOIN categories c ON a.category_id = c.id
+             LEFT JOIN {artists} ar ON a.artist_id = ar.id
+             LEFT JOIN users u ON a.created_by = u.id
+             WHERE {where} AND {keyset_sql}
+             ORDER BY {page.order_by()}
+             LIMIT %s)''')
+        params += where_params + keyset_params + (page.fetch_size,)
+
+        branches.append(f'''
+            SELECT 'total', NULL, NULL, COUNT(*), {pad}
+            FROM matched m
+            WHERE {where}''')
+        params += where_params
+
+        facets = [
+            ('category', 'm.category_id', 'c.name', 'LEFT JOIN categories c ON c.id = m.category_id'),
+            ('artist', 'm.artist_id', 'ar.name', f'LEFT JOIN {artists} ar ON ar.id = m.artist_id'),
+            ('price', _price_bucket_sql(), 'NULL', ''),
+            ('status', 'NULL', 'm.status', ''),
+        ]
+        for facet, key_sql, label_sql, join in facets:
+            where, where_params = self._where(skip=facet)
+            branches.append(f'''
+            SELECT '{facet}', {key_sql}, {label_sql}, COUNT(*), {pad}
+            FROM matched m {join}
+            WHERE {where}
+            GROUP BY 2, 3''')
+            params += where_params
+
+        return 'WITH ' + cte + '\n    UNION ALL'.join(branches), params
+
+    def results(self, rows):
+        """Response body from the statement's rows"""
+        hits, total = [], 0
+        facets = {'category': [], 'artist': [], 'price': [], 'status': []}
+        for row in rows:
+            section = row[0]
+            if section == 'hit':
+                hits.append(row[4:])
+            elif section == 'total':
+                total = row[3]
+            elif section == 'category' or section == 'artist':
+                if row[1] is not None:
+                    facets[section].append({'id': row[1], 'name': row[2], 'count': row[3]})
+            elif section == 'price':
+                if row[1] is not None:
+                    lower = int(row[1])
+                    facets['price'].append({'min': lower, 'max': PRICE_BUCKET_MAX.get(lower),
+                                            'count': row[3]})
+            else:
+                facets['status'].append({'value': row[2], 'count': row[3]})
+
+        # UNION ALL gives no ordering guarantee across branches
+        hits.sort(key=lambda r: (r[self.page.sort_index], r[self.page.id_index]), reverse=True)
+        for facet in ('category', 'artist', 'status'):
+            facets[facet].sort(key=lambda f: f['count'], reverse=True)
+        facets['price'].sort(key=lambda f: f['min'])
+
+        artworks, next_cursor = self.page.finish(hits)
+        return {'artworks': artworks, 'next_cursor': next_cursor, 'total': total, 'facets': facets}
+
+
+def search(cursor, user_id, args, artworks='artworks', artists='artists'):
+    """Run one search for `user_id`; raises InvalidPageRequest for bad parameters"""
+    parsed = Search(args)
+    cursor.execute(*parsed.query(user_id, artworks, artists))
+    return parsed.results(cursor.fetchall())
@@ -0,0 +1,52 @@
+"""Schema changes previously applied ad hoc by update_database.py"""
+
+from migrations import log, table_exists, column_exists
+
+
+def upgrade(cursor):
+    if not column_exists(cursor, 'artworks', 'status'):
+        log.info("Adding status column to artworks table...")
+        cursor.execute("""
+            ALTER TABLE artworks 
+            ADD COLUMN status ENUM('available', 'sold', 'reserved') DEFAULT 'available'
+        """)
+
+    if not table_exists(cursor, 'transactions'):
+        log.info("Creating transactions table...")
+        cursor.execute("""
+            CREATE TABLE transactions (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                buyer_id INT NOT NULL,
+                seller_id INT NOT NULL,
+                artwork_id INT NOT NULL,
+                amount DECIMAL(10,2) NOT NULL,
+                transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status ENUM('pending', 'completed', 'cancelled') DEFAULT 'pending',
+                payment_method VARCHAR(50),
+                notes TEXT,
+                FOREIGN KEY (buyer_id) REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY (artwork_id) REFERENCES artworks(id) ON DELETE CASCADE
+            )
+        """)
+
+    if not table_exists(cursor, 'artist_portfolios'):
+        log.info("Creating artist_portfolios table...")
+        cursor.execute('''
+            CREATE TABLE artist_portfolios (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                artist_id INT NOT NULL,
+                title VARCHAR(255) NOT NULL,
+                description TEXT,
+                image_url VARCHAR(500),
+                external_link VARCHAR(500),
+                portfolio_type ENUM('gallery', 'exhibition', 'award', 'publication') DEFAULT 'gallery',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (artist_id) REFERENCES artists(id) ON DELETE CASCADE
+            )
+        ''')
+    elif not column_exists(cursor, 'artist_portfolios', 'external_link'):
+        log.info("Adding external_link column to artist_portfolios table...")
+        cursor.execute("ALTER TABLE artist_portfolios ADD COLUMN external_link VARCHAR(500)")
+
+    cursor.execute("UPDATE artworks SET status = 'available' WHERE status IS NULL")
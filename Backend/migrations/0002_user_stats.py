@@ -0,0 +1,10 @@
+"""Per-user rollup counters behind the dashboard totals"""
+
+import user_stats
+from migrations import log
+
+
+def upgrade(cursor):
+    cursor.execute(user_stats.CREATE_TABLE_SQL)
+    log.info("Backfilling user_stats from existing rows...")
+    user_stats.reconcile(cursor)
@@ -0,0 +1,26 @@
+"""Composite indexes so list and dashboard queries read in index order instead of filesorting"""
+
+from migrations import add_index
+
+INDEXES = [
+    # GET /artworks: ORDER BY created_at DESC, id DESC
+    ('artworks', 'idx_artworks_created', ('created_at', 'id')),
+    # /artworks/my-artworks, dashboard recent/monthly: WHERE created_by = ? ORDER BY created_at
+    ('artworks', 'idx_artworks_owner_created', ('created_by', 'created_at', 'id')),
+    # /marketplace/available: WHERE status = 'available' ORDER BY created_at DESC
+    ('artworks', 'idx_artworks_status_created', ('status', 'created_at', 'id')),
+    # Dashboard category breakdown: JOIN ON category_id AND created_by = ?
+    ('artworks', 'idx_artworks_category_owner', ('category_id', 'created_by')),
+    # /transactions: buyer side and seller side, newest first
+    ('transactions', 'idx_transactions_buyer_date', ('buyer_id', 'transaction_date', 'id')),
+    ('transactions', 'idx_transactions_seller_date', ('seller_id', 'transaction_date', 'id')),
+    # Artist sales stats: JOIN ON artwork_id WHERE status = 'completed'
+    ('transactions', 'idx_transactions_artwork_status', ('artwork_id', 'status', 'transaction_date')),
+    # /portfolio: WHERE artist_id = ? ORDER BY created_at DESC
+    ('artist_portfolios', 'idx_portfolios_artist_created', ('artist_id', 'created_at', 'id')),
+]
+
+
+def upgrade(cursor):
+    for table, index, columns in INDEXES:
+        add_index(cursor, table, index, columns)
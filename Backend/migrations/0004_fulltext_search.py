@@ -0,0 +1,14 @@
+"""Full-text indexes behind GET /marketplace/search"""
+
+from migrations import add_index
+
+FULLTEXT_INDEXES = [
+    # MATCH(title, description) must name exactly the indexed columns
+    ('artworks', 'ft_artworks_title_description', ('title', 'description')),
+    ('artists', 'ft_artists_name', ('name',)),
+]
+
+
+def upgrade(cursor):
+    for table, index, columns in FULLTEXT_INDEXES:
+        add_index(cursor, table, index, columns, kind='FULLTEXT INDEX')
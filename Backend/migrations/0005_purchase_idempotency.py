@@ -0,0 +1,12 @@
+"""Idempotency keys on transactions, so retried POST /transactions replay instead of buying twice"""
+
+from migrations import log, add_index, column_exists
+
+
+def upgrade(cursor):
+    if not column_exists(cursor, 'transactions', 'idempotency_key'):
+        log.info("Adding idempotency_key column to transactions table...")
+        cursor.execute("ALTER TABLE transactions ADD COLUMN idempotency_key VARCHAR(64) NULL")
+    # NULLs don't collide, so purchases without a key are unaffected
+    add_index(cursor, 'transactions', 'uq_transactions_buyer_key', ('buyer_id', 'idempotency_key'),
+              kind='UNIQUE INDEX')
@@ -0,0 +1,14 @@
+"""Checkout holds: who reserved an artwork and until when, indexed for the expiry sweeper"""
+
+from migrations import log, add_index, column_exists
+
+
+def upgrade(cursor):
+    if not column_exists(cursor, 'artworks', 'reserved_by'):
+        log.info("Adding reserved_by column to artworks table...")
+        cursor.execute("ALTER TABLE artworks ADD COLUMN reserved_by INT NULL")
+    if not column_exists(cursor, 'artworks', 'reserved_until'):
+        log.info("Adding reserved_until column to artworks table...")
+        cursor.execute("ALTER TABLE artworks ADD COLUMN reserved_until DATETIME NULL")
+    # reservations.sweep(): WHERE status = 'reserved' AND reserved_until < NOW()
+    add_index(cursor, 'artworks', 'idx_artworks_status_reserved', ('status', 'reserved_until'))
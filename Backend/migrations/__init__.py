@@ -0,0 +1,40 @@
+"""
+Versioned schema migrations, applied in order by update_database.py.
+
+Each NNNN_name.py module defines upgrade(cursor). The runner records
+applied versions in schema_migrations, so a migration runs once per
+database. MySQL commits DDL implicitly, so upgrades also guard each step
+with the helpers below and can safely be re-run after a partial failure.
+"""
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def table_exists(cursor, table):
+    cursor.execute("SHOW TABLES LIKE %s", (table,))
+    return cursor.fetchone() is not None
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    return cursor.fetchone() is not None
+
+
+def index_exists(cursor, table, index):
+    cursor.execute('''
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    ''', (table, index))
+    return cursor.fetchone() is not None
+
+
+def add_index(cursor, table, index, columns, kind='INDEX'):
+    """Create an index (kind='FULLTEXT INDEX' for full-text) unless one with the same name exists"""
+    if index_exists(cursor, table, index):
+        log.info("%s.%s already exists", table, index)
+        return
+    log.info("Adding %s.%s (%s)", table, index, ', '.join(columns))
+    cursor.execute(f"ALTER TABLE {table} ADD {kind} {index} ({', '.join(columns)})")
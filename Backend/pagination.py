@@ -0,0 +1,151 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from rows import to_rows
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('PAGE_SIZE_DEFAULT', 50))
+MAX_PAGE_SIZE = int(os.environ.get('PAGE_SIZE_MAX', 200))
+ALL_ROWS = 18446744073709551615  # MySQL's idiom for LIMIT without a bound
+
+
+class InvalidPageRequest(ValueError):
+    """Raised for a malformed limit, cursor or fields parameter"""
+
+
+def encode_cursor(sort_value, row_id):
+    """Opaque continuation token for the row at (sort_value, row_id)"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor(); returns (datetime or number, id)"""
+    try:
+        # validate: characters outside the alphabet are an error, not silently dropped
+        raw = base64.b64decode(token + '=' * (-len(token) % 4), altchars=b'-_', validate=True)
+        sort_value, row_id = json.loads(raw)
+        if isinstance(sort_value, str):
+            sort_value = datetime.fromisoformat(sort_value)
+        elif not isinstance(sort_value, (int, float)) or isinstance(sort_value, bool):
+            raise TypeError(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidPageRequest('Invalid cursor')
+
+
+class Page:
+    """Keyset page over (sort_field DESC, id_field DESC) with optional field projection.
+
+    `fields` maps public field names to SQL expressions, in default output order.
+    Requests pass `limit`, `cursor` (the previous page's next_cursor) and
+    `fields=a,b,c`. Queries must use a plain (tuple) cursor; rows come back as
+    Row objects. The sort and id columns are selected even when not requested
+    and dropped from the output.
+
+    With `stream=1` the response is streamed (see streaming.py), so the page
+    size cap doesn't apply and, without a `limit`, every remaining row is read.
+
+    `sort_types` are the types a cursor's sort value may decode to: a
+    cursor from a listing sorted on another column (a date where a score is
+    expected, say) is rejected instead of comparing mismatched values.
+    """
+
+    def __init__(self, args, fields, sort_field='created_at', id_field='id', sort_types=(datetime,)):
+        self.fields = fields
+        self.sort_field = sort_field
+        self.id_field = id_field
+        self.streaming = args.get('stream') in ('1', 'true')
+        self.next_cursor = None
+
+        limit = args.get('limit')
+        if limit is None or limit == '':
+            self.limit = None if self.streaming else DEFAULT_PAGE_SIZE
+        else:
+            try:
+                self.limit = int(limit)
+            except ValueError:
+                raise InvalidPageRequest('limit must be an integer')
+            if self.limit < 1:
+                raise InvalidPageRequest('limit must be positive')
+            if not self.streaming:
+                self.limit = min(self.limit, MAX_PAGE_SIZE)
+
+        token = args.get('cursor')
+        self.after = decode_cursor(token) if token else None
+        if self.after is not None and not isinstance(self.after[0], sort_types):
+            raise InvalidPageRequest('Cursor belongs to a different listing')
+
+        requested = args.get('fields')
+        if requested:
+            names = []
+            for name in requested.split(','):
+                name = name.strip()
+                if not name or name in names:
+                    continue
+                if name not in fields:
+                    raise InvalidPageRequest(f'Unknown field: {name}')
+                names.append(name)
+        else:
+            names = list(fields)
+        self.output = names
+        # Hidden columns go last so a row's output fields are a prefix of its tuple
+        self.selected = names + [n for n in (sort_field, id_field) if n not in names]
+        self.sort_index = self.selected.index(sort_field)
+        self.id_index = self.selected.index(id_field)
+
+    def select_list(self):
+        return ', '.join(f'{self.fields[name]} AS {name}' for name in self.selected)
+
+    def keyset(self):
+        """WHERE fragment and params that start the page after the cursor"""
+        if self.after is None:
+            return '1 = 1', ()
+        sort_sql = self.fields[self.sort_field]
+        id_sql = self.fields[self.id_field]
+        sort_value, row_id = self.after
+        return (f'({sort_sql} < %s OR ({sort_sql} = %s AND {id_sql} < %s))',
+                (sort_value, sort_value, row_id))
+
+    def order_by(self):
+        return f'{self.fields[self.sort_field]} DESC, {self.fields[self.id_field]} DESC'
+
+    @property
+    def fetch_size(self):
+        """One extra row tells us whether another page exists"""
+        return ALL_ROWS if self.limit is None else self.limit + 1
+
+    def finish(self, rows):
+        """Trim the look-ahead row and hidden columns; returns (rows, next_cursor)"""
+        next_cursor = None
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[self.sort_index], last[self.id_index])
+        return to_rows(self.output, rows), next_cursor
+
+    def finish_batches(self, batches):
+        """finish() for an iterable of row batches.
+
+        Yields the trimmed batches; self.next_cursor is set once they are
+        exhausted. Every batch is consumed, so an unbuffered cursor is left
+        with no unread rows.
+        """
+        self.next_cursor = None
+        remaining = self.limit
+        last = None
+        for rows in batches:
+            if remaining is not None:
+                if len(rows) > remaining:
+                    rows = rows[:remaining]
+                    if rows:
+                        last = rows[-1]
+                    if last is not None and self.next_cursor is None:
+                        self.next_cursor = encode_cursor(last[self.sort_index], last[self.id_index])
+                remaining -= len(rows)
+            if rows:
+                last = rows[-1]
+                yield to_rows(self.output, rows)
@@ -0,0 +1,125 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+DEFAULT_ROUNDS = 12  # bcrypt.gensalt() default
+
+
+class PasswordHasherBusy(Exception):
+    """Every worker is busy and the queue is full; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Password hashing queue is full, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_rounds(hashed):
+    """Cost factor of a bcrypt hash ($2b$12$...), or None if it isn't one"""
+    parts = hashed.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt in a process pool so request threads only wait, never burn CPU.
+
+    At most `max_pending` hashes are queued or running; beyond that hash()
+    and verify() raise PasswordHasherBusy instead of piling up requests.
+    """
+
+    def __init__(self, workers=None, max_pending=None, rounds=DEFAULT_ROUNDS):
+        if not 4 <= rounds <= 31:
+            raise ValueError(f'bcrypt rounds must be between 4 and 31, got {rounds}')
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._avg_seconds = 0.25  # running estimate of queue wait + hash time
+        self._counters = {'hashed': 0, 'verified': 0, 'rejected_busy': 0, 'rehashed': 0}
+
+    def _pool(self):
+        # Created on first use, and again after a fork, so pre-forking servers
+        # don't share one executor between workers
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected_busy'] += 1
+            raise PasswordHasherBusy(max(1, math.ceil(self._avg_seconds)))
+        started = time.perf_counter()
+        try:
+            result = self._pool().submit(func, *args).result()
+        finally:
+            self._slots.release()
+        with self._lock:
+            self._avg_seconds += 0.2 * (time.perf_counter() - started - self._avg_seconds)
+        return result
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def hash(self, password):
+        """bcrypt hash of `password` at the configured cost, as str"""
+        hashed = self._run(_hash, password.encode('utf-8'), self.rounds)
+        self._count('hashed')
+        return hashed.decode('utf-8')
+
+    def verify(self, password, hashed):
+        ok = self._run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+        self._count('verified')
+        return ok
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+    def rehash(self, password):
+        """New hash at the configured cost, or None if the pool is saturated"""
+        try:
+            hashed = self.hash(password)
+        except PasswordHasherBusy:
+            return None  # try again on a later login
+        self._count('rehashed')
+        return hashed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['avg_ms'] = round(self._avg_seconds * 1000, 2)
+        stats.update(workers=self.workers, max_pending=self.max_pending, rounds=self.rounds)
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+
+    @classmethod
+    def from_env(cls):
+        """Build a hasher from BCRYPT_ROUNDS / PASSWORD_WORKERS / PASSWORD_MAX_PENDING"""
+        workers = int(os.environ.get('PASSWORD_WORKERS', 0)) or None
+        max_pending = int(os.environ.get('PASSWORD_MAX_PENDING', 0)) or None
+        return cls(workers, max_pending, rounds=int(os.environ.get('BCRYPT_ROUNDS', DEFAULT_ROUNDS)))
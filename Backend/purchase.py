@@ -0,0 +1,183 @@
+"""
+The purchase path behind POST /transactions.
+
+A purchase is one transaction that takes row locks in a fixed order:
+
+1. claim the artwork with a conditional UPDATE, which flips it to sold
+   only if it is available, held by this buyer, or held by someone whose
+   hold has lapsed (see reservations.py);
+2. insert the transactions row;
+3. add the sale to the seller's user_stats.
+
+Because of the conditional UPDATE, only one buyer can ever get past step
+1. Concurrent buyers of the same piece queue on its row lock for as long
+as the winner's transaction runs. They then match no row and are
+turned away. They never insert a second sale or touch the seller's
+counters.
+
+A client may send an Idempotency-Key. The key is stored on the
+transaction under a unique (buyer_id, idempotency_key) index. A retry
+with the same key replays the original result instead of buying again.
+The lookup runs only after the claim fails, so the first attempt pays
+nothing extra. A retry that raced the original waits on the row lock and
+then finds the committed key.
+
+A deadlock (1213) or lock wait timeout (1205) rolls the attempt back. The
+purchase is then retried after an exponential backoff with full jitter,
+up to PURCHASE_RETRIES times.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+import reservations
+import user_stats
+
+log = logging.getLogger(__name__)
+
+ER_DUP_ENTRY = 1062
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+RETRYABLE = (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT)
+
+MAX_KEY_LENGTH = 64
+
+
+class PurchaseRejected(ValueError):
+    """The purchase can't go ahead; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def artwork_id(value):
+    """The request's artwork id as an int; JSON clients may send "12" as well as 12"""
+    if isinstance(value, bool):
+        raise PurchaseRejected('artwork_id must be an integer', 400)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise PurchaseRejected('artwork_id must be an integer', 400)
+
+
+def idempotency_key(value):
+    """A cleaned Idempotency-Key header value, or None when the client sent none"""
+    if value is None or not value.strip():
+        return None
+    value = value.strip()
+    if len(value) > MAX_KEY_LENGTH:
+        raise PurchaseRejected(f'Idempotency-Key is longer than {MAX_KEY_LENGTH} characters', 400)
+    return value
+
+
+class PurchaseEngine:
+    """Runs purchases on a caller's connection, retrying deadlocks with backoff"""
+
+    def __init__(self, retries=4, backoff=0.02, max_backoff=0.5):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._counters = {'completed': 0, 'replayed': 0, 'unavailable': 0, 'key_conflicts': 0,
+                          'deadlock_retries': 0, 'gave_up': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build from PURCHASE_RETRIES / PURCHASE_BACKOFF_MS"""
+        return cls(retries=int(os.environ.get('PURCHASE_RETRIES', 4)),
+                   backoff=float(os.environ.get('PURCHASE_BACKOFF_MS', 20)) / 1000)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def buy(self, conn, buyer_id, artwork_id, amount, payment_method='credit_card', notes='', key=None):
+        """Buy an artwork and commit.
+
+        Returns {'transaction_id', 'seller_id', 'replayed'}. Raises
+        PurchaseRejected when the artwork can't be bought or the key
+        belongs to another purchase.
+        """
+        attempt = 0
+        while True:
+            cursor = conn.cursor()
+            try:
+                result = self._attempt(cursor, buyer_id, artwork_id, amount, payment_method, notes, key)
+                conn.commit()
+                self._count('replayed' if result['replayed'] else 'completed')
+                return result
+            except PurchaseRejected:
+                conn.rollback()
+                raise
+            except Exception as e:
+                conn.rollback()
+                if getattr(e, 'errno', None) not in RETRYABLE:
+                    raise
+                if attempt >= self.retries:
+                    self._count('gave_up')
+                    raise
+                attempt += 1
+                self._count('deadlock_retries')
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                log.info("Purchase of artwork %s hit %s; retry %d in %.0fms",
+                         artwork_id, e.errno, attempt, delay * 1000)
+                time.sleep(delay)
+            finally:
+                cursor.close()
+
+    def _attempt(self, cursor, buyer_id, artwork_id, amount, payment_method, notes, key):
+        cursor.execute(
+            "UPDATE artworks SET status = 'sold', reserved_by = NULL, reserved_until = NULL "
+            f"WHERE id = %s AND created_by <> %s AND {reservations.CLAIMABLE_SQL}",
+            (artwork_id, buyer_id, buyer_id)
+        )
+        if cursor.rowcount != 1:
+            return self._unclaimed(cursor, buyer_id, artwork_id, key)
+
+        # Locked by the claim, so this reads the row we just changed
+        cursor.execute('SELECT created_by FROM artworks WHERE id = %s', (artwork_id,))
+        seller_id = cursor.fetchone()[0]
+        try:
+            cursor.execute('''
+                INSERT INTO transactions (buyer_id, seller_id, artwork_id, amount, payment_method, notes,
+                                          status, idempotency_key)
+                VALUES (%s, %s, %s, %s, %s, %s, 'completed', %s)
+            ''', (buyer_id, seller_id, artwork_id, amount, payment_method, notes, key))
+        except Exception as e:
+            if key is None or getattr(e, 'errno', None) != ER_DUP_ENTRY:
+                raise
+            # The key already bought a different artwork; buy() rolls this claim back
+            self._count('key_conflicts')
+            raise PurchaseRejected('Idempotency-Key was already used for a different purchase', 422)
+        transaction_id = cursor.lastrowid
+        user_stats.apply_delta(cursor, seller_id, sales_count=1, total_earnings=user_stats.as_amount(amount))
+        return {'transaction_id': transaction_id, 'seller_id': seller_id, 'replayed': False}
+
+    def _unclaimed(self, cursor, buyer_id, artwork_id, key):
+        """Why the claim matched no row: a replayed key, or a rejection"""
+        if key is not None:
+            cursor.execute(
+                'SELECT id, seller_id, artwork_id FROM transactions WHERE buyer_id = %s AND idempotency_key = %s',
+                (buyer_id, key)
+            )
+            previous = cursor.fetchone()
+            if previous is not None:
+                if previous[2] != artwork_id:
+                    self._count('key_conflicts')
+                    raise PurchaseRejected('Idempotency-Key was already used for a different purchase', 422)
+                return {'transaction_id': previous[0], 'seller_id': previous[1], 'replayed': True}
+
+        message, status = reservations.unavailable(reservations.describe(cursor, artwork_id), buyer_id)
+        if status != 400:
+            self._count('unavailable')
+        raise PurchaseRejected(message, status)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['retries'] = self.retries
+        return stats
@@ -0,0 +1,101 @@
+"""
+EXPLAIN-based regression check for the hot list and dashboard queries.
+
+Run with `python update_database.py check-plans`. A query fails when any
+table in its plan is read with a full scan (type=ALL) or needs a
+filesort, unless that table is smaller than `min_rows` (the optimizer
+legitimately scans tiny tables) or the query explicitly allows it.
+"""
+
+import dashboard_stats
+import marketplace_search
+import reservations
+import transaction_history
+
+SAMPLE_USER = 1
+SAMPLE_DATE = '2100-01-01 00:00:00'
+
+ARTWORK_SELECT = '''
+    SELECT a.id, a.title, a.price, a.image_url, a.status, a.created_at,
+           c.name AS category_name, ar.name AS artist_name
+    FROM artworks a
+    LEFT JOIN categories c ON a.category_id = c.id
+    LEFT JOIN artists ar ON a.artist_id = ar.id
+'''
+
+# (name, sql, params, allowed problems)
+HOT_QUERIES = [
+    ('artworks list', ARTWORK_SELECT + '''
+        WHERE (a.created_at < %s OR (a.created_at = %s AND a.id < %s))
+        ORDER BY a.created_at DESC, a.id DESC LIMIT 51
+    ''', (SAMPLE_DATE, SAMPLE_DATE, 2 ** 31 - 1), ()),
+    ('my artworks', ARTWORK_SELECT + '''
+        WHERE a.created_by = %s
+        ORDER BY a.created_at DESC, a.id DESC LIMIT 51
+    ''', (SAMPLE_USER,), ()),
+    ('marketplace', ARTWORK_SELECT + '''
+        WHERE a.status = 'available' AND a.created_by != %s
+        ORDER BY a.created_at DESC, a.id DESC LIMIT 51
+    ''', (SAMPLE_USER,), ()),
+    # Each side of the transaction history UNION must be an ordered index range
+    ('transactions (buyer side)', '''
+        SELECT t.id, t.transaction_date FROM transactions t
+        WHERE t.buyer_id = %s
+        ORDER BY t.transaction_date DESC, t.id DESC LIMIT 51
+    ''', (SAMPLE_USER,), ()),
+    ('transactions (seller side)', '''
+        SELECT t.id, t.transaction_date FROM transactions t
+        WHERE t.seller_id = %s
+        ORDER BY t.transaction_date DESC, t.id DESC LIMIT 51
+    ''', (SAMPLE_USER,), ()),
+    ('portfolio', '''
+        SELECT * FROM artist_portfolios WHERE artist_id = %s
+        ORDER BY created_at DESC, id DESC LIMIT 51
+    ''', (SAMPLE_USER,), ()),
+    # The outer merge sorts at most two pages of ids
+    ('transaction history',
+     *transaction_history.history_query(SAMPLE_USER, transaction_history.page_for({})),
+     ('filesort',)),
+    # Matches come from the full-text indexes; ranking and facet grouping sort in memory
+    ('marketplace search',
+     *marketplace_search.Search({'q': 'landscape'}).query(SAMPLE_USER),
+     ('filesort',)),
+    # The expiry sweeper's batch: a range on (status, reserved_until)
+    ('reservation sweep', reservations.EXPIRED_SQL, (500,), ()),
+    # The per-user category breakdown, histogram and UNION result are small
+    # and sorted in Python; only full scans matter there.
+    ('dashboard stats', dashboard_stats.COLLECTOR_STATS_SQL,
+     (SAMPLE_USER,) * dashboard_stats.COLLECTOR_STATS_SQL.count('%s'), ('filesort',)),
+    ('artist dashboard stats', dashboard_stats.ARTIST_STATS_SQL,
+     (SAMPLE_USER,) * dashboard_stats.ARTIST_STATS_SQL.count('%s'), ('filesort',)),
+]
+
+
+def plan_problems(plan, allowed=(), min_rows=100):
+    """Problems in EXPLAIN output rows (dicts), e.g. ['artworks: full scan']"""
+    problems = []
+    for step in plan:
+        table = step.get('table') or '?'
+        rows = step.get('rows') or 0
+        if table.startswith('<') or int(rows) < min_rows:
+            # Derived/union result tables, or tables too small to matter
+            continue
+        if step.get('type') == 'ALL' and 'full scan' not in allowed:
+            problems.append(f'{table}: full scan (~{rows} rows)')
+        if 'Using filesort' in (step.get('Extra') or '') and 'filesort' not in allowed:
+            problems.append(f'{table}: filesort (~{rows} rows)')
+    return problems
+
+
+def check_plans(cursor, min_rows=100):
+    """EXPLAIN every hot query; returns {name: problems} for the failing ones"""
+    failures = {}
+    for name, sql, params, allowed in HOT_QUERIES:
+        cursor.execute('EXPLAIN ' + sql, params)
+        problems = plan_problems(cursor.fetchall(), allowed, min_rows)
+        if problems:
+            failures[name] = problems
+        print(f"  {'FAIL' if problems else 'ok':<4} {name}")
+        for problem in problems:
+            print(f"       {problem}")
+    return failures
@@ -0,0 +1,194 @@
+"""
+Checkout holds on artworks, using the `reserved` status.
+
+POST /artworks/<id>/reserve gives the caller a hold for
+RESERVATION_SECONDS (default 600). A single conditional UPDATE sets
+status = 'reserved', reserved_by and reserved_until, so exactly one buyer
+wins a contested piece. The others get a 409 straight away, instead of
+queueing on the row lock in the purchase transaction. The holder can
+renew the hold the same way, or give it up with DELETE. A purchase
+(purchase.py) accepts an artwork that is available, held by the buyer,
+or held by someone whose hold has lapsed.
+
+Held artworks have status 'reserved', so the marketplace query
+(status = 'available' on idx_artworks_status_created) drops them in the
+index. A sweeper thread returns lapsed holds to 'available'. It picks
+them on idx_artworks_status_reserved in batches of RESERVATION_SWEEP_BATCH
+(default 500), every RESERVATION_SWEEP_INTERVAL seconds (default 30).
+Every time comparison uses the database's NOW(), so app hosts can't
+disagree about when a hold ends. Rows marked 'reserved' without a
+reserved_until (older imports or edits) are never swept.
+"""
+
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# WHERE fragment: the artwork can be claimed by the user given as its one parameter
+CLAIMABLE_SQL = ("(status = 'available' OR (status = 'reserved' AND "
+                 "(reserved_by = %s OR reserved_until < NOW())))")
+
+# Lapsed holds, oldest first, read from idx_artworks_status_reserved
+EXPIRED_SQL = ("SELECT id, created_by FROM artworks WHERE status = 'reserved' AND reserved_until < NOW() "
+               "ORDER BY reserved_until LIMIT %s")
+
+DESCRIBE_SQL = ('SELECT created_by, status, reserved_by, reserved_until, reserved_until > NOW() '
+                'FROM artworks WHERE id = %s')
+
+
+class ReservationRejected(ValueError):
+    """The hold can't be placed; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def describe(cursor, artwork_id):
+    """The artwork's owner and hold state, or None if it doesn't exist"""
+    cursor.execute(DESCRIBE_SQL, (artwork_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    created_by, status, reserved_by, reserved_until, active = row
+    return {'created_by': created_by, 'status': status, 'reserved_by': reserved_by,
+            'reserved_until': reserved_until, 'active': bool(active)}
+
+
+def held_by(artwork, user_id):
+    return (artwork is not None and artwork['status'] == 'reserved'
+            and artwork['reserved_by'] == user_id and artwork['active'])
+
+
+def unavailable(artwork, user_id):
+    """(message, HTTP status) explaining why `user_id` can't claim `artwork`"""
+    if artwork is not None and artwork['created_by'] == user_id:
+        return 'Cannot buy your own artwork', 400
+    if artwork is not None and artwork['status'] == 'reserved' and artwork['active']:
+        return 'Artwork is reserved by another buyer', 409
+    return 'Artwork not found or not available', 404
+
+
+class Reservations:
+    """Places and releases holds, and expires lapsed ones in the background"""
+
+    def __init__(self, hold_seconds=600, sweep_interval=30, batch_size=500):
+        self.hold_seconds = hold_seconds
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._counters = {'reserved': 0, 'released': 0, 'rejected': 0,
+                          'expired': 0, 'sweeps': 0, 'sweep_errors': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build from RESERVATION_SECONDS / RESERVATION_SWEEP_INTERVAL / RESERVATION_SWEEP_BATCH"""
+        return cls(hold_seconds=int(os.environ.get('RESERVATION_SECONDS', 600)),
+                   sweep_interval=float(os.environ.get('RESERVATION_SWEEP_INTERVAL', 30)),
+                   batch_size=int(os.environ.get('RESERVATION_SWEEP_BATCH', 500)))
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self._counters[name] += delta
+
+    def reserve(self, cursor, artwork_id, user_id):
+        """Hold (or renew the caller's hold on) an artwork; returns the hold's description.
+
+        The caller commits. Raises ReservationRejected if the artwork is
+        missing, sold, the caller's own, or held by someone else.
+        """
+        cursor.execute(
+            "UPDATE artworks SET status = 'reserved', reserved_by = %s, "
+            "reserved_until = NOW() + INTERVAL %s SECOND "
+            f"WHERE id = %s AND created_by <> %s AND {CLAIMABLE_SQL}",
+            (user_id, self.hold_seconds, artwork_id, user_id, user_id)
+        )
+        artwork = describe(cursor, artwork_id)
+        # Not rowcount: a renewal within the same second changes no column and matches 0 rows
+        if not held_by(artwork, user_id):
+            self._count('rejected')
+            raise ReservationRejected(*unavailable(artwork, user_id))
+        self._count('reserved')
+        return artwork
+
+    def release(self, cursor, artwork_id, user_id):
+        """Give up the caller's hold; False if they don't hold it. The caller commits."""
+        cursor.execute(
+            "UPDATE artworks SET status = 'available', reserved_by = NULL, reserved_until = NULL "
+            "WHERE id = %s AND status = 'reserved' AND reserved_by = %s",
+            (artwork_id, user_id)
+        )
+        released = cursor.rowcount == 1
+        if released:
+            self._count('released')
+        return released
+
+    def sweep(self, conn):
+        """Return every lapsed hold to 'available', one committed batch at a time.
+
+        Returns the owners of the swept artworks, whose dashboards show the
+        status. Each batch's UPDATE re-checks the hold, so a hold renewed or
+        bought since the SELECT is left alone, and so are rows another
+        worker's sweeper got to first.
+        """
+        owners = set()
+        cursor = conn.cursor()
+        try:
+            while True:
+                cursor.execute(EXPIRED_SQL, (self.batch_size,))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                placeholders = ', '.join(['%s'] * len(rows))
+                cursor.execute(
+                    "UPDATE artworks SET status = 'available', reserved_by = NULL, reserved_until = NULL "
+                    f"WHERE id IN ({placeholders}) AND status = 'reserved' AND reserved_until < NOW()",
+                    tuple(row[0] for row in rows)
+                )
+                expired = cursor.rowcount
+                conn.commit()
+                self._count('expired', expired)
+                owners.update(row[1] for row in rows)
+                if len(rows) < self.batch_size or not expired:
+                    break
+        finally:
+            cursor.close()
+        self._count('sweeps')
+        return owners
+
+    def start_sweeper(self, connect, on_expired=None):
+        """Sweep every `sweep_interval` seconds on connections from connect() (<= 0 = never).
+
+        on_expired(owners) runs after a sweep that released any holds.
+        """
+        if self.sweep_interval <= 0:
+            return None
+
+        def run():
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    conn = connect()
+                    try:
+                        owners = self.sweep(conn)
+                    finally:
+                        conn.close()
+                    if owners and on_expired is not None:
+                        on_expired(owners)
+                except Exception as e:
+                    self._count('sweep_errors')
+                    log.error("Reservation sweep failed: %s", e)
+
+        thread = threading.Thread(target=run, name='reservation-sweeper', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['hold_seconds'] = self.hold_seconds
+        stats['sweep_interval'] = self.sweep_interval
+        return stats
@@ -0,0 +1,35 @@
+"""
+Compact result rows for list endpoints.
+
+Cursors return plain tuples; each distinct column list gets one slotted
+dataclass, so a row costs one small object instead of a dict, and the JSON
+provider serializes it without converting it to a dict first.
+"""
+
+import dataclasses
+
+_ROW_TYPES = {}
+
+
+def row_type(columns):
+    """Slotted dataclass with one field per column, created once per column list"""
+    columns = tuple(columns)
+    cls = _ROW_TYPES.get(columns)
+    if cls is None:
+        cls = dataclasses.make_dataclass('Row', columns, slots=True)
+        _ROW_TYPES[columns] = cls
+    return cls
+
+
+def to_rows(columns, tuples):
+    """Row objects for cursor tuples; extra trailing values in each tuple are dropped"""
+    cls = row_type(columns)
+    width = len(cls.__slots__)
+    if tuples and len(tuples[0]) == width:
+        return [cls(*values) for values in tuples]
+    return [cls(*values[:width]) for values in tuples]
+
+
+def fetch_rows(cursor):
+    """fetchall() from a tuple cursor as Row objects named after the result columns"""
+    return to_rows(cursor.column_names, cursor.fetchall())
@@ -1,24 +1,59 @@
 import os
-from flask import Flask, request, jsonify, session
+import logging
+from flask import Flask, Response, request, jsonify, session, g, has_app_context, stream_with_context
 from flask_cors import CORS
 import mysql.connector
-import bcrypt
-import jwt
-from datetime import datetime, timedelta
-from functools import wraps
+from functools import partial
+from db_pool import ConnectionPool, ReplicaRouter, replica_hosts
+from pagination import Page, InvalidPageRequest
+from rows import fetch_rows
+from json_provider import FastJSONProvider
+import dashboard_stats
+from cache import ResultCache
+import user_stats
+import transaction_history
+import streaming
+import marketplace_search
+import typeahead
+import artwork_import
+import artwork_batch
+import collection_export
+import app_logging
+import http_cache
+import purchase
+import reservations
+from compression import Compressor
+from auth import Authenticator
+from instrumentation import Instrumentation
+from passwords import PasswordHasher, PasswordHasherBusy
+
+# JSON lines with request ids, written by a background thread so handlers never block on stdout
+app_logging.configure()
+log = logging.getLogger('server')
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+app_logging.init_app(app)
+
+# Request and SQL latency histograms for /metrics, plus the slow query log
+instrumentation = Instrumentation.from_env()
+instrumentation.init_app(app)
+
+# gzip/brotli for large JSON bodies; registered after instrumentation so its timings include compression
+compressor = Compressor.from_env()
+compressor.init_app(app)
 
 # More flexible CORS configuration for production
+CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:3000', 'http://localhost:8080', 'http://localhost:*', 
+                'https://ruwaga1231.pythonanywhere.com', 
+                'https://art-space-frontend.vercel.app',
+                'https://*.vercel.app',
+                'https://gravity-space-rose.vercel.app'
+               ]  # Also allow Netlify if you use it
 CORS(app, 
-     origins=['http://localhost:5173', 'http://localhost:3000', 'http://localhost:8080', 'http://localhost:*', 
-              'https://ruwaga1231.pythonanywhere.com', 
-              'https://art-space-frontend.vercel.app',
-              'https://*.vercel.app',
-              'https://gravity-space-rose.vercel.app'
-            ],  # Also allow Netlify if you use it
+     origins=CORS_ORIGINS,
      supports_credentials=True,
-     allow_headers=['Content-Type', 'Authorization'],
+     allow_headers=['Content-Type', 'Authorization', 'Idempotency-Key'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
 
 # Set a strong secret key for production
@@ -42,57 +77,162 @@ DB_CONFIG = {
     'port':os.environ.get('DB_PORT', 3306)
 }
 
-def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
-
-def create_jwt_token(user_id, role):
-    """Create a JWT token for the user"""
-    payload = {
-        'user_id': user_id,
-        'role': role,
-        'exp': datetime.utcnow() + timedelta(days=7),  # Token expires in 7 days
-        'iat': datetime.utcnow()
-    }
-    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
-
-def verify_jwt_token(token):
-    """Verify and decode a JWT token"""
+# Connections are reused across requests instead of paying a TCP + auth handshake each time
+db_pool = ConnectionPool.from_env(partial(mysql.connector.connect, **DB_CONFIG),
+                                  wrap_cursor=instrumentation.cursor)
+
+# Optional read replicas (same credentials and schema): DB_REPLICA_HOSTS=host[:port],...
+REPLICA_CONFIGS = [dict(DB_CONFIG, host=host, port=port)
+                   for host, port in replica_hosts(os.environ.get('DB_REPLICA_HOSTS', ''))]
+db = ReplicaRouter.from_env(db_pool, [ConnectionPool.from_env(partial(mysql.connector.connect, **config),
+                                                              wrap_cursor=instrumentation.cursor)
+                                      for config in REPLICA_CONFIGS])
+
+def get_db_connection(readonly=False):
+    """Check out a pooled connection; conn.close() returns it to the pool.
+
+    readonly=True lets a replica serve it, unless this user wrote recently or
+    the tables behind the request's ETag just changed.
+    """
+    if not has_app_context():
+        return db.connection(readonly)
+    return db.connection(readonly, user_id=g.get('user_id'), changed_at=g.get('tables_changed_at'))
+
+@app.after_request
+def pin_writer_to_primary(response):
+    """A user's reads go to the primary for a few seconds after any write request they make"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and g.get('user_id') is not None:
+        db.note_write(g.user_id)
+    return response
+
+# Dashboard results are cached per user and dropped whenever data they summarize changes
+STATS_ENDPOINTS = ('dashboard/stats', 'dashboard/artist-stats')
+stats_cache = ResultCache.from_env(STATS_ENDPOINTS, dumps=app.json.dumps, loads=app.json.loads)
+# Their next dashboard must not be read (and cached) from a replica that hasn't caught up
+stats_cache.on_invalidate = db.note_write
+
+def dashboard_owners(cursor, table, row_id):
+    """Users whose dashboards show the given category or artist row.
+
+    The row's own creator comes first.
+    """
+    cursor.execute(f'SELECT created_by FROM {table} WHERE id = %s', (row_id,))
+    owners = [row[0] for row in cursor.fetchall()]
+    # Recent-artwork lists show category and artist names
+    column = 'category_id' if table == 'categories' else 'artist_id'
+    cursor.execute(f'SELECT DISTINCT created_by FROM artworks WHERE {column} = %s', (row_id,))
+    owners += [row[0] for row in cursor.fetchall()]
+    return owners
+
+# Catalogue reads carry ETags from per-table versions; writes bump them after committing
+catalogue_cache = http_cache.ConditionalGet.from_env()
+
+# Claims the artwork with a conditional UPDATE; idempotency keys and deadlock retries, see purchase.py
+purchases = purchase.PurchaseEngine.from_env()
+
+# Time-limited checkout holds (status 'reserved'); lapsed ones are swept back to available
+holds = reservations.Reservations.from_env()
+
+def stream_list(key, sql, params, page):
+    """Chunked `{key: [...], next_cursor}` response for ?stream=1 list requests"""
+    conn = get_db_connection(readonly=True)
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
-
-def require_auth(f):
-    """Decorator to require authentication via JWT or session"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        # First try to get user from session (for same-domain requests)
-        if 'user_id' in session:
-            return f(*args, **kwargs)
-        
-        # Then try to get user from JWT token (for cross-domain requests)
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            payload = verify_jwt_token(token)
-            if payload:
-                # Store user info in request context for this request
-                request.user_id = payload['user_id']
-                request.user_role = payload['role']
-                return f(*args, **kwargs)
-        
-        return jsonify({'error': 'Unauthorized'}), 401
-    
-    return decorated_function
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql, params)
+    except Exception as e:
+        log.exception("Stream %s error: %s", key, e)
+        conn.invalidate()
+        conn.close()
+        return jsonify({'error': str(e)}), 500
+    body = streaming.json_chunks(key, conn, cursor, page, dumps=app.json.dumps)
+    return streaming.release_on_close(Response(stream_with_context(body), mimetype='application/json'), conn)
+
+# Projectable fields for the paginated list endpoints (?fields=a,b,c)
+ARTWORK_FIELDS = {
+    'id': 'a.id',
+    'title': 'a.title',
+    'description': 'a.description',
+    'price': 'a.price',
+    'image_url': 'a.image_url',
+    'category_id': 'a.category_id',
+    'artist_id': 'a.artist_id',
+    'created_by': 'a.created_by',
+    'created_at': 'a.created_at',
+    'status': 'a.status',
+    'category_name': 'c.name',
+    'artist_name': 'ar.name',
+}
+MY_ARTWORK_FIELDS = {k: v for k, v in ARTWORK_FIELDS.items() if k != 'artist_name'}
+MARKETPLACE_FIELDS = dict(ARTWORK_FIELDS, seller_name='u.name')
+
+PORTFOLIO_FIELDS = {
+    'id': 'id',
+    'artist_id': 'artist_id',
+    'title': 'title',
+    'description': 'description',
+    'image_url': 'image_url',
+    'portfolio_type': 'portfolio_type',
+    'created_at': 'created_at',
+    'external_link': 'external_link',
+}
+
+# Every protected route resolves its user through one authenticator (Bearer JWT or session)
+auth = Authenticator.from_env(
+    JWT_SECRET,
+    denylist_backend=stats_cache.backend if os.environ.get('CACHE_BACKEND') == 'redis' else None,
+)
+auth.init_app(app)
+require_auth = auth.require_auth
+
+# bcrypt runs in worker processes; a full queue answers 429 instead of stalling every endpoint
+passwords = PasswordHasher.from_env()
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    response = jsonify({'error': 'Too many sign-in attempts in progress, please retry shortly'})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+# Autocomplete is answered from memory; the write handlers below keep the index current
+typeahead_index = typeahead.TypeaheadIndex()
+
+def load_typeahead_entries():
+    """(kind, id, label) for every artwork, artist and category"""
+    conn = get_db_connection(readonly=True)
+    cursor = conn.cursor()
+    try:
+        entries = []
+        for kind, sql in (('artwork', 'SELECT id, title FROM artworks'),
+                          ('artist', 'SELECT id, name FROM artists'),
+                          ('category', 'SELECT id, name FROM categories')):
+            cursor.execute(sql)
+            entries.extend((kind, row_id, label) for row_id, label in cursor.fetchall())
+        return entries
+    finally:
+        cursor.close()
+        conn.close()
+
+def holds_expired(owners):
+    """After the sweeper frees lapsed holds: their owners' dashboards and the catalogue changed"""
+    for owner in owners:
+        stats_cache.invalidate(owner)
+    catalogue_cache.bump('artworks')
+
+def start_background_tasks(build_index=True):
+    """Start this process's typeahead refresh and reservation sweeper threads; gunicorn_conf.py calls it in each worker"""
+    typeahead.start_refresh(typeahead_index, load_typeahead_entries, typeahead.refresh_interval(),
+                            build_now=build_index)
+    holds.start_sweeper(get_db_connection, on_expired=holds_expired)
+
+# Under a preloading server threads would be started in the master and lost at fork
+if os.environ.get('BACKGROUND_TASKS') != 'post_fork':
+    start_background_tasks()
 
 @app.route('/dashboard/stats/test', methods=['GET'])
 def get_dashboard_stats_test():
     """Test endpoint that doesn't require authentication"""
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cursor = conn.cursor(dictionary=True)
         
         # Get a test user ID (first user in the system)
@@ -103,7 +243,7 @@ def get_dashboard_stats_test():
             return jsonify({'error': 'No users found in database'}), 404
         
         user_id = user_result['id']
-        print(f"Testing dashboard stats for user_id: {user_id}")
+        log.debug("Testing dashboard stats for user_id: %s", user_id)
         
         # Get total counts
         cursor.execute('SELECT COUNT(*) as total_categories FROM categories WHERE created_by = %s', (user_id,))
@@ -137,9 +277,7 @@ def get_dashboard_stats_test():
         return jsonify(result), 200
         
     except Exception as e:
-        print(f"Test dashboard stats error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Test dashboard stats error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/debug/session', methods=['GET'])
@@ -154,6 +292,62 @@ def debug_session():
         'headers': dict(request.headers)
     }), 200
 
+@app.route('/debug/pool', methods=['GET'])
+def debug_pool():
+    """Debug endpoint to check connection pool metrics"""
+    return jsonify(db.status()), 200
+
+@app.route('/debug/queries', methods=['GET'])
+def debug_queries():
+    """Debug endpoint listing the statements that took the most total time"""
+    return jsonify(instrumentation.slowest_statements()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint: request and SQL latency histograms, slow queries, pool occupancy"""
+    pool = db.status()
+    gauges = {f'db_pool_{name}': pool[name] for name in ('opened', 'idle', 'in_use', 'overflow')}
+    gauges.update({f'db_routing_{name}': count for name, count in pool['routing'].items()})
+    gauges['db_replicas_healthy'] = sum(replica['healthy'] for replica in pool['replicas'])
+    gauges['log_records_dropped'] = app_logging.dropped()
+    http_stats = catalogue_cache.stats()
+    gauges.update({f'http_cache_{name}': http_stats[name] for name in ('not_modified', 'full', 'bytes_saved')})
+    compression = compressor.stats()
+    gauges.update({f'compression_{name}': compression[name]
+                   for name in ('bytes_in', 'bytes_out', 'cpu_seconds', 'cache_hits')})
+    purchase_stats = purchases.stats()
+    gauges.update({f'purchases_{name}': purchase_stats[name]
+                   for name in ('completed', 'replayed', 'unavailable', 'deadlock_retries', 'gave_up')})
+    hold_stats = holds.stats()
+    gauges.update({f'reservations_{name}': hold_stats[name]
+                   for name in ('reserved', 'released', 'rejected', 'expired', 'sweep_errors')})
+    return instrumentation.response(gauges)
+
+@app.route('/debug/cache', methods=['GET'])
+def debug_cache():
+    """Debug endpoint to check dashboard cache hit/miss counters"""
+    return jsonify(stats_cache.stats()), 200
+
+@app.route('/debug/http-cache', methods=['GET'])
+def debug_http_cache():
+    """Debug endpoint to check ETag revalidations (304s), hit ratio and bytes saved"""
+    return jsonify(catalogue_cache.stats()), 200
+
+@app.route('/debug/compression', methods=['GET'])
+def debug_compression():
+    """Debug endpoint to check compression ratio, CPU time and precompressed cache hits"""
+    return jsonify(compressor.stats()), 200
+
+@app.route('/debug/typeahead', methods=['GET'])
+def debug_typeahead():
+    """Debug endpoint to check typeahead index size and truncated searches"""
+    return jsonify(typeahead_index.stats()), 200
+
+@app.route('/debug/auth/metrics', methods=['GET'])
+def debug_auth_metrics():
+    """Debug endpoint to check token cache, per-request auth overhead and the bcrypt pool"""
+    return jsonify(dict(auth.stats(), passwords=passwords.stats())), 200
+
 @app.route('/debug/auth', methods=['GET'])
 def debug_auth():
     """Debug endpoint to check authentication status"""
@@ -174,125 +368,24 @@ def debug_auth():
 @app.route('/dashboard/stats', methods=['GET'])
 @require_auth
 def get_dashboard_stats():
-    # Get user_id from either session or JWT token
-    user_id = session.get('user_id') or getattr(request, 'user_id', None)
+    user_id = g.user_id
     
-    if not user_id:
-        return jsonify({'error': 'Unauthorized'}), 401
+    cached = stats_cache.get('dashboard/stats', user_id)
+    if cached is not None:
+        return jsonify(cached), 200
+    generation = stats_cache.generation(user_id)
     
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cursor = conn.cursor(dictionary=True)
         
-        print(f"Fetching dashboard stats for user_id: {user_id}")
-        
-        # Get total counts
-        try:
-            cursor.execute('SELECT COUNT(*) as total_categories FROM categories WHERE created_by = %s', (user_id,))
-            total_categories = cursor.fetchone()['total_categories']
-            print(f"Total categories: {total_categories}")
-        except Exception as e:
-            print(f"Error getting categories count: {e}")
-            total_categories = 0
-        
-        try:
-            cursor.execute('SELECT COUNT(*) as total_artists FROM artists WHERE created_by = %s', (user_id,))
-            total_artists = cursor.fetchone()['total_artists']
-            print(f"Total artists: {total_artists}")
-        except Exception as e:
-            print(f"Error getting artists count: {e}")
-            total_artists = 0
-        
-        try:
-            cursor.execute('SELECT COUNT(*) as total_artworks FROM artworks WHERE created_by = %s', (user_id,))
-            total_artworks = cursor.fetchone()['total_artworks']
-            print(f"Total artworks: {total_artworks}")
-        except Exception as e:
-            print(f"Error getting artworks count: {e}")
-            total_artworks = 0
-        
-        # Get total value of artworks
-        try:
-            cursor.execute('SELECT COALESCE(SUM(price), 0) as total_value FROM artworks WHERE created_by = %s', (user_id,))
-            total_value = cursor.fetchone()['total_value']
-            # Convert Decimal to float
-            if hasattr(total_value, '__float__'):
-                total_value = float(total_value)
-            print(f"Total value: {total_value}")
-        except Exception as e:
-            print(f"Error getting total value: {e}")
-            total_value = 0.0
-        
-        # Get artworks by category
-        try:
-            cursor.execute('''
-                SELECT c.name as category_name, COUNT(a.id) as artwork_count 
-                FROM categories c 
-                LEFT JOIN artworks a ON c.id = a.category_id AND a.created_by = %s
-                WHERE c.created_by = %s 
-                GROUP BY c.id, c.name
-                ORDER BY artwork_count DESC
-            ''', (user_id, user_id))
-            artworks_by_category = cursor.fetchall()
-            print(f"Artworks by category: {len(artworks_by_category)} categories")
-        except Exception as e:
-            print(f"Error getting artworks by category: {e}")
-            artworks_by_category = []
-        
-        # Get recent artworks (last 5)
-        try:
-            cursor.execute('''
-                SELECT a.title, a.price, c.name as category_name, ar.name as artist_name, a.created_at
-                FROM artworks a 
-                LEFT JOIN categories c ON a.category_id = c.id 
-                LEFT JOIN artists ar ON a.artist_id = ar.id 
-                WHERE a.created_by = %s 
-                ORDER BY a.created_at DESC 
-                LIMIT 5
-            ''', (user_id,))
-            recent_artworks = cursor.fetchall()
-            # Convert Decimal prices to float
-            for artwork in recent_artworks:
-                if 'price' in artwork and hasattr(artwork['price'], '__float__'):
-                    artwork['price'] = float(artwork['price'])
-            print(f"Recent artworks: {len(recent_artworks)} artworks")
-        except Exception as e:
-            print(f"Error getting recent artworks: {e}")
-            recent_artworks = []
-        
-        # Get monthly artwork additions (last 6 months)
-        try:
-            cursor.execute('''
-                SELECT DATE_FORMAT(created_at, '%Y-%m') as month, COUNT(*) as count
-                FROM artworks 
-                WHERE created_by = %s 
-                AND created_at >= DATE_SUB(NOW(), INTERVAL 6 MONTH)
-                GROUP BY DATE_FORMAT(created_at, '%Y-%m')
-                ORDER BY month
-            ''', (user_id,))
-            monthly_artworks = cursor.fetchall()
-            print(f"Monthly artworks: {len(monthly_artworks)} months")
-        except Exception as e:
-            print(f"Error getting monthly artworks: {e}")
-            monthly_artworks = []
-        
-        result = {
-            'total_categories': total_categories,
-            'total_artists': total_artists,
-            'total_artworks': total_artworks,
-            'total_value': total_value,
-            'artworks_by_category': artworks_by_category,
-            'recent_artworks': recent_artworks,
-            'monthly_artworks': monthly_artworks
-        }
+        result = dashboard_stats.collector_stats(cursor, user_id)
+        stats_cache.set('dashboard/stats', user_id, result, generation)
         
-        print("Dashboard stats generated successfully")
         return jsonify(result), 200
         
     except Exception as e:
-        print(f"Dashboard stats error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Dashboard stats error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         try:
@@ -302,86 +395,25 @@ def get_dashboard_stats():
             pass
 
 @app.route('/dashboard/artist-stats', methods=['GET'])
+@require_auth
 def get_artist_dashboard_stats():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
+    user_id = g.user_id
+    cached = stats_cache.get('dashboard/artist-stats', user_id)
+    if cached is not None:
+        return jsonify(cached), 200
+    generation = stats_cache.generation(user_id)
     
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cursor = conn.cursor(dictionary=True)
         
-        user_id = session['user_id']
-        print(f"Fetching artist dashboard stats for user_id: {user_id}")
-        
-        # Get total artworks by this artist
-        cursor.execute('SELECT COUNT(*) as total_artworks FROM artworks WHERE created_by = %s', (user_id,))
-        total_artworks = cursor.fetchone()['total_artworks']
-        
-        # Get total sales (completed transactions where artist is seller)
-        cursor.execute('''
-            SELECT COUNT(*) as total_sales, COALESCE(SUM(amount), 0) as total_earnings
-            FROM transactions t
-            JOIN artworks a ON t.artwork_id = a.id
-            WHERE a.created_by = %s AND t.status = 'completed'
-        ''', (user_id,))
-        sales_data = cursor.fetchone()
-        total_sales = sales_data['total_sales']
-        total_earnings = sales_data['total_earnings']
-        if hasattr(total_earnings, '__float__'):
-            total_earnings = float(total_earnings)
-        
-        # Get artworks by category
-        cursor.execute('''
-            SELECT c.name as category_name, COUNT(a.id) as artwork_count 
-            FROM categories c 
-            LEFT JOIN artworks a ON c.id = a.category_id AND a.created_by = %s
-            WHERE c.created_by = %s 
-            GROUP BY c.id, c.name
-            ORDER BY artwork_count DESC
-        ''', (user_id, user_id))
-        artworks_by_category = cursor.fetchall()
-        
-        # Get recent artworks
-        cursor.execute('''
-            SELECT a.title, a.price, c.name as category_name, a.status, a.created_at
-            FROM artworks a 
-            LEFT JOIN categories c ON a.category_id = c.id 
-            WHERE a.created_by = %s 
-            ORDER BY a.created_at DESC 
-            LIMIT 5
-        ''', (user_id,))
-        recent_artworks = cursor.fetchall()
-        for artwork in recent_artworks:
-            if 'price' in artwork and hasattr(artwork['price'], '__float__'):
-                artwork['price'] = float(artwork['price'])
-        
-        # Get monthly sales
-        cursor.execute('''
-            SELECT DATE_FORMAT(t.transaction_date, '%Y-%m') as month, COUNT(*) as count
-            FROM transactions t
-            JOIN artworks a ON t.artwork_id = a.id
-            WHERE a.created_by = %s AND t.status = 'completed'
-            AND t.transaction_date >= DATE_SUB(NOW(), INTERVAL 6 MONTH)
-            GROUP BY DATE_FORMAT(t.transaction_date, '%Y-%m')
-            ORDER BY month
-        ''', (user_id,))
-        monthly_sales = cursor.fetchall()
-        
-        result = {
-            'total_artworks': total_artworks,
-            'total_sales': total_sales,
-            'total_earnings': total_earnings,
-            'artworks_by_category': artworks_by_category,
-            'recent_artworks': recent_artworks,
-            'monthly_sales': monthly_sales
-        }
+        result = dashboard_stats.artist_stats(cursor, user_id)
+        stats_cache.set('dashboard/artist-stats', user_id, result, generation)
         
         return jsonify(result), 200
         
     except Exception as e:
-        print(f"Artist dashboard stats error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Artist dashboard stats error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         try:
@@ -412,7 +444,7 @@ def signup():
     role = data.get('role')
     if not all([name, email, password, role]):
         return jsonify({'error': 'Missing fields'}), 400
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    hashed = passwords.hash(password)
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -429,6 +461,26 @@ def signup():
         cursor.close()
         conn.close()
 
+def find_user_by_email(email):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute('SELECT id, name, email, password_hash, role FROM users WHERE email=%s', (email,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+def update_password_hash(user_id, password_hash):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET password_hash = %s WHERE id = %s', (password_hash, user_id))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
 @app.route('/login', methods=['POST'])
 def login():
     data = request.json
@@ -437,15 +489,18 @@ def login():
     if not all([email, password]):
         return jsonify({'error': 'Missing fields'}), 400
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id, name, email, password_hash, role FROM users WHERE email=%s', (email,))
-        user = cursor.fetchone()
-        if not user or not bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+        # The DB connection goes back to the pool before waiting on bcrypt
+        user = find_user_by_email(email)
+        if not user or not passwords.verify(password, user['password_hash']):
             return jsonify({'error': 'Invalid credentials'}), 401
+        if passwords.needs_rehash(user['password_hash']):
+            # BCRYPT_ROUNDS changed since this hash was made; upgrade it while we have the password
+            rehashed = passwords.rehash(password)
+            if rehashed:
+                update_password_hash(user['id'], rehashed)
         session['user_id'] = user['id']
         session['role'] = user['role']
-        token = create_jwt_token(user['id'], user['role'])
+        token = auth.create_token(user['id'], user['role'])
         return jsonify({
             'message': 'Login successful', 
             'role': user['role'], 
@@ -453,22 +508,23 @@ def login():
             'id': user['id'],
             'token': token
         }), 200
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/logout', methods=['POST'])
 def logout():
+    token = auth.bearer_token()
+    if token:
+        auth.revoke(token)
     session.clear()
     return jsonify({'message': 'Logged out'}), 200
 
 @app.route('/dashboard', methods=['GET'])
+@require_auth
 def dashboard():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
-    role = session.get('role')
+    role = g.user_role
     if role == 'artist':
         return jsonify({'dashboard': 'artist', 'message': 'Welcome, artist!'}), 200
     elif role == 'user':
@@ -479,15 +535,16 @@ def dashboard():
 # Categories endpoints
 @app.route('/categories', methods=['GET'])
 @require_auth
+@catalogue_cache.conditional('categories')
 def get_categories():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
         cursor.execute('SELECT * FROM categories ORDER BY created_at DESC')
-        categories = cursor.fetchall()
+        categories = fetch_rows(cursor)
         return jsonify({'categories': categories}), 200
     except Exception as e:
-        print(f"Categories error: {e}")
+        log.exception("Categories error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
@@ -502,27 +559,29 @@ def create_category():
     if not name:
         return jsonify({'error': 'Name is required'}), 400
     
-    # Get user_id from either session or JWT token
-    user_id = session.get('user_id') or getattr(request, 'user_id', None)
+    user_id = g.user_id
     
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('INSERT INTO categories (name, description, created_by) VALUES (%s, %s, %s)',
                        (name, description, user_id))
+        user_stats.apply_delta(cursor, user_id, category_count=1)
         conn.commit()
+        stats_cache.invalidate(user_id)
+        catalogue_cache.bump('categories')
+        typeahead_index.add('category', cursor.lastrowid, name)
         return jsonify({'message': 'Category created successfully'}), 201
     except Exception as e:
-        print(f"Create category error: {e}")
+        log.exception("Create category error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/categories/<int:category_id>', methods=['PUT'])
+@require_auth
 def update_category(category_id):
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
     data = request.json
     name = data.get('name')
     description = data.get('description', '')
@@ -531,29 +590,40 @@ def update_category(category_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        owners = dashboard_owners(cursor, 'categories', category_id)
         cursor.execute('UPDATE categories SET name=%s, description=%s WHERE id=%s',
                        (name, description, category_id))
+        updated = cursor.rowcount
         conn.commit()
+        stats_cache.invalidate(*owners)
+        if updated:
+            catalogue_cache.bump('categories')
+            typeahead_index.add('category', category_id, name)
         return jsonify({'message': 'Category updated successfully'}), 200
     except Exception as e:
-        print(f"Update category error: {e}")
+        log.exception("Update category error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/categories/<int:category_id>', methods=['DELETE'])
+@require_auth
 def delete_category(category_id):
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        owners = dashboard_owners(cursor, 'categories', category_id)
         cursor.execute('DELETE FROM categories WHERE id=%s', (category_id,))
+        if cursor.rowcount and owners:
+            user_stats.apply_delta(cursor, owners[0], category_count=-1)
         conn.commit()
+        stats_cache.invalidate(*owners)
+        catalogue_cache.bump('categories')
+        typeahead_index.remove('category', category_id)
         return jsonify({'message': 'Category deleted successfully'}), 200
     except Exception as e:
-        print(f"Delete category error: {e}")
+        log.exception("Delete category error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
@@ -562,15 +632,16 @@ def delete_category(category_id):
 # Artists endpoints
 @app.route('/artists', methods=['GET'])
 @require_auth
+@catalogue_cache.conditional('artists')
 def get_artists():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
         cursor.execute('SELECT * FROM artists ORDER BY created_at DESC')
-        artists = cursor.fetchall()
+        artists = fetch_rows(cursor)
         return jsonify({'artists': artists}), 200
     except Exception as e:
-        print(f"Artists error: {e}")
+        log.exception("Artists error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
@@ -588,27 +659,29 @@ def create_artist():
     if not name:
         return jsonify({'error': 'Name is required'}), 400
     
-    # Get user_id from either session or JWT token
-    user_id = session.get('user_id') or getattr(request, 'user_id', None)
+    user_id = g.user_id
     
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('INSERT INTO artists (name, bio, email, phone, website, created_by) VALUES (%s, %s, %s, %s, %s, %s)',
                        (name, bio, email, phone, website, user_id))
+        user_stats.apply_delta(cursor, user_id, artist_count=1)
         conn.commit()
+        stats_cache.invalidate(user_id)
+        catalogue_cache.bump('artists')
+        typeahead_index.add('artist', cursor.lastrowid, name)
         return jsonify({'message': 'Artist created successfully'}), 201
     except Exception as e:
-        print(f"Create artist error: {e}")
+        log.exception("Create artist error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/artists/<int:artist_id>', methods=['PUT'])
+@require_auth
 def update_artist(artist_id):
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
     data = request.json
     name = data.get('name')
     bio = data.get('bio', '')
@@ -620,29 +693,40 @@ def update_artist(artist_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        owners = dashboard_owners(cursor, 'artists', artist_id)
         cursor.execute('UPDATE artists SET name=%s, bio=%s, email=%s, phone=%s, website=%s WHERE id=%s',
                        (name, bio, email, phone, website, artist_id))
+        updated = cursor.rowcount
         conn.commit()
+        stats_cache.invalidate(*owners)
+        if updated:
+            catalogue_cache.bump('artists')
+            typeahead_index.add('artist', artist_id, name)
         return jsonify({'message': 'Artist updated successfully'}), 200
     except Exception as e:
-        print(f"Update artist error: {e}")
+        log.exception("Update artist error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/artists/<int:artist_id>', methods=['DELETE'])
+@require_auth
 def delete_artist(artist_id):
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        owners = dashboard_owners(cursor, 'artists', artist_id)
         cursor.execute('DELETE FROM artists WHERE id=%s', (artist_id,))
+        if cursor.rowcount and owners:
+            user_stats.apply_delta(cursor, owners[0], artist_count=-1)
         conn.commit()
+        stats_cache.invalidate(*owners)
+        catalogue_cache.bump('artists')
+        typeahead_index.remove('artist', artist_id)
         return jsonify({'message': 'Artist deleted successfully'}), 200
     except Exception as e:
-        print(f"Delete artist error: {e}")
+        log.exception("Delete artist error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
@@ -650,27 +734,34 @@ def delete_artist(artist_id):
 
 # Artworks endpoints
 @app.route('/artworks', methods=['GET'])
+@require_auth
+@catalogue_cache.conditional('artworks', 'categories', 'artists')  # joins for category_name / artist_name
 def get_artworks():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('''
-            SELECT a.*, c.name as category_name, ar.name as artist_name 
-            FROM artworks a 
-            LEFT JOIN categories c ON a.category_id = c.id 
-            LEFT JOIN artists ar ON a.artist_id = ar.id 
-            ORDER BY a.created_at DESC
-        ''')
-        artworks = cursor.fetchall()
-        
-        # Convert Decimal prices to float
-        for artwork in artworks:
-            if 'price' in artwork and hasattr(artwork['price'], '__float__'):
-                artwork['price'] = float(artwork['price'])
+        page = Page(request.args, ARTWORK_FIELDS)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    keyset_sql, keyset_params = page.keyset()
+    sql = f'''
+        SELECT {page.select_list()}
+        FROM artworks a 
+        LEFT JOIN categories c ON a.category_id = c.id 
+        LEFT JOIN artists ar ON a.artist_id = ar.id 
+        WHERE {keyset_sql}
+        ORDER BY {page.order_by()}
+        LIMIT %s
+    '''
+    params = keyset_params + (page.fetch_size,)
+    if page.streaming:
+        return stream_list('artworks', sql, params, page)
+    
+    try:
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        artworks, next_cursor = page.finish(cursor.fetchall())
         
-        return jsonify({'artworks': artworks}), 200
+        return jsonify({'artworks': artworks, 'next_cursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -678,9 +769,8 @@ def get_artworks():
         conn.close()
 
 @app.route('/artworks', methods=['POST'])
+@require_auth
 def create_artwork():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
     data = request.json
     title = data.get('title')
     description = data.get('description', '')
@@ -694,20 +784,89 @@ def create_artwork():
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('INSERT INTO artworks (title, description, price, image_url, category_id, artist_id, created_by) VALUES (%s, %s, %s, %s, %s, %s, %s)',
-                       (title, description, price, image_url, category_id, artist_id, session['user_id']))
+                       (title, description, price, image_url, category_id, artist_id, g.user_id))
+        user_stats.apply_delta(cursor, g.user_id, artwork_count=1,
+                               total_value=user_stats.as_amount(price))
         conn.commit()
+        stats_cache.invalidate(g.user_id)
+        catalogue_cache.bump('artworks')
+        typeahead_index.add('artwork', cursor.lastrowid, title)
         return jsonify({'message': 'Artwork created successfully'}), 201
     except Exception as e:
-        print(f"Create artwork error: {e}")
+        log.exception("Create artwork error: %s", e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.route('/artworks/import', methods=['POST'])
+@require_auth
+def import_artworks():
+    """Bulk import from a CSV or NDJSON body; see artwork_import.py for the columns.
+
+    format=csv|ndjson (or the Content-Type), dry_run=1 to only validate.
+    """
+    try:
+        fmt = artwork_import.import_format(request.args.get('format'), request.content_type)
+    except artwork_import.InvalidImportRequest as e:
+        return jsonify({'error': str(e)}), 400
+    user_id = g.user_id
+
+    def committed(inserted):
+        stats_cache.invalidate(user_id)
+        catalogue_cache.bump('artworks')
+        for artwork_id, title in inserted:
+            typeahead_index.add('artwork', artwork_id, title)
+
+    conn = get_db_connection()
+    try:
+        job = artwork_import.ArtworkImport(conn, user_id, dry_run=request.args.get('dry_run') in ('1', 'true'),
+                                           on_commit=committed)
+        report = job.run(artwork_import.read_records(request.stream, fmt))
+        if 'error' in report and not job.bad_request:
+            conn.invalidate()  # may have died mid-batch
+    finally:
+        conn.close()
+    log.info("Artwork import for user %s: %s imported, %s failed", user_id, report['imported'], report['failed'],
+             extra={'user_id': user_id, 'imported': report['imported'], 'failed': report['failed'],
+                    'seconds': report['seconds'], 'rows_per_second': report['rows_per_second']})
+    if 'error' in report:
+        # An unreadable body is the client's to fix; batches committed before it stay imported
+        return jsonify(report), 400 if job.bad_request else 500
+    return jsonify(report), 200
+
+@app.route('/artworks/batch', methods=['POST'])
+@require_auth
+def batch_artworks():
+    """Partial updates and deletes of the user's own artworks in one transaction; see artwork_batch.py"""
+    try:
+        items = artwork_batch.parse_operations(request.get_json(silent=True))
+    except artwork_batch.InvalidBatchRequest as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        artwork_batch.apply(cursor, g.user_id, items)
+        conn.commit()
+        if any(item['status'] in ('updated', 'deleted') for item in items):
+            stats_cache.invalidate(g.user_id)
+            catalogue_cache.bump('artworks')
+        for item in items:
+            if item['status'] == 'deleted':
+                typeahead_index.remove('artwork', item['id'])
+            elif item['status'] == 'updated' and 'title' in item['fields']:
+                typeahead_index.add('artwork', item['id'], item['fields']['title'])
+        return jsonify({'results': artwork_batch.results(items)}), 200
+    except Exception as e:
+        log.exception("Batch artworks error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/artworks/<int:artwork_id>', methods=['PUT'])
+@require_auth
 def update_artwork(artwork_id):
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
     data = request.json
     title = data.get('title')
     description = data.get('description', '')
@@ -720,113 +879,122 @@ def update_artwork(artwork_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        existing = user_stats.lock_artwork(cursor, artwork_id)
         cursor.execute('UPDATE artworks SET title=%s, description=%s, price=%s, image_url=%s, category_id=%s, artist_id=%s WHERE id=%s',
                        (title, description, price, image_url, category_id, artist_id, artwork_id))
+        if existing:
+            owner, old_price = existing
+            user_stats.apply_delta(cursor, owner,
+                                   total_value=user_stats.as_amount(price) - user_stats.as_amount(old_price))
         conn.commit()
+        if existing:
+            stats_cache.invalidate(owner)
+            catalogue_cache.bump('artworks')
+            typeahead_index.add('artwork', artwork_id, title)
         return jsonify({'message': 'Artwork updated successfully'}), 200
     except Exception as e:
-        print(f"Update artwork error: {e}")
+        log.exception("Update artwork error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/artworks/<int:artwork_id>', methods=['DELETE'])
+@require_auth
 def delete_artwork(artwork_id):
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        existing = user_stats.lock_artwork(cursor, artwork_id)
+        if existing:
+            owner, old_price = existing
+            # Completed sales of this artwork cascade away with it
+            sales_count, earnings = user_stats.artwork_sales(cursor, artwork_id)
         cursor.execute('DELETE FROM artworks WHERE id=%s', (artwork_id,))
+        if existing:
+            user_stats.apply_delta(cursor, owner, artwork_count=-1,
+                                   total_value=-user_stats.as_amount(old_price),
+                                   sales_count=-sales_count, total_earnings=-earnings)
         conn.commit()
+        if existing:
+            stats_cache.invalidate(owner)
+            catalogue_cache.bump('artworks')
+            typeahead_index.remove('artwork', artwork_id)
         return jsonify({'message': 'Artwork deleted successfully'}), 200
     except Exception as e:
-        print(f"Delete artwork error: {e}")
+        log.exception("Delete artwork error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/artworks/my-artworks', methods=['GET'])
+@require_auth
 def get_my_artworks():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        page = Page(request.args, MY_ARTWORK_FIELDS)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = g.user_id
+    keyset_sql, keyset_params = page.keyset()
+    sql = f'''
+        SELECT {page.select_list()}
+        FROM artworks a 
+        LEFT JOIN categories c ON a.category_id = c.id 
+        WHERE a.created_by = %s AND {keyset_sql}
+        ORDER BY {page.order_by()}
+        LIMIT %s
+    '''
+    params = (user_id,) + keyset_params + (page.fetch_size,)
+    if page.streaming:
+        return stream_list('artworks', sql, params, page)
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        user_id = session['user_id']
-        cursor.execute('''
-            SELECT a.*, c.name as category_name 
-            FROM artworks a 
-            LEFT JOIN categories c ON a.category_id = c.id 
-            WHERE a.created_by = %s
-            ORDER BY a.created_at DESC
-        ''', (user_id,))
-        artworks = cursor.fetchall()
-        
-        # Convert Decimal prices to float
-        for artwork in artworks:
-            if 'price' in artwork and hasattr(artwork['price'], '__float__'):
-                artwork['price'] = float(artwork['price'])
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        artworks, next_cursor = page.finish(cursor.fetchall())
         
-        return jsonify({'artworks': artworks}), 200
+        return jsonify({'artworks': artworks, 'next_cursor': next_cursor}), 200
     except Exception as e:
-        print(f"My artworks error: {e}")
+        log.exception("My artworks error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/transactions', methods=['GET'])
+@app.route('/transactions/my-transactions', methods=['GET'])
+@require_auth
 def get_transactions():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        page = transaction_history.page_for(request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = g.user_id
+    if page.streaming:
+        sql, params = transaction_history.history_query(user_id, page)
+        return stream_list('transactions', sql, params, page)
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        user_id = session['user_id']
-        cursor.execute('''
-            SELECT t.*, a.title as artwork_title, 
-                   CASE 
-                       WHEN t.buyer_id = %s THEN 'You'
-                       ELSE u1.name 
-                   END as buyer_name,
-                   CASE 
-                       WHEN t.seller_id = %s THEN 'You'
-                       ELSE u2.name 
-                   END as seller_name
-            FROM transactions t
-            JOIN artworks a ON t.artwork_id = a.id
-            JOIN users u1 ON t.buyer_id = u1.id
-            JOIN users u2 ON t.seller_id = u2.id
-            WHERE t.buyer_id = %s OR t.seller_id = %s
-            ORDER BY t.transaction_date DESC
-        ''', (user_id, user_id, user_id, user_id))
-        transactions = cursor.fetchall()
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
         
-        # Convert Decimal amounts to float
-        for transaction in transactions:
-            if 'amount' in transaction and hasattr(transaction['amount'], '__float__'):
-                transaction['amount'] = float(transaction['amount'])
+        transactions, next_cursor = transaction_history.fetch_page(cursor, user_id, page)
         
-        return jsonify({'transactions': transactions}), 200
+        return jsonify({'transactions': transactions, 'next_cursor': next_cursor}), 200
     except Exception as e:
-        print(f"Transactions error: {e}")
+        log.exception("Transactions error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/transactions', methods=['POST'])
+@require_auth
 def create_transaction():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
-    
     data = request.json
     artwork_id = data.get('artwork_id')
     amount = data.get('amount')
@@ -835,176 +1003,252 @@ def create_transaction():
     
     if not artwork_id or not amount:
         return jsonify({'error': 'Artwork ID and amount are required'}), 400
+    try:
+        artwork_id = purchase.artwork_id(artwork_id)
+        key = purchase.idempotency_key(request.headers.get('Idempotency-Key'))
+    except purchase.PurchaseRejected as e:
+        return jsonify({'error': str(e)}), e.status
     
+    conn = get_db_connection()
+    try:
+        result = purchases.buy(conn, g.user_id, artwork_id, amount, payment_method, notes, key=key)
+    except purchase.PurchaseRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        log.exception("Create transaction error: %s", e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+    
+    if not result['replayed']:
+        stats_cache.invalidate(result['seller_id'])
+        catalogue_cache.bump('artworks')  # status is now sold
+    response = jsonify({'message': 'Transaction completed successfully',
+                        'transaction_id': result['transaction_id']})
+    if result['replayed']:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, 201
+
+@app.route('/artworks/<int:artwork_id>/reserve', methods=['POST'])
+@require_auth
+def reserve_artwork(artwork_id):
+    """Hold an artwork for checkout, or renew the caller's hold; see reservations.py"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        buyer_id = session['user_id']
-        
-        # Get artwork details and seller
-        cursor.execute('SELECT created_by, price FROM artworks WHERE id = %s AND status = "available"', (artwork_id,))
-        artwork = cursor.fetchone()
-        
-        if not artwork:
-            return jsonify({'error': 'Artwork not found or not available'}), 404
-        
-        seller_id = artwork['created_by']
-        
-        if buyer_id == seller_id:
-            return jsonify({'error': 'Cannot buy your own artwork'}), 400
-        
-        # Create transaction
-        cursor.execute('''
-            INSERT INTO transactions (buyer_id, seller_id, artwork_id, amount, payment_method, notes, status)
-            VALUES (%s, %s, %s, %s, %s, %s, 'completed')
-        ''', (buyer_id, seller_id, artwork_id, amount, payment_method, notes))
-        
-        # Update artwork status to sold
-        cursor.execute('UPDATE artworks SET status = "sold" WHERE id = %s', (artwork_id,))
-        
+        cursor = conn.cursor()
+        artwork = holds.reserve(cursor, artwork_id, g.user_id)
         conn.commit()
-        
-        return jsonify({'message': 'Transaction completed successfully'}), 201
+        stats_cache.invalidate(artwork['created_by'])
+        catalogue_cache.bump('artworks')  # status is now reserved
+        return jsonify({'artwork_id': artwork_id, 'reserved_until': artwork['reserved_until'],
+                        'hold_seconds': holds.hold_seconds}), 200
+    except reservations.ReservationRejected as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
-        print(f"Create transaction error: {e}")
+        log.exception("Reserve artwork error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
-@app.route('/transactions/my-transactions', methods=['GET'])
-def get_my_transactions():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
-    
+@app.route('/artworks/<int:artwork_id>/reserve', methods=['DELETE'])
+@require_auth
+def release_artwork(artwork_id):
+    """Give up the caller's hold on an artwork"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        user_id = session['user_id']
-        cursor.execute('''
-            SELECT t.*, a.title as artwork_title, 
-                   CASE 
-                       WHEN t.buyer_id = %s THEN 'You'
-                       ELSE u1.name 
-                   END as buyer_name,
-                   CASE 
-                       WHEN t.seller_id = %s THEN 'You'
-                       ELSE u2.name 
-                   END as seller_name
-            FROM transactions t
-            JOIN artworks a ON t.artwork_id = a.id
-            JOIN users u1 ON t.buyer_id = u1.id
-            JOIN users u2 ON t.seller_id = u2.id
-            WHERE t.buyer_id = %s OR t.seller_id = %s
-            ORDER BY t.transaction_date DESC
-        ''', (user_id, user_id, user_id, user_id))
-        transactions = cursor.fetchall()
-        
-        # Convert Decimal amounts to float
-        for transaction in transactions:
-            if 'amount' in transaction and hasattr(transaction['amount'], '__float__'):
-                transaction['amount'] = float(transaction['amount'])
-        
-        return jsonify({'transactions': transactions}), 200
+        cursor = conn.cursor()
+        released = holds.release(cursor, artwork_id, g.user_id)
+        if released:
+            artwork = reservations.describe(cursor, artwork_id)
+        conn.commit()
+        if not released:
+            return jsonify({'error': 'You do not hold a reservation on this artwork'}), 404
+        stats_cache.invalidate(artwork['created_by'])
+        catalogue_cache.bump('artworks')  # available again
+        return jsonify({'message': 'Reservation released'}), 200
     except Exception as e:
-        print(f"My transactions error: {e}")
+        log.exception("Release artwork error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/marketplace/available', methods=['GET'])
+@require_auth
 def get_marketplace_artworks():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        page = Page(request.args, MARKETPLACE_FIELDS)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = g.user_id
+    keyset_sql, keyset_params = page.keyset()
+    sql = f'''
+        SELECT {page.select_list()}
+        FROM artworks a 
+        LEFT JOIN categories c ON a.category_id = c.id 
+        LEFT JOIN artists ar ON a.artist_id = ar.id
+        LEFT JOIN users u ON a.created_by = u.id
+        WHERE a.status = 'available' AND a.created_by != %s AND {keyset_sql}
+        ORDER BY {page.order_by()}
+        LIMIT %s
+    '''
+    params = (user_id,) + keyset_params + (page.fetch_size,)
+    if page.streaming:
+        return stream_list('artworks', sql, params, page)
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        user_id = session['user_id']
-        cursor.execute('''
-            SELECT a.*, c.name as category_name, ar.name as artist_name, u.name as seller_name
-            FROM artworks a 
-            LEFT JOIN categories c ON a.category_id = c.id 
-            LEFT JOIN artists ar ON a.artist_id = ar.id
-            LEFT JOIN users u ON a.created_by = u.id
-            WHERE a.status = 'available' AND a.created_by != %s
-            ORDER BY a.created_at DESC
-        ''', (user_id,))
-        artworks = cursor.fetchall()
-        
-        # Convert Decimal prices to float
-        for artwork in artworks:
-            if 'price' in artwork and hasattr(artwork['price'], '__float__'):
-                artwork['price'] = float(artwork['price'])
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        artworks, next_cursor = page.finish(cursor.fetchall())
         
-        return jsonify({'artworks': artworks}), 200
+        return jsonify({'artworks': artworks, 'next_cursor': next_cursor}), 200
+    except Exception as e:
+        log.exception("Marketplace artworks error: %s", e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.route('/marketplace/search', methods=['GET'])
+@require_auth
+def search_marketplace():
+    """Ranked full-text search over other sellers' artworks, with facet counts.
+
+    q (optional), category_id / artist_id (comma-separated), min_price,
+    max_price, status (default available), plus limit / cursor / fields.
+    """
+    try:
+        search = marketplace_search.Search(request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
+        cursor.execute(*search.query(g.user_id))
+        return jsonify(search.results(cursor.fetchall())), 200
     except Exception as e:
-        print(f"Marketplace artworks error: {e}")
+        log.exception("Marketplace search error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
+@app.route('/typeahead', methods=['GET'])
+@require_auth
+def get_typeahead():
+    """Autocomplete over artwork titles, artist names and category names.
+
+    q, types (comma-separated; default all three), limit (default 10, max 50).
+    """
+    query = request.args.get('q', '')
+    kinds = tuple(t for t in request.args.get('types', '').split(',') if t) or typeahead.KINDS
+    unknown = [kind for kind in kinds if kind not in typeahead.KINDS]
+    if unknown:
+        return jsonify({'error': f'Unknown type: {unknown[0]}'}), 400
+    try:
+        limit = int(request.args.get('limit', typeahead.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    if not typeahead_index.loaded:
+        return jsonify({'error': 'Typeahead index is still loading'}), 503
+    suggestions = typeahead_index.search(query, kinds, min(limit, typeahead.MAX_LIMIT))
+    return jsonify({'suggestions': suggestions}), 200
+
+@app.route('/export', methods=['GET'])
+@require_auth
+def export_collection():
+    """Stream the user's artworks, transactions and portfolios as a download.
+
+    format=ndjson|csv, gzip=1, sections=artworks,transactions,portfolios,
+    token (from a checkpoint line) or after_id (CSV) to resume.
+    """
+    try:
+        export = collection_export.Export(request.args)
+    except collection_export.InvalidExportRequest as e:
+        return jsonify({'error': str(e)}), 400
+    body = export.body(partial(get_db_connection, readonly=True), g.user_id, dumps=app.json.dumps)
+    response = Response(stream_with_context(body), mimetype=export.mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+    return response
+
 # Portfolio routes
 @app.route('/portfolio', methods=['GET'])
+@require_auth
 def get_portfolios():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        page = Page(request.args, PORTFOLIO_FIELDS)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = g.user_id
+    keyset_sql, keyset_params = page.keyset()
+    sql = f'''
+        SELECT {page.select_list()} FROM artist_portfolios 
+        WHERE artist_id = %s AND {keyset_sql}
+        ORDER BY {page.order_by()}
+        LIMIT %s
+    '''
+    params = (user_id,) + keyset_params + (page.fetch_size,)
+    if page.streaming:
+        return stream_list('portfolios', sql, params, page)
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        user_id = session['user_id']
-        cursor.execute('''
-            SELECT * FROM artist_portfolios 
-            WHERE artist_id = %s 
-            ORDER BY created_at DESC
-        ''', (user_id,))
-        portfolios = cursor.fetchall()
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        portfolios, next_cursor = page.finish(cursor.fetchall())
         
-        return jsonify({'portfolios': portfolios}), 200
+        return jsonify({'portfolios': portfolios, 'next_cursor': next_cursor}), 200
     except Exception as e:
-        print(f"Get portfolios error: {e}")
+        log.exception("Get portfolios error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/portfolio/my-portfolio', methods=['GET'])
+@require_auth
 def get_my_portfolio():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        page = Page(request.args, PORTFOLIO_FIELDS)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = g.user_id
+    keyset_sql, keyset_params = page.keyset()
+    sql = f'''
+        SELECT {page.select_list()} FROM artist_portfolios 
+        WHERE artist_id = %s AND {keyset_sql}
+        ORDER BY {page.order_by()}
+        LIMIT %s
+    '''
+    params = (user_id,) + keyset_params + (page.fetch_size,)
+    if page.streaming:
+        return stream_list('portfolios', sql, params, page)
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        user_id = session['user_id']
-        cursor.execute('''
-            SELECT * FROM artist_portfolios 
-            WHERE artist_id = %s 
-            ORDER BY created_at DESC
-        ''', (user_id,))
-        portfolios = cursor.fetchall()
+        conn = get_db_connection(readonly=True)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        portfolios, next_cursor = page.finish(cursor.fetchall())
         
-        return jsonify({'portfolios': portfolios}), 200
+        return jsonify({'portfolios': portfolios, 'next_cursor': next_cursor}), 200
     except Exception as e:
-        print(f"Get my portfolio error: {e}")
+        log.exception("Get my portfolio error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/portfolio', methods=['POST'])
+@require_auth
 def create_portfolio():
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
-    
     try:
         data = request.get_json()
         title = data.get('title')
@@ -1019,7 +1263,7 @@ def create_portfolio():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        user_id = session['user_id']
+        user_id = g.user_id
         cursor.execute('''
             INSERT INTO artist_portfolios (artist_id, title, description, portfolio_type, image_url, external_link)
             VALUES (%s, %s, %s, %s, %s, %s)
@@ -1034,17 +1278,15 @@ def create_portfolio():
         
         return jsonify({'portfolio': portfolio, 'message': 'Portfolio created successfully'}), 201
     except Exception as e:
-        print(f"Create portfolio error: {e}")
+        log.exception("Create portfolio error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/portfolio/<int:portfolio_id>', methods=['PUT'])
+@require_auth
 def update_portfolio(portfolio_id):
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
-    
     try:
         data = request.get_json()
         title = data.get('title')
@@ -1056,7 +1298,7 @@ def update_portfolio(portfolio_id):
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        user_id = session['user_id']
+        user_id = g.user_id
         
         # Check if portfolio exists and belongs to user
         cursor.execute('SELECT * FROM artist_portfolios WHERE id = %s AND artist_id = %s', (portfolio_id, user_id))
@@ -1103,22 +1345,20 @@ def update_portfolio(portfolio_id):
         
         return jsonify({'portfolio': updated_portfolio, 'message': 'Portfolio updated successfully'}), 200
     except Exception as e:
-        print(f"Update portfolio error: {e}")
+        log.exception("Update portfolio error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
         conn.close()
 
 @app.route('/portfolio/<int:portfolio_id>', methods=['DELETE'])
+@require_auth
 def delete_portfolio(portfolio_id):
-    if 'user_id' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
-    
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        user_id = session['user_id']
+        user_id = g.user_id
         
         # Check if portfolio exists and belongs to user
         cursor.execute('SELECT * FROM artist_portfolios WHERE id = %s AND artist_id = %s', (portfolio_id, user_id))
@@ -1133,7 +1373,7 @@ def delete_portfolio(portfolio_id):
         
         return jsonify({'message': 'Portfolio deleted successfully'}), 200
     except Exception as e:
-        print(f"Delete portfolio error: {e}")
+        log.exception("Delete portfolio error: %s", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cursor.close()
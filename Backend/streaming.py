@@ -0,0 +1,61 @@
+"""
+Chunked JSON for list endpoints called with ?stream=1.
+
+Rows are pulled from an unbuffered cursor with fetchmany() and serialized
+one batch at a time, so memory stays flat however many rows the query
+returns. The body has the same shape as the paged response:
+{"<key>": [...], "next_cursor": ...}.
+"""
+
+import json
+import os
+
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+
+
+def fetch_batches(cursor, batch_size=STREAM_BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def json_chunks(key, conn, cursor, page, dumps=json.dumps, batch_size=STREAM_BATCH_SIZE):
+    """Yield the response body for an executed query; closes cursor and conn when done.
+
+    A client that disconnects mid-stream leaves unread rows on the
+    connection, so it is discarded instead of going back to the pool.
+    """
+    finished = False
+    try:
+        yield '{%s:[' % dumps(key)
+        separator = ''
+        for rows in page.finish_batches(fetch_batches(cursor, batch_size)):
+            yield separator + dumps(rows)[1:-1]  # one encoder call per batch, brackets dropped
+            separator = ','
+        finished = True
+        yield '],"next_cursor":%s}' % dumps(page.next_cursor)
+    finally:
+        if not finished:
+            conn.invalidate()
+        try:
+            cursor.close()
+        except Exception:
+            conn.invalidate()
+        conn.close()
+
+
+def release_on_close(response, conn):
+    """Return `conn` to the pool when `response` is closed, even if its body never ran.
+
+    A HEAD request, or a client gone before the first chunk, closes the
+    response without starting the generator, so json_chunks' own cleanup
+    never happens. The query's rows are still unread then, so the
+    connection is discarded. After a finished stream this is a no-op.
+    """
+    def release():
+        conn.invalidate()
+        conn.close()
+    response.call_on_close(release)
+    return response
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the queued JSON logging set up by app_logging.configure()
+"""
+
+import io
+import json
+import logging
+import logging.handlers
+import queue
+
+from flask import Flask
+
+import app_logging
+
+
+def make_logger(name, sample='', maxsize=100):
+    """A logger wired like configure() does, but private to the test"""
+    handler = app_logging.NonBlockingQueueHandler(queue.Queue(maxsize))
+    handler.addFilter(app_logging.SamplingFilter.parse(sample))
+    handler.addFilter(app_logging.RequestContextFilter())
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, handler
+
+
+def drain(handler):
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(app_logging.JsonFormatter())
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    listener.stop()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_json_with_request_id_and_extras():
+    logger, handler = make_logger('test.json')
+    app = Flask(__name__)
+    app_logging.init_app(app)
+
+    @app.route('/work')
+    def work():
+        logger.info('Imported %s rows', 3, extra={'user_id': 7})
+        try:
+            raise ValueError('bad row')
+        except ValueError:
+            logger.exception('Import failed')
+        return 'ok'
+
+    response = app.test_client().get('/work', headers={'X-Request-ID': 'abc-123'})
+    assert response.headers['X-Request-ID'] == 'abc-123'
+    info, error = drain(handler)
+    assert info['msg'] == 'Imported 3 rows' and info['level'] == 'INFO'
+    assert info['request_id'] == 'abc-123' and info['user_id'] == 7
+    assert error['request_id'] == 'abc-123' and 'ValueError: bad row' in error['exc']
+
+    # Unusable incoming ids are replaced
+    assert app.test_client().get('/work', headers={'X-Request-ID': 'x' * 100}).headers['X-Request-ID'] != 'x' * 100
+
+
+def test_sampling_keeps_one_in_n_below_warning():
+    logger, handler = make_logger('test.sampled.child', sample='test.sampled=10')
+    for n in range(100):
+        logger.debug('tick %s', n)
+    logger.warning('always kept')
+    records = drain(handler)
+    assert [r['msg'] for r in records[:-1]] == [f'tick {n}' for n in range(0, 100, 10)]
+    assert records[0]['sampled'] == 10
+    assert records[-1]['msg'] == 'always kept' and 'sampled' not in records[-1]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    logger, handler = make_logger('test.full', maxsize=5)
+    for n in range(20):
+        logger.info('line %s', n)
+    assert handler.dropped == 15
+    assert len(drain(handler)) == 5
+
+
+if __name__ == '__main__':
+    for test in (test_records_are_json_with_request_id_and_extras, test_sampling_keeps_one_in_n_below_warning,
+                 test_full_queue_drops_instead_of_blocking):
+        test()
+        print(f"{test.__name__}: ok")
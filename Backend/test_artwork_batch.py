@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch artwork mutations behind POST /artworks/batch
+"""
+
+import re
+from decimal import Decimal
+
+import artwork_batch
+
+
+class FakeCursor:
+    """Artworks 1-3 belong to user 1 and 4 to user 2; category 7 exists, artwork 3 has one sale"""
+
+    ARTWORKS = {1: (1, 1, Decimal('10.00')), 2: (2, 1, Decimal('20.00')),
+                3: (3, 1, Decimal('30.00')), 4: (4, 2, Decimal('40.00'))}
+
+    def __init__(self):
+        self.statements = []
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        self.statements.append((sql, params))
+        if sql.startswith('SELECT id, created_by, price FROM artworks'):
+            self.rows = [self.ARTWORKS[i] for i in params if i in self.ARTWORKS]
+        elif sql.startswith('SELECT id FROM categories'):
+            self.rows = [(i,) for i in params if i == 7]
+        elif sql.startswith('SELECT COUNT(*)'):
+            self.rows = [(1, Decimal('35.00'))] if 3 in params else [(0, Decimal(0))]
+        else:
+            self.rows = []
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+def verbs(cursor):
+    return [sql.split()[0] for sql, _ in cursor.statements]
+
+
+def test_mixed_batch_is_set_based_with_per_item_results():
+    items = artwork_batch.parse_operations({'operations': [
+        {'op': 'update', 'id': 1, 'price': 15, 'category_id': 7},
+        {'op': 'update', 'id': 2, 'title': 'Renamed'},
+        {'op': 'delete', 'id': 3},
+        {'op': 'delete', 'id': 4},
+        {'op': 'update', 'id': 99, 'price': 1},
+        {'op': 'update', 'id': 2, 'price': 1},
+        {'op': 'update', 'id': 5, 'color': 'red'},
+    ]})
+    cursor = FakeCursor()
+    artwork_batch.apply(cursor, 1, items)
+
+    assert [r['status'] for r in artwork_batch.results(items)] == [
+        'updated', 'updated', 'deleted', 'forbidden', 'not_found', 'invalid', 'invalid']
+    assert verbs(cursor) == ['SELECT', 'SELECT', 'UPDATE', 'SELECT', 'DELETE', 'INSERT']
+
+    update_sql, update_params = cursor.statements[2]
+    assert update_sql.startswith('UPDATE artworks SET title = CASE id WHEN %s THEN %s ELSE title END, '
+                                 'price = CASE id WHEN %s THEN %s ELSE price END, category_id = CASE')
+    assert update_sql.endswith('WHERE created_by = %s AND id IN (%s, %s)')
+    assert update_params == (2, 'Renamed', 1, Decimal('15'), 1, 7, 1, 1, 2)
+    assert cursor.statements[4][1] == (1, 3)
+
+    # One delta for the whole batch: +5 repriced, -30 deleted along with its 35.00 sale
+    delta_sql, delta_params = cursor.statements[5]
+    delta = dict(zip(re.search(r'\((user_id[^)]*)\)', delta_sql).group(1).split(', '), delta_params))
+    assert delta['artwork_count'] == -1 and delta['total_value'] == Decimal('-25')
+    assert delta['sales_count'] == -1 and delta['total_earnings'] == Decimal('-35.00')
+
+
+def test_unknown_category_only_fails_its_item():
+    items = artwork_batch.parse_operations({'operations': [
+        {'op': 'update', 'id': 1, 'category_id': 8},
+        {'op': 'update', 'id': 2, 'category_id': None, 'title': 'Untitled'},
+    ]})
+    cursor = FakeCursor()
+    artwork_batch.apply(cursor, 1, items)
+    assert artwork_batch.results(items)[0] == {'id': 1, 'op': 'update', 'status': 'invalid',
+                                               'error': 'Unknown category_id: 8'}
+    assert cursor.statements[2][0].endswith('id IN (%s)') and cursor.statements[2][1][-1] == 2
+
+
+def test_malformed_bodies_are_rejected():
+    for body in (None, [], {'operations': {}}, {'operations': [{}] * (artwork_batch.MAX_OPERATIONS + 1)}):
+        try:
+            artwork_batch.parse_operations(body)
+        except artwork_batch.InvalidBatchRequest:
+            continue
+        raise AssertionError(f'accepted {body!r}')
+    items = artwork_batch.parse_operations({'operations': [{'op': 'update', 'id': 1, 'price': -1},
+                                                           {'op': 'update', 'id': 2}, 'x',
+                                                           {'op': 'update', 'id': 3, 'status': 'available'}]})
+    # status changes only with a sale or a hold, never on its own
+    assert [item['error'] for item in items] == ['price must be between 0 and 99999999.99',
+                                                 'Nothing to update', 'Each operation must be an object',
+                                                 'Unknown field: status']
+    cursor = FakeCursor()
+    artwork_batch.apply(cursor, 1, items)
+    assert not cursor.statements
+
+
+if __name__ == '__main__':
+    for test in (test_mixed_batch_is_set_based_with_per_item_results, test_unknown_category_only_fails_its_item,
+                 test_malformed_bodies_are_rejected):
+        test()
+        print(f"{test.__name__}: ok")
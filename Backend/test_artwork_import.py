@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for the bulk artwork import behind POST /artworks/import
+"""
+
+import io
+
+from mysql.connector import errors as db_errors
+
+from artwork_import import ArtworkImport, read_records
+
+
+class FakeCursor:
+    """Knows one category ('Painting' = 7), rejects titles starting with '!'"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        self.conn.statements.append(sql.split()[0])
+        self.rows = [(7, 'Painting')] if 'FROM categories' in sql and 'painting' in params else []
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        self.conn.batches.append(len(seq))
+        if any(values[0].startswith('!') for values in seq):
+            raise db_errors.IntegrityError('rejected')
+        # Consecutive ids per statement, from a counter shared with every other connection
+        self.lastrowid, self.rowcount = FakeConnection.next_id, len(seq)
+        FakeConnection.next_id += len(seq)
+        self.conn.pending += seq
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    next_id = 1
+
+    def __init__(self):
+        self.statements, self.batches, self.pending, self.committed = [], [], [], []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed += self.pending
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+
+def run(body, fmt='csv', **kwargs):
+    conn = FakeConnection()
+    report = ArtworkImport(conn, 1, **kwargs).run(read_records(io.BytesIO(body.encode('utf-8')), fmt))
+    return conn, report
+
+
+def test_csv_rows_are_validated_and_batched():
+    body = 'title,price,category\n' + ''.join(f'Piece {n},{n},Painting\n' for n in range(5))
+    body += ',1,\nNo price,abc,\nSculpted,1,Sculpture\n'
+    conn, report = run(body, batch_size=2)
+    assert report['imported'] == 5 and report['failed'] == 3
+    assert [e['line'] for e in report['errors']] == [7, 8, 9]
+    assert report['errors'][2]['error'] == 'Unknown category: Sculpture'
+    assert [values[4] for values in conn.committed] == [7] * 5  # category name resolved
+    assert conn.statements.count('SELECT') == 2  # 'painting' cached after the first batch
+
+
+def test_rejected_batch_is_retried_row_by_row():
+    body = '{"title": "Fine"}\n{"title": "!Broken"}\nnot json\n{"title": "Also fine"}\n'
+    conn, report = run(body, fmt='ndjson')
+    assert report['imported'] == 2
+    assert [e['line'] for e in report['errors']] == [2, 3]
+    assert [values[0] for values in conn.committed] == ['Fine', 'Also fine']
+
+
+def test_only_available_artworks_are_imported():
+    conn, report = run('title,status\nA,\nB,available\nC,sold\nD,reserved\nE,lost\n')
+    assert [values[7] for values in conn.committed] == ['available', 'available']
+    assert [(e['line'], e['error']) for e in report['errors']] == [
+        (4, "status sold can't be imported; only a sale or a hold sets it"),
+        (5, "status reserved can't be imported; only a sale or a hold sets it"),
+        (6, 'Unknown status: lost')]
+
+
+def test_unreadable_body_is_the_clients_error():
+    # Decoded a chunk at a time, so the bad byte is only met after some batches went in
+    body = ('title\n' + ''.join(f'Piece {n}\n' for n in range(3000))).encode('utf-8') + b'Caf\xe9\n'
+    conn = FakeConnection()
+    job = ArtworkImport(conn, 1, batch_size=100)
+    report = job.run(read_records(io.BytesIO(body), 'csv'))
+    assert job.bad_request and report['error'].startswith('Unreadable csv body')
+    assert 0 < report['imported'] == len(conn.committed) < 3000  # batches before it stay
+
+    def gone_away(sql, seq):
+        raise db_errors.OperationalError('gone away')
+
+    job = ArtworkImport(FakeConnection(), 1)
+    job.cursor.executemany = gone_away
+    report = job.run(read_records(io.BytesIO(b'title\nA\n'), 'csv'))
+    assert report['error'] == 'Import stopped: gone away' and not job.bad_request
+
+
+def test_dry_run_writes_nothing():
+    conn, report = run('title\nA\nB\n', dry_run=True)
+    assert report['imported'] == 2 and not conn.batches and not conn.committed
+
+
+def test_concurrent_imports_by_one_user_report_their_own_ids():
+    reported = {'a': [], 'b': []}
+
+    def records(name, count, during=None):
+        for n in range(count):
+            if n == 2 and during:
+                during()  # the other import commits a batch between two of ours
+            yield n + 2, {'title': f'{name}{n}'}
+
+    def import_b():
+        ArtworkImport(FakeConnection(), 1, batch_size=2, on_commit=reported['b'].extend).run(records('b', 3))
+
+    conn = FakeConnection()
+    ArtworkImport(conn, 1, batch_size=2, on_commit=reported['a'].extend).run(records('a', 4, during=import_b))
+    a_ids = [artwork_id for artwork_id, _ in reported['a']]
+    b_ids = [artwork_id for artwork_id, _ in reported['b']]
+    assert [title for _, title in reported['a']] == ['a0', 'a1', 'a2', 'a3']
+    assert [title for _, title in reported['b']] == ['b0', 'b1', 'b2']
+    assert a_ids[2] - a_ids[0] == 5 and not set(a_ids) & set(b_ids)  # b's ids landed between a's batches
+    assert 'SELECT' not in conn.statements  # ids come from lastrowid, not a lookup
+
+
+if __name__ == '__main__':
+    for test in (test_csv_rows_are_validated_and_batched, test_rejected_batch_is_retried_row_by_row,
+                 test_only_available_artworks_are_imported, test_unreadable_body_is_the_clients_error,
+                 test_dry_run_writes_nothing, test_concurrent_imports_by_one_user_report_their_own_ids):
+        test()
+        print(f"{test.__name__}: ok")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for the optional ASGI entry point (asgi.py), with an in-process async pool
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from flask import Flask
+
+try:
+    import asgi
+except ImportError:  # asgiref is optional; so is the ASGI mode
+    asgi = None
+
+QUERY_SECONDS = 0.05
+
+
+class FakePool:
+    """aiomysql-shaped pool; every statement takes QUERY_SECONDS and PyMySQL-style % formatting is checked"""
+
+    def __init__(self):
+        self.statements = []
+
+    def acquire(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self.pool)
+
+
+class FakeCursor(FakeConnection):
+    async def execute(self, sql, params):
+        sql % params  # raises on an undoubled DATE_FORMAT '%Y'
+        self.pool.statements.append(sql)
+        await asyncio.sleep(QUERY_SECONDS)
+        section = sql.split("'")[1]
+        self.rows = {
+            'totals': [('totals', None, None, None, 2, 1, 3, Decimal('60.00'), None)],
+            'category': [('category', 'Painting', None, None, 3, None, None, None, None)],
+            'recent': [('recent', 'Dawn', 'Painting', 'Ana', None, None, None, Decimal('20.00'),
+                        datetime(2024, 5, 1, 12, 0))],
+            'monthly': [('monthly', '2024-05', None, None, 3, None, None, None, None)],
+        }[section]
+
+    async def fetchall(self):
+        return self.rows
+
+
+class FakeAuth:
+    def verify_token(self, token):
+        return {'user_id': 7} if token == 'good' else None
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, endpoint, user_id):
+        return self.entries.get((endpoint, user_id))
+
+    def generation(self, user_id):
+        return None
+
+    def set(self, endpoint, user_id, value, generation=None):
+        self.entries[(endpoint, user_id)] = value
+
+
+def make_app():
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/dashboard/stats')
+    def flask_dashboard():
+        return {'served_by': 'flask'}
+
+    pool = FakePool()
+
+    async def create_pool():
+        return pool
+
+    app = asgi.AsyncApp(flask_app, create_pool, FakeAuth(), DictCache(), lambda value: json.dumps(value, default=str),
+                        cors_origins=['https://*.vercel.app'])
+    return app, pool
+
+
+async def call(app, path, headers=()):
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+             'headers': [(k.lower().encode(), v.encode()) for k, v in headers],
+             'client': ('127.0.0.1', 1234), 'server': ('testserver', 80)}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    body = b''.join(m.get('body', b'') for m in messages[1:])
+    return start['status'], dict(start['headers']), body
+
+
+def test_dashboard_branches_run_concurrently():
+    if asgi is None:
+        return
+    app, pool = make_app()
+    started = time.perf_counter()
+    status, headers, body = asyncio.run(call(app, '/dashboard/stats', [('Authorization', 'Bearer good'),
+                                                                       ('Origin', 'https://demo.vercel.app')]))
+    elapsed = time.perf_counter() - started
+    body = json.loads(body)
+    assert status == 200 and len(pool.statements) == 4
+    assert elapsed < QUERY_SECONDS * 2  # four queries, one query's latency
+    assert body['total_artworks'] == 3 and body['total_value'] == 60.0
+    assert body['recent_artworks'][0]['artist_name'] == 'Ana'
+    assert body['monthly_artworks'] == [{'month': '2024-05', 'count': 3}]
+    assert headers[b'access-control-allow-origin'] == b'https://demo.vercel.app'
+
+    # Second request is a cache hit
+    asyncio.run(call(app, '/dashboard/stats', [('Authorization', 'Bearer good')]))
+    assert len(pool.statements) == 4
+
+
+def test_other_requests_go_to_flask():
+    if asgi is None:
+        return
+    app, pool = make_app()
+    for headers in ([], [('Authorization', 'Bearer expired')]):
+        status, _, body = asyncio.run(call(app, '/dashboard/stats', headers))
+        assert status == 200 and json.loads(body) == {'served_by': 'flask'}
+    assert asyncio.run(call(app, '/missing', []))[0] == 404
+    assert not pool.statements
+
+
+def test_literal_percent_signs_are_escaped_for_pymysql():
+    if asgi is None:
+        return
+    assert asgi.pymysql_sql("DATE_FORMAT(created_at, '%Y-%m') WHERE id = %s") == \
+        "DATE_FORMAT(created_at, '%%Y-%%m') WHERE id = %s"
+
+
+if __name__ == '__main__':
+    for test in (test_dashboard_branches_run_concurrently, test_other_requests_go_to_flask,
+                 test_literal_percent_signs_are_escaped_for_pymysql):
+        test()
+        print(f"{test.__name__}: ok")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-user result cache (cache.py): expiry, LRU eviction,
+invalidation on writes, across forked workers too, and configuration
+from the environment
+"""
+
+import multiprocessing
+import os
+import time
+
+from cache import MemoryBackend, ResultCache, SharedGenerations
+
+ENDPOINTS = ('dashboard/stats', 'dashboard/artist-stats')
+
+
+def test_entries_expire_after_their_ttl():
+    cache = ResultCache(MemoryBackend(), ttl=0.05, endpoints=ENDPOINTS)
+    cache.set('dashboard/stats', 1, {'total_artworks': 3})
+    assert cache.get('dashboard/stats', 1) == {'total_artworks': 3}
+    time.sleep(0.06)
+    assert cache.get('dashboard/stats', 1) is None
+    assert cache.backend.size() == 0  # dropped on read
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
+
+
+def test_least_recently_used_entry_is_evicted():
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', 1, 60)
+    backend.set('b', 2, 60)
+    assert backend.get('a') == 1  # a is now the most recent
+    backend.set('c', 3, 60)
+    assert backend.get('b') is None and backend.get('a') == 1 and backend.get('c') == 3
+    assert backend.size() == 2 and backend.evictions == 1
+    backend.set('a', 4, 60)  # overwriting doesn't evict
+    assert backend.get('a') == 4 and backend.evictions == 1
+
+
+def test_invalidate_drops_every_endpoint_for_the_users():
+    cache = ResultCache(MemoryBackend(), ttl=60, endpoints=ENDPOINTS)
+    for user_id in (1, 2, 3):
+        for endpoint in ENDPOINTS:
+            cache.set(endpoint, user_id, {'user': user_id})
+    pinned = []
+    cache.on_invalidate = lambda *user_ids: pinned.append(user_ids)
+
+    cache.invalidate(1, 2, 2, None)
+    assert [cache.get(e, u) for u in (1, 2) for e in ENDPOINTS] == [None] * 4
+    assert all(cache.get(e, 3) == {'user': 3} for e in ENDPOINTS)
+    assert pinned == [(1, 2, 2, None)]
+
+    # Nothing to delete (no user), but the hook still runs
+    cache.invalidate(None)
+    assert cache.stats()['invalidations'] == 1 and len(pinned) == 2
+    assert cache.stats()['entries'] == 2 and cache.stats()['backend'] == 'MemoryBackend'
+
+
+def worker(cache, cached, invalidated, result):
+    """Another gunicorn worker: caches its own copy, then reads it after the parent's write"""
+    cache.set('dashboard/stats', 1, {'total_artworks': 3})
+    cache.set('dashboard/stats', 2, {'total_artworks': 5})
+    cached.set()
+    invalidated.wait(5)
+    result.put((cache.get('dashboard/stats', 1), cache.get('dashboard/stats', 2)))
+
+
+def test_invalidation_reaches_forked_workers():
+    cache = ResultCache(MemoryBackend(), ttl=60, endpoints=ENDPOINTS, generations=SharedGenerations(slots=64))
+    fork = multiprocessing.get_context('fork')
+    cached, invalidated, result = fork.Event(), fork.Event(), fork.Queue()
+    child = fork.Process(target=worker, args=(cache, cached, invalidated, result))
+    child.start()
+    try:
+        assert cached.wait(5)
+        # The write lands in this process, which has nothing cached to delete
+        cache.invalidate(1)
+        invalidated.set()
+        assert result.get(timeout=5) == (None, {'total_artworks': 5})
+    finally:
+        child.join(5)
+    assert child.exitcode == 0
+
+
+def test_result_computed_across_a_write_is_not_kept():
+    cache = ResultCache(MemoryBackend(), ttl=60, endpoints=ENDPOINTS, generations=SharedGenerations(slots=64))
+    generation = cache.generation(1)
+    cache.invalidate(1)  # another request's write while the stats were being computed
+    cache.set('dashboard/stats', 1, {'total_artworks': 3}, generation)
+    assert cache.get('dashboard/stats', 1) is None
+    cache.set('dashboard/stats', 1, {'total_artworks': 4}, cache.generation(1))
+    assert cache.get('dashboard/stats', 1) == {'total_artworks': 4}
+
+
+def test_from_env_reads_the_cache_settings():
+    saved = {name: os.environ.get(name) for name in ('CACHE_BACKEND', 'CACHE_TTL', 'CACHE_MAX_ENTRIES')}
+    os.environ.update({'CACHE_BACKEND': 'memory', 'CACHE_TTL': '12', 'CACHE_MAX_ENTRIES': '3'})
+    try:
+        cache = ResultCache.from_env(ENDPOINTS)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    assert cache.ttl == 12 and cache.endpoints == ENDPOINTS
+    assert isinstance(cache.backend, MemoryBackend) and cache.backend.max_entries == 3
+    assert isinstance(cache.generations, SharedGenerations)
+
+
+if __name__ == '__main__':
+    print("=== Result Cache Tests ===\n")
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"{name}: ok")
+    print("\n=== Test Complete ===")
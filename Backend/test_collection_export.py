@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming collection export behind GET /export
+"""
+
+import gzip
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from collection_export import Export
+
+
+class KeysetCursor:
+    """Answers the artworks keyset query for `count` artworks with ids 1..count"""
+
+    def __init__(self, count):
+        self.count = count
+        self.rows = []
+        self.queries = 0
+
+    def execute(self, sql, params):
+        self.queries += 1
+        self.rows = []
+        if 'artworks a' in sql:
+            _, after, limit = params
+            self.rows = [(i, f'Artwork {i}', None, Decimal('10.00'), None, 'available', datetime(2024, 1, 1),
+                          None, None, None, None) for i in range(after + 1, min(after + limit, self.count) + 1)]
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.invalidated = self.closed = False
+
+    def cursor(self, buffered=True):
+        return self._cursor
+
+    def invalidate(self):
+        self.invalidated = True
+
+    def close(self):
+        self.closed = True
+
+
+def dumps(value):
+    return json.dumps(value, default=str)
+
+
+def export(args, count=12, chunk_size=5):
+    cursor = KeysetCursor(count)
+    conn = FakeConnection(cursor)
+    chunks = list(Export(args).body(lambda: conn, 1, dumps=dumps, chunk_size=chunk_size))
+    assert conn.closed and not conn.invalidated
+    return chunks, cursor
+
+
+def test_ndjson_in_keyset_chunks_with_checkpoints():
+    chunks, cursor = export({'sections': 'artworks,portfolios'})
+    lines = [json.loads(line) for line in ''.join(chunks).splitlines()]
+    assert [line['id'] for line in lines if line['type'] == 'artwork'] == list(range(1, 13))
+    assert cursor.queries == 3 + 1  # 5 + 5 + 2 artworks, one empty portfolios chunk
+    assert lines[-1] == {'type': 'end', 'rows': 12}
+
+    # Resuming from the first checkpoint picks up after artwork 5
+    token = next(line['token'] for line in lines if line['type'] == 'checkpoint')
+    chunks, _ = export({'sections': 'artworks,portfolios', 'token': token})
+    resumed = [json.loads(line) for line in ''.join(chunks).splitlines()]
+    assert [line['id'] for line in resumed if line['type'] == 'artwork'] == list(range(6, 13))
+
+
+def test_csv_gzip_resume_appends_a_member():
+    first, _ = export({'format': 'csv', 'sections': 'artworks', 'gzip': '1'}, count=3)
+    rest, _ = export({'format': 'csv', 'sections': 'artworks', 'gzip': '1', 'after_id': '3'}, count=4)
+    text = gzip.decompress(b''.join(first) + b''.join(rest)).decode('utf-8').splitlines()
+    assert text[0].startswith('id,title,description,price')
+    assert [line.split(',')[0] for line in text[1:]] == ['1', '2', '3', '4']
+
+
+def test_abandoned_export_discards_connection():
+    cursor = KeysetCursor(100)
+    conn = FakeConnection(cursor)
+    body = Export({}).body(lambda: conn, 1, dumps=dumps, chunk_size=50)
+    next(body)
+    body.close()
+    assert conn.invalidated and conn.closed
+
+
+def test_unstarted_export_takes_no_connection():
+    """HEAD, or a client gone before the first chunk: the generator is closed unstarted"""
+    checkouts = []
+    body = Export({}).body(lambda: checkouts.append(1), 1, dumps=dumps)
+    body.close()
+    assert checkouts == []
+
+
+if __name__ == '__main__':
+    for test in (test_ndjson_in_keyset_chunks_with_checkpoints, test_csv_gzip_resume_appends_a_member,
+                 test_abandoned_export_discards_connection, test_unstarted_export_takes_no_connection):
+        test()
+        print(f"{test.__name__}: ok")
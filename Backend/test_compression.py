@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for negotiated response compression (compression.py)
+"""
+
+import gzip
+import json
+
+from flask import Flask, jsonify
+
+import compression
+import http_cache
+
+ROWS = [{'id': i, 'title': f'Artwork {i}', 'status': 'available', 'price': 100.0 + i} for i in range(200)]
+
+
+def make_app(**kwargs):
+    app = Flask(__name__)
+    compressor = compression.Compressor(**kwargs)
+    compressor.init_app(app)
+    catalogue = http_cache.ConditionalGet(http_cache.SharedCounters(http_cache.TABLES))
+
+    @app.route('/artworks')
+    @catalogue.conditional('artworks')
+    def artworks():
+        return jsonify({'artworks': ROWS}), 200
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True}), 200
+
+    return app, compressor
+
+
+def test_large_json_is_compressed_with_the_accepted_encoding():
+    app, compressor = make_app()
+    client = app.test_client()
+    response = client.get('/artworks', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data)) == {'artworks': ROWS}
+    assert int(response.headers['Content-Length']) == len(response.data) < len(json.dumps(ROWS)) / 4
+
+    if compression.brotli is not None:
+        response = client.get('/artworks', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert json.loads(compression.brotli.decompress(response.data)) == {'artworks': ROWS}
+
+    for headers in ({}, {'Accept-Encoding': 'gzip;q=0, br;q=0'}):
+        assert 'Content-Encoding' not in client.get('/artworks', headers=headers).headers
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert compressor.stats()['too_small'] == 1
+
+
+def test_tagged_responses_are_compressed_once_and_still_revalidate():
+    app, compressor = make_app()
+    client = app.test_client()
+    first = client.get('/artworks', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/artworks', headers={'Accept-Encoding': 'gzip'})
+    assert first.data == second.data
+    stats = compressor.stats()
+    assert stats['compressed'] == 1 and stats['cache_hits'] == 1
+
+    tag = first.headers['ETag']
+    assert tag.startswith('W/"') and tag.endswith('-gz"')
+    revalidated = client.get('/artworks', headers={'Accept-Encoding': 'gzip', 'If-None-Match': tag})
+    assert revalidated.status_code == 304 and revalidated.headers['ETag'] == tag
+
+
+def test_level_drops_under_load():
+    compressor = compression.Compressor()
+    getloadavg = compression.os.getloadavg
+    try:
+        compression.os.getloadavg = lambda: (0.0, 0.0, 0.0)
+        assert compressor.level_band() == 0
+        compressor._band = (float('-inf'), 0)
+        compression.os.getloadavg = lambda: (compression.CORES * 3.0, 0.0, 0.0)
+        assert compressor.level_band() == 2
+        assert compression.LEVELS['gzip'][2] == 1
+    finally:
+        compression.os.getloadavg = getloadavg
+
+
+if __name__ == '__main__':
+    for test in (test_large_json_is_compressed_with_the_accepted_encoding,
+                 test_tagged_responses_are_compressed_once_and_still_revalidate, test_level_drops_under_load):
+        test()
+        print(f"{test.__name__}: ok")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-statement dashboard stats (dashboard_stats.py):
+folding the UNION ALL rows back into the /dashboard/stats and
+/dashboard/artist-stats response shapes, against a fake dictionary cursor
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import dashboard_stats
+
+USER_ID = 4
+
+
+def row(section, label=None, label2=None, label3=None, n1=None, n2=None, n3=None, amount=None, ts=None):
+    return dict(zip(dashboard_stats.ROW_COLUMNS, (section, label, label2, label3, n1, n2, n3, amount, ts)))
+
+
+def stats_cursor(fake_cursor, rows):
+    """dictionary=True cursor answering with `rows`; every placeholder must be the user id"""
+    def respond(sql, params):
+        assert set(params) == {USER_ID}
+        return rows
+    return fake_cursor(respond=respond)
+
+
+# Shuffled, as UNION ALL promises no order across branches
+RECENT = [
+    row('recent', 'Dusk', 'Oils', 'Ada', amount=Decimal('120.50'), ts=datetime(2026, 4, 2)),
+    row('monthly', '2026-04', n1=2),
+    row('category', 'Prints', n1=1),
+    row('recent', 'Dawn', None, None, amount=None, ts=datetime(2026, 4, 9)),
+    row('monthly', '2026-03', n1=5),
+    row('category', 'Oils', n1=6),
+]
+
+
+def test_collector_rows_fold_into_the_response(fake_cursor):
+    cursor = stats_cursor(fake_cursor, RECENT + [row('totals', n1=2, n2=3, n3=7, amount=Decimal('980.25'))])
+    assert dashboard_stats.collector_stats(cursor, USER_ID) == {
+        'total_categories': 2,
+        'total_artists': 3,
+        'total_artworks': 7,
+        'total_value': 980.25,
+        'artworks_by_category': [{'category_name': 'Oils', 'artwork_count': 6},
+                                 {'category_name': 'Prints', 'artwork_count': 1}],
+        'recent_artworks': [
+            {'title': 'Dawn', 'price': None, 'category_name': None, 'artist_name': None,
+             'created_at': datetime(2026, 4, 9)},
+            {'title': 'Dusk', 'price': 120.5, 'category_name': 'Oils', 'artist_name': 'Ada',
+             'created_at': datetime(2026, 4, 2)},
+        ],
+        'monthly_artworks': [{'month': '2026-03', 'count': 5}, {'month': '2026-04', 'count': 2}],
+    }
+    assert len(cursor.statements) == 1
+
+
+def test_artist_rows_fold_into_the_response(fake_cursor):
+    rows = [row('totals', n1=7, n2=3, amount=Decimal('450.00'))] + [
+        dict(r, label3='sold') if r['section'] == 'recent' else r for r in RECENT]
+    stats = dashboard_stats.artist_stats(stats_cursor(fake_cursor, rows), USER_ID)
+    assert (stats['total_artworks'], stats['total_sales'], stats['total_earnings']) == (7, 3, 450.0)
+    assert [(r['title'], r['status']) for r in stats['recent_artworks']] == [('Dawn', 'sold'), ('Dusk', 'sold')]
+    assert stats['monthly_sales'] == [{'month': '2026-03', 'count': 5}, {'month': '2026-04', 'count': 2}]
+    assert 'total_value' not in stats and 'monthly_artworks' not in stats
+
+
+def test_new_user_without_a_user_stats_row_reads_zeros(fake_cursor):
+    collector = dashboard_stats.collector_stats(stats_cursor(fake_cursor, []), USER_ID)
+    assert (collector['total_categories'], collector['total_artworks'], collector['total_value']) == (0, 0, 0.0)
+    assert collector['recent_artworks'] == collector['artworks_by_category'] == []
+    artist = dashboard_stats.artist_stats(stats_cursor(fake_cursor, []), USER_ID)
+    assert (artist['total_sales'], artist['total_earnings'], artist['monthly_sales']) == (0, 0.0, [])
+
+
+def test_branches_run_separately_give_the_same_dict(fake_cursor):
+    """asgi.py runs each branch on its own connection and folds the concatenated rows"""
+    for branches, statement in ((dashboard_stats.COLLECTOR_BRANCHES, dashboard_stats.COLLECTOR_STATS_SQL),
+                                (dashboard_stats.ARTIST_BRANCHES, dashboard_stats.ARTIST_STATS_SQL)):
+        assert (sum(len(dashboard_stats.params(sql, USER_ID)) for sql in branches)
+                == len(dashboard_stats.params(statement, USER_ID)) == statement.count('%s'))
+    rows = RECENT + [row('totals', n1=2, n2=3, n3=7, amount=Decimal('980.25'))]
+    by_section = [[r for r in rows if r['section'] == s] for s in ('totals', 'category', 'recent', 'monthly')]
+    assert (dashboard_stats.collector_stats_from_rows(sum(by_section, []))
+            == dashboard_stats.collector_stats(stats_cursor(fake_cursor, rows), USER_ID))
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Tests for the connection pool behind get_db_connection(), using an in-process
+stand-in for MySQL that charges a fixed handshake cost per connect()
+"""
+
+import threading
+import time
+
+from db_pool import ConnectionPool, PoolTimeout, ReplicaRouter
+
+HANDSHAKE_SECONDS = 0.02
+
+
+class FakeConnection:
+    """Stand-in for a mysql.connector connection"""
+
+    def __init__(self):
+        time.sleep(HANDSHAKE_SECONDS)  # TCP + auth handshake
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise ConnectionError('MySQL server has gone away')
+
+    def rollback(self):
+        if not self.alive:
+            raise ConnectionError('MySQL server has gone away')
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    return ConnectionPool(connect, **kwargs), opened
+
+
+def test_handshake_cost_is_paid_once():
+    """Sequential requests reuse one socket instead of reconnecting"""
+    pool, opened = make_pool(size=2, max_overflow=0)
+
+    started = time.perf_counter()
+    for _ in range(50):
+        conn = pool.connection()
+        conn.close()
+    elapsed = time.perf_counter() - started
+
+    assert len(opened) == 1
+    assert pool.status()['connects'] == 1
+    # 50 unpooled connects would cost 50 handshakes
+    assert elapsed < HANDSHAKE_SECONDS * 5
+    print(f"50 checkouts in {elapsed * 1000:.1f}ms "
+          f"(unpooled would be ~{50 * HANDSHAKE_SECONDS * 1000:.0f}ms)")
+
+
+def test_returned_connection_is_rolled_back():
+    pool, opened = make_pool(size=1, max_overflow=0)
+    with pool.connection():
+        pass
+    assert opened[0].rollbacks == 1
+
+
+def test_overflow_connections_are_closed_on_return():
+    pool, opened = make_pool(size=1, max_overflow=2)
+    conns = [pool.connection() for _ in range(3)]
+    assert pool.status()['overflow'] == 2
+    for conn in conns:
+        conn.close()
+
+    status = pool.status()
+    assert status['idle'] == 1
+    assert status['opened'] == 1
+    assert sum(c.closed for c in opened) == 2
+
+
+def test_checkout_times_out_when_exhausted():
+    pool, _ = make_pool(size=1, max_overflow=0, timeout=0.05)
+    held = pool.connection()
+    try:
+        pool.connection()
+        assert False, 'expected PoolTimeout'
+    except PoolTimeout:
+        pass
+    assert pool.status()['timeouts'] == 1
+    held.close()
+
+
+def test_waiting_checkout_gets_returned_connection():
+    pool, opened = make_pool(size=1, max_overflow=0, timeout=2)
+    held = pool.connection()
+    threading.Timer(0.05, held.close).start()
+
+    conn = pool.connection()
+    conn.close()
+    assert len(opened) == 1
+
+
+def test_dead_connection_is_replaced_on_checkout():
+    pool, opened = make_pool(size=1, max_overflow=0)
+    pool.connection().close()
+    opened[0].alive = False
+
+    conn = pool.connection()
+    assert conn._raw is opened[1]
+    conn.close()
+    assert pool.status()['ping_failures'] == 1
+
+
+def test_stale_connection_is_recycled():
+    pool, opened = make_pool(size=1, max_overflow=0, recycle=0.01)
+    pool.connection().close()
+    time.sleep(0.02)
+
+    pool.connection().close()
+    assert len(opened) == 2
+    assert opened[0].closed
+    assert pool.status()['recycled'] == 1
+
+
+def test_connection_broken_mid_request_is_discarded():
+    pool, opened = make_pool(size=1, max_overflow=0)
+    conn = pool.connection()
+    opened[0].alive = False
+    conn.close()
+
+    status = pool.status()
+    assert status['idle'] == 0
+    assert status['opened'] == 0
+
+
+def test_warm_opens_up_to_size():
+    pool, opened = make_pool(size=3, max_overflow=2)
+    held = pool.connection()
+    assert pool.warm() == 3
+    assert len(opened) == 4 and pool.status()['idle'] == 3
+
+    started = time.perf_counter()
+    pool.connection().close()
+    assert time.perf_counter() - started < HANDSHAKE_SECONDS  # no handshake on the first request
+    held.close()
+    assert pool.warm() == 0
+
+
+def test_after_fork_forgets_inherited_connections_without_closing():
+    pool, opened = make_pool(size=2, max_overflow=0)
+    pool.warm()
+    pool.after_fork()
+    assert pool.status()['opened'] == 0 and pool.status()['connects'] == 0
+    assert not any(c.closed for c in opened)  # the parent is still using these sockets
+
+    pool.connection().close()
+    assert len(opened) == 3
+
+
+class FakeReplicaConnection(FakeConnection):
+    """Answers SHOW REPLICA STATUS with the replica's current lag"""
+
+    def __init__(self, replica):
+        super().__init__()
+        self.replica = replica
+
+    def cursor(self):
+        return FakeStatusCursor(self.replica)
+
+
+class FakeStatusCursor:
+    column_names = ('Replica_IO_Running', 'Seconds_Behind_Source')
+
+    def __init__(self, replica):
+        self.replica = replica
+
+    def execute(self, sql):
+        assert sql == 'SHOW REPLICA STATUS'
+
+    def fetchone(self):
+        return ('Yes', self.replica['lag'])
+
+    def close(self):
+        pass
+
+
+def make_router(replicas=2, **kwargs):
+    """Router over a primary and `replicas` stand-ins; each replica dict controls lag and reachability"""
+    primary, _ = make_pool(size=2)
+    states = [{'lag': 0, 'up': True} for _ in range(replicas)]
+
+    def connect(state):
+        if not state['up']:
+            raise ConnectionError("Can't connect to MySQL server")
+        return FakeReplicaConnection(state)
+
+    pools = [ConnectionPool(lambda state=state: connect(state), size=2) for state in states]
+    return ReplicaRouter(primary, pools, **kwargs), primary, pools, states
+
+
+def served_by(router, primary, pools, **kwargs):
+    conn = router.connection(**kwargs)
+    conn.close()
+    return 'primary' if conn._pool is primary else pools.index(conn._pool)
+
+
+def test_reads_round_robin_over_replicas_and_writes_go_to_the_primary():
+    router, primary, pools, _ = make_router()
+    assert [served_by(router, primary, pools, readonly=True) for _ in range(4)] == [0, 1, 0, 1]
+    assert served_by(router, primary, pools) == 'primary'
+
+
+def test_recent_writer_and_fresh_tables_read_from_the_primary():
+    router, primary, pools, _ = make_router(read_your_writes=0.05)
+    router.note_write(7)
+    assert served_by(router, primary, pools, readonly=True, user_id=7) == 'primary'
+    assert served_by(router, primary, pools, readonly=True, user_id=8) != 'primary'
+    assert served_by(router, primary, pools, readonly=True, changed_at=time.time()) == 'primary'
+    time.sleep(0.06)
+    assert served_by(router, primary, pools, readonly=True, user_id=7) != 'primary'
+    assert router.status()['routing']['read_your_writes'] == 1
+
+
+def test_unreachable_or_lagging_replicas_fail_over():
+    router, primary, pools, states = make_router(max_lag=5, check_interval=0.01, cooldown=0.3)
+    states[0]['up'] = False
+    states[1]['lag'] = 60
+    assert served_by(router, primary, pools, readonly=True) == 'primary'
+    status = router.status()
+    assert [r['healthy'] for r in status['replicas']] == [False, False]
+    assert status['routing']['no_healthy_replica'] == 1
+
+    # Both recover; they are retried once the cooldown is over
+    states[0]['up'] = True
+    states[1]['lag'] = 0
+    assert served_by(router, primary, pools, readonly=True) == 'primary'
+    time.sleep(0.31)
+    assert {served_by(router, primary, pools, readonly=True) for _ in range(2)} == {0, 1}
+
+
+if __name__ == '__main__':
+    print("=== Connection Pool Tests ===\n")
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"{name}: ok")
+    print("\n=== Test Complete ===")
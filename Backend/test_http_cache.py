@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for ETags and conditional GETs (http_cache.py)
+"""
+
+import os
+
+from flask import Flask, jsonify
+
+import http_cache
+
+
+def make_app():
+    app = Flask(__name__)
+    cache = http_cache.ConditionalGet(http_cache.SharedCounters(http_cache.TABLES))
+    calls = []
+
+    @app.route('/categories')
+    @cache.conditional('categories')
+    def categories():
+        calls.append(1)
+        return jsonify({'categories': [{'id': 1, 'name': 'Painting'}]}), 200
+
+    return app, cache, calls
+
+
+def test_matching_etag_gets_304_without_running_the_view():
+    app, cache, calls = make_app()
+    client = app.test_client()
+    first = client.get('/categories')
+    tag = first.headers['ETag']
+    assert first.status_code == 200 and not tag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert 'Authorization' in first.headers['Vary']
+
+    second = client.get('/categories', headers={'If-None-Match': tag})
+    assert second.status_code == 304 and second.data == b''
+    assert second.headers['ETag'] == tag and len(calls) == 1
+
+    stats = cache.stats()
+    assert stats['not_modified'] == 1 and stats['full'] == 1 and stats['hit_ratio'] == 0.5
+    assert stats['bytes_saved'] == len(first.data)
+
+
+def test_bump_and_query_string_change_the_etag():
+    app, cache, calls = make_app()
+    client = app.test_client()
+    tag = client.get('/categories').headers['ETag']
+    assert client.get('/categories?limit=5').headers['ETag'] != tag
+
+    cache.bump('artists')  # unrelated table
+    assert client.get('/categories', headers={'If-None-Match': tag}).status_code == 304
+    cache.bump('categories')
+    response = client.get('/categories', headers={'If-None-Match': tag})
+    assert response.status_code == 200 and response.headers['ETag'] != tag
+
+
+def test_bumps_in_a_forked_worker_are_seen_by_the_others():
+    counters = http_cache.SharedCounters(http_cache.TABLES)
+    pid = os.fork()
+    if pid == 0:
+        counters.incr(['artworks', 'artworks'])
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert counters.get(['categories', 'artworks']) == [0, 2]
+
+
+if __name__ == '__main__':
+    for test in (test_matching_etag_gets_304_without_running_the_view, test_bump_and_query_string_change_the_etag,
+                 test_bumps_in_a_forked_worker_are_seen_by_the_others):
+        test()
+        print(f"{test.__name__}: ok")
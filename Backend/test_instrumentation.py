@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the request/SQL instrumentation behind /metrics
+"""
+
+from flask import Flask
+
+from instrumentation import Instrumentation, normalize, redact
+
+
+class FakeCursor:
+    def execute(self, sql, params=None):
+        if 'missing_table' in sql:
+            raise RuntimeError("Table 'missing_table' doesn't exist")
+
+    def executemany(self, sql, seq_params):
+        pass
+
+    def fetchall(self):
+        return [(1,)]
+
+
+def test_statements_are_normalized_and_params_redacted():
+    assert normalize('''
+        SELECT id FROM artworks
+        WHERE status = 'available' AND id IN (%s, %s, %s) LIMIT 50
+    ''') == 'SELECT id FROM artworks WHERE status = ? AND id IN (...) LIMIT ?'
+    assert normalize('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)') == \
+        'INSERT INTO t (a, b) VALUES (%s, %s), ...'
+    assert redact(('secret@example.com', 42, None, b'\x00\x01')) == '(<str:18>, <int>, NULL, <bytes:2>)'
+
+
+def test_requests_and_queries_are_histogrammed():
+    app = Flask(__name__)
+    instrumentation = Instrumentation(slow_query_seconds=0)
+    instrumentation.init_app(app)
+
+    @app.route('/items/<int:item_id>')
+    def item(item_id):
+        cursor = instrumentation.cursor(FakeCursor())
+        cursor.execute('SELECT * FROM items WHERE id = %s', (item_id,))
+        cursor.execute('SELECT * FROM items WHERE id = %s', (item_id + 1,))
+        try:
+            cursor.execute('SELECT * FROM missing_table')
+        except RuntimeError:
+            pass
+        return {'rows': cursor.fetchall()}
+
+    client = app.test_client()
+    for item_id in (1, 2):
+        response = client.get(f'/items/{item_id}')
+        assert response.status_code == 200
+        assert 'desc="3 queries"' in response.headers['Server-Timing']
+
+    text = instrumentation.render({'db_pool_in_use': 0})
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/<int:item_id>"} 2' in text
+    assert 'http_responses_total{method="GET",route="/items/<int:item_id>",status="200"} 2' in text
+    assert ('db_query_duration_seconds_bucket{statement="SELECT * FROM items WHERE id = %s",le="+Inf"} 4'
+            in text)
+    assert 'db_slow_queries_total 6' in text and 'db_failed_queries_total 2' in text
+    assert text.endswith('db_pool_in_use 0\n')
+    assert sorted(row['count'] for row in instrumentation.slowest_statements()) == [2, 4]
+
+
+def test_profiled_request_writes_folded_stacks(tmp_path=None):
+    import tempfile
+    import time
+
+    profile_dir = str(tmp_path or tempfile.mkdtemp())
+    app = Flask(__name__)
+    instrumentation = Instrumentation(profile_dir=profile_dir, profile_interval=0.001)
+    instrumentation.init_app(app)
+
+    @app.route('/slow')
+    def slow():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return 'done'
+
+    client = app.test_client()
+    assert 'X-Profile' not in client.get('/slow').headers
+    name = client.get('/slow', headers={'X-Profile': '1'}).headers['X-Profile']
+    with open(f'{profile_dir}/{name}') as f:
+        stacks = f.read().splitlines()
+    assert stacks and any('test_instrumentation.py:slow' in line for line in stacks)
+
+
+if __name__ == '__main__':
+    for test in (test_statements_are_normalized_and_params_redacted, test_requests_and_queries_are_histogrammed,
+                 test_profiled_request_writes_folded_stacks):
+        test()
+        print(f"{test.__name__}: ok")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for GET /marketplace/search (marketplace_search.py): the one UNION ALL
+statement's placeholders and params, facet parsing and relevance paging,
+against a fake cursor
+"""
+
+import itertools
+import re
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from marketplace_search import Search, search
+from pagination import InvalidPageRequest, encode_cursor
+
+USER_ID = 9
+
+
+def searcher(hits=(), facets=()):
+    """respond() answering a search from `hits` (id, title, score) and canned facet rows"""
+    def respond(sql, params):
+        after = re.search(r'm\.score < ([\d.]+) OR \(m\.score = [\d.]+ AND a\.id < (\d+)\)', sql)
+        limit = int(re.search(r'LIMIT (\d+)\)', sql).group(1))
+        ranked = sorted(hits, key=lambda h: (h[2], h[0]), reverse=True)
+        if after:
+            score, row_id = float(after.group(1)), int(after.group(2))
+            ranked = [h for h in ranked if (h[2], h[0]) < (score, row_id)]
+        # UNION ALL branches come back in no particular order
+        return (list(facets) + [('hit', None, None, None) + h for h in reversed(ranked[:limit])]
+                + [('total', None, None, len(hits))])
+    return respond
+
+
+def test_placeholders_line_up_for_every_filter_combination(fake_cursor):
+    filters = [('category_id', '3,4', "m.category_id IN (3, 4)"),
+               ('artist_id', '7', "m.artist_id IN (7)"),
+               ('min_price', '10', "m.price >= 10.0"),
+               ('max_price', '250.5', "m.price <= 250.5"),
+               ('status', 'available,reserved', "m.status IN ('available', 'reserved')")]
+    created_at = datetime(2026, 3, 1, 12, 30)
+    cursor = fake_cursor()
+    for q, with_cursor, *chosen in itertools.product((False, True), repeat=2 + len(filters)):
+        args = {'limit': '2'}
+        if q:
+            args['q'] = 'lake'
+        if with_cursor:
+            args['cursor'] = encode_cursor(2.5 if q else created_at, 17)
+        for (name, value, _), on in zip(filters, chosen):
+            if on:
+                args[name] = value
+        cursor.execute(*Search(args).query(USER_ID))
+        sql = cursor.statements[-1]
+
+        assert sql.count("AGAINST ('lake')") == (4 if q else 0)
+        assert sql.count(f'created_by != {USER_ID}') == 1
+        assert 'LIMIT 3)' in sql
+        # Every filter narrows the hits, the total and the three other facets' counts
+        for (name, _, predicate), on in zip(filters, chosen):
+            assert sql.count(predicate) == (5 if on else 0), (args, predicate)
+        if not chosen[-1]:
+            assert sql.count("m.status IN ('available')") == 5
+        if with_cursor and q:
+            assert '(m.score < 2.5 OR (m.score = 2.5 AND a.id < 17))' in sql
+        elif with_cursor:
+            assert "(a.created_at < '2026-03-01 12:30:00' OR (a.created_at = '2026-03-01 12:30:00' AND a.id < 17))" in sql
+        else:
+            assert 'a.id <' not in sql
+
+
+def test_facets_are_parsed_and_ordered(fake_cursor):
+    facets = [
+        ('category', 2, 'Oils', 4), ('category', 1, 'Prints', 9), ('category', None, None, 3),
+        ('artist', 5, 'Ada', 2),
+        ('price', Decimal('500'), None, 1), ('price', 0, None, 6), ('price', 5000, None, 2),
+        ('price', None, None, 1),
+        ('status', None, 'sold', 1), ('status', None, 'available', 8),
+    ]
+    body = search(fake_cursor(respond=searcher(facets=facets)), USER_ID, {'q': 'lake', 'fields': 'id,title'})
+    assert body['total'] == 0 and body['artworks'] == [] and body['next_cursor'] is None
+    assert body['facets'] == {
+        'category': [{'id': 1, 'name': 'Prints', 'count': 9}, {'id': 2, 'name': 'Oils', 'count': 4}],
+        'artist': [{'id': 5, 'name': 'Ada', 'count': 2}],
+        'price': [{'min': 0, 'max': 100, 'count': 6}, {'min': 500, 'max': 1000, 'count': 1},
+                  {'min': 5000, 'max': None, 'count': 2}],
+        'status': [{'value': 'available', 'count': 8}, {'value': 'sold', 'count': 1}],
+    }
+
+
+def test_relevance_cursor_pages_through_ties(fake_cursor):
+    hits = [(1, 'a', 3.0), (2, 'b', 1.5), (3, 'c', 1.5), (4, 'd', 1.5), (5, 'e', 0.25)]
+    cursor = fake_cursor(respond=searcher(hits))
+    args = {'q': 'lake', 'limit': '2', 'fields': 'id,title,relevance'}
+    seen = []
+    while True:
+        body = search(cursor, USER_ID, args)
+        assert body['total'] == len(hits)
+        seen += [(row.id, row.relevance) for row in body['artworks']]
+        if body['next_cursor'] is None:
+            break
+        args = dict(args, cursor=body['next_cursor'])
+    assert seen == [(1, 3.0), (4, 1.5), (3, 1.5), (2, 1.5), (5, 0.25)]
+    assert len(cursor.statements) == 3
+
+
+def test_cursor_from_another_listing_is_rejected():
+    browse_cursor = encode_cursor(datetime(2026, 3, 1, 12, 30), 17)
+    Search({'cursor': browse_cursor})
+    for args in ({'q': 'lake', 'cursor': browse_cursor},   # browsing, then typing a query
+                 {'cursor': encode_cursor(2.5, 17)},       # and the other way round
+                 {'q': 'lake', 'cursor': 'not-a-cursor'}):
+        with pytest.raises(InvalidPageRequest):
+            Search(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__]))
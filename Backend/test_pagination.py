@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for keyset pagination (pagination.py): cursors, limits, field
+projection and the look-ahead row
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from pagination import ALL_ROWS, MAX_PAGE_SIZE, InvalidPageRequest, Page, decode_cursor, encode_cursor
+
+FIELDS = {'id': 'a.id', 'title': 'a.title', 'price': 'a.price', 'created_at': 'a.created_at'}
+CREATED = datetime(2026, 2, 14, 18, 45, 30, 125000)
+
+
+def rejected(make):
+    try:
+        make()
+    except InvalidPageRequest as e:
+        return str(e)
+    assert False, 'expected InvalidPageRequest'
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(CREATED, 42)) == (CREATED, 42)
+    assert decode_cursor(encode_cursor(2.75, 9)) == (2.75, 9)
+    assert decode_cursor(encode_cursor(0, 1)) == (0, 1)
+    assert '=' not in encode_cursor(CREATED, 42)
+
+
+def test_tampered_cursors_are_rejected():
+    def token(value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii')
+
+    good = encode_cursor(CREATED, 42)
+    for bad in (good[:-3], good + '!', 'not-a-cursor', token(['yesterday', 1]), token([True, 1]),
+                token([None, 1]), token([1.5, 'x']), token([1.5]), token({'a': 1})):
+        assert rejected(lambda: decode_cursor(bad)) == 'Invalid cursor', bad
+        assert rejected(lambda: Page({'cursor': bad}, FIELDS)) == 'Invalid cursor', bad
+
+
+def test_limit_is_clamped_and_validated():
+    assert Page({}, FIELDS).limit == 50
+    assert Page({'limit': '10'}, FIELDS).fetch_size == 11
+    assert Page({'limit': '100000'}, FIELDS).limit == MAX_PAGE_SIZE
+    # Streamed responses aren't held in memory, so the cap doesn't apply
+    assert Page({'limit': '100000', 'stream': '1'}, FIELDS).limit == 100000
+    assert Page({'stream': '1'}, FIELDS).fetch_size == ALL_ROWS
+    assert rejected(lambda: Page({'limit': 'ten'}, FIELDS)) == 'limit must be an integer'
+    for bad in ('0', '-5'):
+        assert rejected(lambda: Page({'limit': bad}, FIELDS)) == 'limit must be positive'
+
+
+def test_fields_are_validated_and_hidden_columns_go_last():
+    page = Page({'fields': 'title, price,title,'}, FIELDS)
+    assert page.output == ['title', 'price']
+    assert page.selected == ['title', 'price', 'created_at', 'id']
+    assert page.select_list() == 'a.title AS title, a.price AS price, a.created_at AS created_at, a.id AS id'
+    assert Page({}, FIELDS).selected == list(FIELDS)
+    assert rejected(lambda: Page({'fields': 'title,secret'}, FIELDS)) == 'Unknown field: secret'
+
+
+def test_keyset_starts_after_the_cursor():
+    assert Page({}, FIELDS).keyset() == ('1 = 1', ())
+    page = Page({'cursor': encode_cursor(CREATED, 42)}, FIELDS)
+    assert page.keyset() == ('(a.created_at < %s OR (a.created_at = %s AND a.id < %s))', (CREATED, CREATED, 42))
+    assert page.order_by() == 'a.created_at DESC, a.id DESC'
+    # A cursor whose sort value doesn't fit the listing's sort column
+    assert rejected(lambda: Page({'cursor': encode_cursor(2.5, 42)}, FIELDS)) == 'Cursor belongs to a different listing'
+    assert Page({'cursor': encode_cursor(2.5, 42)}, FIELDS, sort_types=(float,)).after == (2.5, 42)
+
+
+def test_look_ahead_row_sets_next_cursor():
+    page = Page({'limit': '2', 'fields': 'title'}, FIELDS)
+    rows = [('c', CREATED, 3), ('b', CREATED, 2), ('a', datetime(2026, 1, 1), 1)]
+
+    out, next_cursor = page.finish(rows)
+    assert [row.title for row in out] == ['c', 'b'] and not hasattr(out[0], 'id')
+    assert decode_cursor(next_cursor) == (CREATED, 2)
+    assert Page({'limit': '2', 'cursor': next_cursor}, FIELDS).after == (CREATED, 2)
+
+    # Exactly a page (no look-ahead row) or less: the listing is finished
+    for last_page in (rows[:2], rows[:1], []):
+        assert page.finish(last_page)[1] is None
+
+    batches = list(page.finish_batches([rows[:1], rows[1:]]))
+    assert [[row.title for row in batch] for batch in batches] == [['c'], ['b']]
+    assert decode_cursor(page.next_cursor) == (CREATED, 2)
+
+
+if __name__ == '__main__':
+    print("=== Pagination Tests ===\n")
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"{name}: ok")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for the bcrypt worker pool used by /signup and /login
+"""
+
+import threading
+
+from passwords import PasswordHasher, PasswordHasherBusy, hash_rounds
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(workers=1, rounds=4)
+    try:
+        hashed = hasher.hash('correct horse')
+        assert hash_rounds(hashed) == 4
+        assert hasher.verify('correct horse', hashed)
+        assert not hasher.verify('wrong horse', hashed)
+    finally:
+        hasher.shutdown()
+
+
+def test_needs_rehash_when_cost_changes():
+    old = PasswordHasher(workers=1, rounds=4)
+    new = PasswordHasher(workers=1, rounds=5)
+    try:
+        hashed = old.hash('secret')
+        assert not old.needs_rehash(hashed)
+        assert new.needs_rehash(hashed)
+        assert new.verify('secret', hashed)  # old hashes keep working
+        assert hash_rounds(new.rehash('secret')) == 5
+    finally:
+        old.shutdown()
+        new.shutdown()
+
+
+def test_full_queue_is_rejected_not_queued():
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=12)
+    hasher.hash('warm up')  # start the worker process outside the race
+    errors = []
+
+    def attempt():
+        try:
+            hasher.hash('secret')
+        except PasswordHasherBusy as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=attempt) for _ in range(4)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(errors) == 3
+        assert all(e.retry_after >= 1 for e in errors)
+        assert hasher.stats()['rejected_busy'] == 3
+    finally:
+        hasher.shutdown()
+
+
+if __name__ == '__main__':
+    for test in (test_hash_and_verify, test_needs_rehash_when_cost_changes,
+                 test_full_queue_is_rejected_not_queued):
+        test()
+        print(f"{test.__name__}: ok")
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Stress tests for the purchase path behind POST /transactions (purchase.py),
+against an in-process stand-in for InnoDB: row locks held until commit or
+rollback, a unique (buyer_id, idempotency_key) index, and injectable
+deadlocks
+"""
+
+import threading
+import time
+from decimal import Decimal
+
+import purchase
+
+BUYERS = 300
+
+
+class DatabaseError(Exception):
+    def __init__(self, errno, msg):
+        super().__init__(f'{errno}: {msg}')
+        self.errno = errno
+
+
+class FakeDatabase:
+    """Artworks keyed by id as {'created_by', 'status'[, 'reserved_by', 'reserved_until']};
+    transactions as a list of dicts. reserved_until is a time.time(), compared with now() for NOW()
+    """
+
+    def __init__(self, artworks, deadlocks=0, lock_wait=5):
+        self.artworks = artworks
+        self.transactions = []
+        self.earnings = {}
+        self.deadlocks = deadlocks  # the next N transaction inserts are chosen as deadlock victims
+        self.lock_wait = lock_wait
+        self.mutex = threading.Lock()
+        self.row_locks = {}
+
+    def connect(self):
+        return FakeConnection(self)
+
+    def now(self):
+        return time.time()
+
+    def claimable(self, artwork, user_id):
+        if artwork['status'] == 'available':
+            return True
+        until = artwork.get('reserved_until')
+        return artwork['status'] == 'reserved' and (
+            artwork.get('reserved_by') == user_id or (until is not None and until < self.now()))
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self.held = []
+        self.undo = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def lock_row(self, artwork_id):
+        lock = self.db.row_locks.setdefault(artwork_id, threading.Lock())
+        if lock in self.held:
+            return
+        if not lock.acquire(timeout=self.db.lock_wait):
+            raise DatabaseError(purchase.ER_LOCK_WAIT_TIMEOUT, 'Lock wait timeout exceeded')
+        self.held.append(lock)
+
+    def _end(self):
+        self.undo.clear()
+        while self.held:
+            self.held.pop().release()
+
+    def commit(self):
+        self._end()
+
+    def rollback(self):
+        with self.db.mutex:
+            for undo in reversed(self.undo):
+                undo()
+        self._end()
+
+    def close(self):
+        self.rollback()  # like returning it to the pool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.db = conn.db
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def _update(self, artwork_id, matches, **values):
+        """Lock and conditionally change one artwork, like an UPDATE ... WHERE id = ?"""
+        self.rowcount = 0
+        if artwork_id not in self.db.artworks:
+            return
+        self.conn.lock_row(artwork_id)
+        artwork = self.db.artworks[artwork_id]
+        if matches(artwork):
+            before = dict(artwork)
+            artwork.update(values)
+            self.conn.undo.append(lambda: (artwork.clear(), artwork.update(before)))
+            self.rowcount = 1
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        db, conn = self.db, self.conn
+        if sql.startswith("UPDATE artworks SET status = 'sold'"):
+            artwork_id, buyer_id, _ = params
+            self._update(artwork_id, lambda a: a['created_by'] != buyer_id and db.claimable(a, buyer_id),
+                         status='sold', reserved_by=None, reserved_until=None)
+        elif sql.startswith("UPDATE artworks SET status = 'reserved'"):
+            user_id, seconds, artwork_id, _, _ = params
+            self._update(artwork_id, lambda a: a['created_by'] != user_id and db.claimable(a, user_id),
+                         status='reserved', reserved_by=user_id, reserved_until=db.now() + seconds)
+        elif sql.startswith("UPDATE artworks SET status = 'available'") and 'id IN' in sql:
+            expired = 0
+            for artwork_id in params:
+                self._update(artwork_id, lambda a: a['status'] == 'reserved' and a['reserved_until'] is not None
+                             and a['reserved_until'] < db.now(),
+                             status='available', reserved_by=None, reserved_until=None)
+                expired += self.rowcount
+            self.rowcount = expired
+        elif sql.startswith("UPDATE artworks SET status = 'available'"):
+            artwork_id, user_id = params
+            self._update(artwork_id, lambda a: a['status'] == 'reserved' and a.get('reserved_by') == user_id,
+                         status='available', reserved_by=None, reserved_until=None)
+        elif sql.startswith("SELECT id, created_by FROM artworks WHERE status = 'reserved'"):
+            expired = sorted((a['reserved_until'], i, a['created_by']) for i, a in db.artworks.items()
+                             if a['status'] == 'reserved' and a.get('reserved_until') is not None
+                             and a['reserved_until'] < db.now())
+            self.rows = [(i, owner) for _, i, owner in expired[:params[0]]]
+        elif sql.startswith('SELECT created_by, status, reserved_by, reserved_until'):
+            artwork = db.artworks.get(params[0])
+            until = artwork.get('reserved_until') if artwork else None
+            self.rows = [(artwork['created_by'], artwork['status'], artwork.get('reserved_by'), until,
+                          None if until is None else until > db.now())] if artwork else []
+        elif sql.startswith('SELECT created_by FROM artworks'):
+            artwork = db.artworks.get(params[0])
+            self.rows = [(artwork['created_by'],)] if artwork else []
+        elif sql.startswith('INSERT INTO transactions'):
+            time.sleep(0.001)  # let other buyers pile up on the row lock
+            buyer_id, seller_id, artwork_id, amount, _, _, key = params
+            with db.mutex:
+                if db.deadlocks:
+                    db.deadlocks -= 1
+                    raise DatabaseError(purchase.ER_LOCK_DEADLOCK, 'Deadlock found when trying to get lock')
+                if key is not None and any(t['buyer_id'] == buyer_id and t['key'] == key for t in db.transactions):
+                    raise DatabaseError(purchase.ER_DUP_ENTRY, 'Duplicate entry for key uq_transactions_buyer_key')
+                row = {'id': len(db.transactions) + 1, 'buyer_id': buyer_id, 'seller_id': seller_id,
+                       'artwork_id': artwork_id, 'amount': amount, 'key': key}
+                db.transactions.append(row)
+                conn.undo.append(lambda: db.transactions.remove(row))
+            self.lastrowid = row['id']
+        elif sql.startswith('SELECT id, seller_id, artwork_id FROM transactions'):
+            buyer_id, key = params
+            with db.mutex:
+                self.rows = [(t['id'], t['seller_id'], t['artwork_id']) for t in db.transactions
+                             if t['buyer_id'] == buyer_id and t['key'] == key]
+        elif sql.startswith('INSERT INTO user_stats'):
+            seller_id, _, earnings = params
+            with db.mutex:
+                db.earnings[seller_id] = db.earnings.get(seller_id, 0) + earnings
+                conn.undo.append(lambda: db.earnings.update({seller_id: db.earnings[seller_id] - earnings}))
+        else:
+            raise AssertionError(f'unexpected SQL: {sql}')
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def stampede(db, engine, buyers, artwork_id=1, key=None):
+    """Start every buyer at once; results[i] is the purchase result or the PurchaseRejected status"""
+    results = [None] * len(buyers)
+    start = threading.Barrier(len(buyers))
+
+    def buy(i, buyer_id):
+        start.wait()
+        try:
+            results[i] = engine.buy(db.connect(), buyer_id, artwork_id, Decimal('250.00'), key=key)
+        except purchase.PurchaseRejected as e:
+            results[i] = e.status
+
+    threads = [threading.Thread(target=buy, args=(i, b)) for i, b in enumerate(buyers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_hundreds_of_buyers_one_sale():
+    db = FakeDatabase({1: {'created_by': 1, 'status': 'available'}})
+    engine = purchase.PurchaseEngine()
+    started = time.perf_counter()
+    results = stampede(db, engine, range(2, BUYERS + 2))
+    elapsed = time.perf_counter() - started
+
+    sales = [r for r in results if isinstance(r, dict)]
+    assert len(sales) == 1 and len(db.transactions) == 1
+    assert results.count(404) == BUYERS - 1
+    assert db.transactions[0]['buyer_id'] != 1 and db.earnings == {1: Decimal('250.00')}
+    assert db.artworks[1]['status'] == 'sold'
+    assert engine.stats()['completed'] == 1 and engine.stats()['unavailable'] == BUYERS - 1
+    print(f"{BUYERS} concurrent buyers: 1 sale, {BUYERS - 1} turned away in {elapsed * 1000:.0f}ms")
+
+
+def test_retried_requests_with_one_key_replay_the_sale():
+    db = FakeDatabase({1: {'created_by': 1, 'status': 'available'}, 2: {'created_by': 1, 'status': 'available'}})
+    engine = purchase.PurchaseEngine()
+    results = stampede(db, engine, [7] * 50, key='order-42')
+
+    assert len(db.transactions) == 1
+    assert {r['transaction_id'] for r in results} == {db.transactions[0]['id']}
+    assert sum(not r['replayed'] for r in results) == 1
+    assert db.earnings == {1: Decimal('250.00')}
+
+    # A retry whose JSON sends the id as a string ("1") still replays, as create_transaction converts it
+    replay = engine.buy(db.connect(), 7, purchase.artwork_id('1'), Decimal('250.00'), key='order-42')
+    assert replay['replayed'] and replay['transaction_id'] == db.transactions[0]['id']
+    for bad in ('abc', None, True, 1.5j):
+        try:
+            purchase.artwork_id(bad)
+            assert False, 'expected PurchaseRejected'
+        except purchase.PurchaseRejected as e:
+            assert e.status == 400
+
+    # The same key can't buy a second piece; the claim on it is rolled back
+    try:
+        engine.buy(db.connect(), 7, 2, Decimal('10.00'), key='order-42')
+        assert False, 'expected PurchaseRejected'
+    except purchase.PurchaseRejected as e:
+        assert e.status == 422
+    assert db.artworks[2]['status'] == 'available' and len(db.transactions) == 1
+
+
+def test_deadlock_victims_retry_with_backoff():
+    db = FakeDatabase({1: {'created_by': 1, 'status': 'available'}}, deadlocks=3)
+    engine = purchase.PurchaseEngine(retries=4, backoff=0.001)
+    results = stampede(db, engine, range(2, 52))
+
+    assert sum(isinstance(r, dict) for r in results) == 1 and len(db.transactions) == 1
+    assert results.count(404) == 49
+    assert db.earnings == {1: Decimal('250.00')}
+    assert engine.stats()['deadlock_retries'] == 3 and engine.stats()['gave_up'] == 0
+
+    # Out of retries: the error surfaces and nothing is left behind
+    db = FakeDatabase({1: {'created_by': 1, 'status': 'available'}}, deadlocks=10)
+    engine = purchase.PurchaseEngine(retries=2, backoff=0.001)
+    try:
+        engine.buy(db.connect(), 2, 1, Decimal('250.00'))
+        assert False, 'expected a deadlock error'
+    except DatabaseError as e:
+        assert e.errno == purchase.ER_LOCK_DEADLOCK
+    assert db.artworks[1]['status'] == 'available' and not db.transactions
+    assert engine.stats()['gave_up'] == 1
+
+
+def test_own_and_missing_artworks_are_rejected():
+    db = FakeDatabase({1: {'created_by': 1, 'status': 'available'}})
+    engine = purchase.PurchaseEngine()
+    for buyer_id, artwork_id, status in ((1, 1, 400), (2, 99, 404)):
+        try:
+            engine.buy(db.connect(), buyer_id, artwork_id, Decimal('1.00'))
+            assert False, 'expected PurchaseRejected'
+        except purchase.PurchaseRejected as e:
+            assert e.status == status
+    try:
+        purchase.idempotency_key('x' * 65)
+        assert False, 'expected PurchaseRejected'
+    except purchase.PurchaseRejected as e:
+        assert e.status == 400
+    assert purchase.idempotency_key('  ') is None
+
+
+if __name__ == '__main__':
+    print("=== Purchase Tests ===\n")
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"{name}: ok")
+    print("\n=== Test Complete ===")
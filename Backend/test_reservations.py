@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for checkout holds (reservations.py) and how purchases honour them,
+on the row-locking stand-in for InnoDB from test_purchase.py
+"""
+
+import time
+from decimal import Decimal
+
+import purchase
+import reservations
+from test_purchase import BUYERS, FakeDatabase, stampede
+
+
+class HoldingEngine:
+    """stampede() driver that reserves instead of buying"""
+
+    def __init__(self, holds):
+        self.holds = holds
+
+    def buy(self, conn, buyer_id, artwork_id, amount, key=None):
+        cursor = conn.cursor()
+        try:
+            artwork = self.holds.reserve(cursor, artwork_id, buyer_id)
+            conn.commit()
+            return artwork
+        except reservations.ReservationRejected as e:
+            conn.rollback()
+            raise purchase.PurchaseRejected(str(e), e.status)
+
+
+def hold(db, holds, artwork_id, user_id):
+    conn = db.connect()
+    try:
+        artwork = holds.reserve(conn.cursor(), artwork_id, user_id)
+    except reservations.ReservationRejected:
+        conn.rollback()
+        raise
+    conn.commit()
+    return artwork
+
+
+def test_one_hold_per_contested_artwork():
+    db = FakeDatabase({1: {'created_by': 1, 'status': 'available'}})
+    holds = reservations.Reservations(hold_seconds=600)
+    results = stampede(db, HoldingEngine(holds), range(2, BUYERS + 2))
+
+    winners = [r for r in results if isinstance(r, dict)]
+    assert len(winners) == 1 and results.count(409) == BUYERS - 1
+    artwork = db.artworks[1]
+    assert artwork['status'] == 'reserved' and artwork['reserved_by'] == winners[0]['reserved_by']
+    assert holds.stats()['reserved'] == 1 and holds.stats()['rejected'] == BUYERS - 1
+
+    # Only the holder can buy; everyone else is told it's held
+    engine = purchase.PurchaseEngine()
+    holder = artwork['reserved_by']
+    other = 2 if holder != 2 else 3
+    try:
+        engine.buy(db.connect(), other, 1, Decimal('250.00'))
+        assert False, 'expected PurchaseRejected'
+    except purchase.PurchaseRejected as e:
+        assert e.status == 409
+    engine.buy(db.connect(), holder, 1, Decimal('250.00'))
+    assert artwork['status'] == 'sold' and artwork['reserved_by'] is None
+    assert len(db.transactions) == 1
+
+
+def test_renew_release_and_rejections():
+    db = FakeDatabase({1: {'created_by': 1, 'status': 'available'}, 2: {'created_by': 1, 'status': 'sold'}})
+    holds = reservations.Reservations(hold_seconds=60)
+    first = hold(db, holds, 1, 5)['reserved_until']
+    time.sleep(0.01)
+    assert hold(db, holds, 1, 5)['reserved_until'] > first
+    assert holds.stats()['reserved'] == 2
+
+    for artwork_id, user_id, status in ((1, 1, 400), (2, 5, 404), (99, 5, 404)):
+        try:
+            hold(db, holds, artwork_id, user_id)
+            assert False, 'expected ReservationRejected'
+        except reservations.ReservationRejected as e:
+            assert e.status == status
+
+    conn = db.connect()
+    assert not holds.release(conn.cursor(), 1, 6)  # not theirs
+    assert holds.release(conn.cursor(), 1, 5)
+    conn.commit()
+    assert db.artworks[1] == {'created_by': 1, 'status': 'available', 'reserved_by': None, 'reserved_until': None}
+
+
+def test_lapsed_holds_are_swept_in_batches():
+    now = time.time()
+    artworks = {i: {'created_by': i % 3, 'status': 'reserved', 'reserved_by': 9, 'reserved_until': now - i}
+                for i in range(1, 8)}
+    artworks[8] = {'created_by': 1, 'status': 'reserved', 'reserved_by': 9, 'reserved_until': now + 600}
+    artworks[9] = {'created_by': 1, 'status': 'reserved', 'reserved_by': None, 'reserved_until': None}
+    db = FakeDatabase(artworks)
+    holds = reservations.Reservations(batch_size=3)
+
+    # A lapsed hold is fair game for anyone, even before the sweep
+    hold(db, holds, 7, 4)
+    assert holds.sweep(db.connect()) == {1, 2, 0}
+    assert [i for i, a in db.artworks.items() if a['status'] == 'available'] == [1, 2, 3, 4, 5, 6]
+    assert db.artworks[7]['reserved_by'] == 4
+    assert db.artworks[8]['status'] == db.artworks[9]['status'] == 'reserved'
+    assert holds.stats()['expired'] == 6
+    assert holds.sweep(db.connect()) == set()
+
+
+def test_sweeper_thread_reports_owners():
+    db = FakeDatabase({1: {'created_by': 3, 'status': 'reserved', 'reserved_by': 9,
+                           'reserved_until': time.time() - 1}})
+    holds = reservations.Reservations(sweep_interval=0.01)
+    reported = []
+    assert reservations.Reservations(sweep_interval=0).start_sweeper(db.connect) is None
+    holds.start_sweeper(db.connect, on_expired=reported.append)
+    deadline = time.time() + 2
+    while not reported and time.time() < deadline:
+        time.sleep(0.01)
+    assert reported == [{3}] and db.artworks[1]['status'] == 'available'
+
+
+if __name__ == '__main__':
+    print("=== Reservation Tests ===\n")
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"{name}: ok")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Route tests for server.py through the Flask test client, with
+get_db_connection() handing out fake connections: status codes and error
+mapping, dashboard caching, ETag revalidation, purchases and the 429 from
+a full bcrypt pool
+"""
+
+import json
+import os
+
+import pytest
+from mysql.connector import errors as db_errors
+
+os.environ.setdefault('BACKGROUND_TASKS', 'post_fork')  # no typeahead or sweeper threads against MySQL
+import server
+from cache import MemoryBackend, ResultCache, SharedGenerations
+from passwords import PasswordHasher
+
+USER_ID = 7
+SELLER_ID = 3
+
+
+class FakeConnection:
+    """Pooled connection stand-in with one cursor"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = self.rollbacks = 0
+        self.invalidated = self.closed = False
+
+    def cursor(self, **kwargs):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def invalidate(self):
+        self.invalidated = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def db(monkeypatch, fake_cursor):
+    """Answers every checked-out connection's statements with db.respond(cursor, sql, params)"""
+    class DB:
+        connections = []
+
+        @staticmethod
+        def respond(cursor, sql, params):
+            return []
+
+    def get_db_connection(readonly=False):
+        cursor = fake_cursor(respond=lambda sql, params: DB.respond(cursor, sql, params))
+        DB.connections.append(FakeConnection(cursor))
+        return DB.connections[-1]
+
+    monkeypatch.setattr(server, 'get_db_connection', get_db_connection)
+    monkeypatch.setattr(server, 'stats_cache', ResultCache(MemoryBackend(), endpoints=server.STATS_ENDPOINTS,
+                                                           generations=SharedGenerations(slots=64)))
+    return DB
+
+
+@pytest.fixture
+def client():
+    client = server.app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + server.auth.create_token(USER_ID, 'user')
+    return client
+
+
+def lost_connection(cursor, sql, params):
+    raise db_errors.OperationalError('Lost connection to MySQL server during query')
+
+
+def test_dashboard_is_cached_until_the_user_writes(client, db):
+    def respond(cursor, sql, params):
+        cursor.lastrowid = 11
+        return []
+
+    db.respond = respond
+    first = client.get('/dashboard/stats')
+    assert first.status_code == 200 and first.json['total_artworks'] == 0
+    assert client.get('/dashboard/stats').json == first.json and len(db.connections) == 1
+
+    assert client.post('/categories', json={'name': 'Oils'}).status_code == 201
+    assert db.connections[1].commits == 1
+    client.get('/dashboard/stats')
+    assert len(db.connections) == 3  # the write dropped the cached dashboard
+
+
+def test_database_errors_are_500s(client, db):
+    db.respond = lost_connection
+    for path in ('/dashboard/stats', '/dashboard/artist-stats', '/dashboard/stats/test'):
+        response = client.get(path)
+        assert response.status_code == 500 and 'Lost connection' in response.json['error'], path
+
+    # A stream that fails before its first chunk hands back a connection that may hold unread rows
+    response = client.get('/artworks?stream=1')
+    assert response.status_code == 500 and 'Lost connection' in response.json['error']
+    assert db.connections[-1].invalidated and db.connections[-1].closed
+    assert client.get('/dashboard/stats', headers={'Authorization': 'Bearer nope'}).status_code == 401
+
+
+def test_catalogue_revalidates_to_304_until_a_write(client, db):
+    def respond(cursor, sql, params):
+        cursor.lastrowid = 12
+        cursor.column_names = ('id', 'name')
+        return [(1, 'Oils')] if sql.startswith('SELECT') else []
+
+    db.respond = respond
+    first = client.get('/categories')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.json == {'categories': [{'id': 1, 'name': 'Oils'}]}
+
+    cached = client.get('/categories', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b'' and cached.headers['ETag'] == etag
+    assert len(db.connections) == 1  # answered before the view ran
+
+    client.post('/categories', json={'name': 'Prints'})
+    changed = client.get('/categories', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+
+def test_marketplace_search_and_listing(client, db):
+    db.respond = lambda cursor, sql, params: [('total', None, None, 0)]
+    response = client.get('/marketplace/search?q=lake&fields=id,title')
+    assert response.status_code == 200
+    assert response.json['total'] == 0 and response.json['artworks'] == []
+    assert f'created_by != {USER_ID}' in db.connections[-1].cursor().statements[0]
+
+    assert client.get('/marketplace/search?q=lake&cursor=not-a-cursor').status_code == 400
+    assert client.get('/marketplace/available?limit=abc').status_code == 400
+    db.respond = lost_connection
+    assert client.get('/marketplace/available').status_code == 500
+    assert client.get('/marketplace/search?q=lake').status_code == 500
+
+
+def test_import_answers_400_for_the_body_and_500_for_the_database(client, db):
+    response = client.post('/artworks/import', data='title\nA\n', content_type='application/pdf')
+    assert response.status_code == 400 and not db.connections
+
+    response = client.post('/artworks/import', data=b'title\nCaf\xe9\n', content_type='text/csv')
+    assert response.status_code == 400 and response.json['error'].startswith('Unreadable csv body')
+    assert not db.connections[-1].invalidated and db.connections[-1].closed
+
+    db.respond = lost_connection
+    response = client.post('/artworks/import', data='title,category\nA,Oils\n', content_type='text/csv')
+    assert response.status_code == 500 and response.json['error'].startswith('Import stopped')
+    assert db.connections[-1].invalidated and db.connections[-1].closed
+
+
+def test_export_streams_ndjson_and_returns_the_connection(client, db):
+    portfolios = [(n, f'Show {n}', None, None, 'exhibition', None, None) for n in (1, 2)]
+    db.respond = lambda cursor, sql, params: [row for row in portfolios if row[0] > params[1]]
+    response = client.get('/export?sections=portfolios')
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    assert [line['title'] for line in lines if line['type'] == 'portfolio'] == ['Show 1', 'Show 2']
+    assert lines[-1] == {'type': 'end', 'rows': 2}
+    assert db.connections[-1].closed and not db.connections[-1].invalidated
+
+    assert client.get('/export?format=xml').status_code == 400
+
+
+def test_purchase_claims_commits_and_maps_rejections(client, db):
+    def respond(cursor, sql, params):
+        if sql.startswith("UPDATE artworks SET status = 'sold'"):
+            cursor.rowcount = 1 if params[0] == 5 else 0
+        elif sql.startswith('SELECT created_by FROM artworks'):
+            return [(SELLER_ID,)]
+        elif sql.startswith('INSERT INTO transactions'):
+            cursor.lastrowid = 99
+        elif sql.startswith('SELECT created_by, status'):
+            return [(SELLER_ID, 'reserved', 4, None, 1)]  # artwork 6: held by buyer 4
+        return []
+
+    db.respond = respond
+    server.stats_cache.set('dashboard/stats', SELLER_ID, {'total_earnings': 0})
+    response = client.post('/transactions', json={'artwork_id': '5', 'amount': 250})
+    assert response.status_code == 201 and response.json['transaction_id'] == 99
+    assert db.connections[-1].commits == 1 and db.connections[-1].closed
+    assert server.stats_cache.get('dashboard/stats', SELLER_ID) is None  # the sale changed their earnings
+
+    response = client.post('/transactions', json={'artwork_id': 6, 'amount': 250})
+    assert response.status_code == 409 and response.json['error'] == 'Artwork is reserved by another buyer'
+    assert db.connections[-1].rollbacks == 1
+    assert client.post('/transactions', json={'artwork_id': 'x', 'amount': 250}).status_code == 400
+
+    db.respond = lost_connection
+    response = client.post('/transactions', json={'artwork_id': 5, 'amount': 250})
+    assert response.status_code == 500 and db.connections[-1].rollbacks == 1
+
+
+def test_full_password_pool_answers_429(client, db, monkeypatch):
+    busy = PasswordHasher(workers=1, max_pending=1)
+    busy._slots.acquire()  # the one slot is taken by a hash still running
+    monkeypatch.setattr(server, 'passwords', busy)
+    db.respond = lambda cursor, sql, params: [{'id': USER_ID, 'name': 'Ana', 'email': 'ana@example.com',
+                                               'password_hash': '$2b$12$' + 'x' * 53, 'role': 'user'}]
+    signup = client.post('/signup', json={'name': 'Ana', 'email': 'ana@example.com',
+                                          'password': 'secret', 'role': 'user'})
+    login = client.post('/login', json={'email': 'ana@example.com', 'password': 'secret'})
+    for response in (signup, login):
+        assert response.status_code == 429 and int(response.headers['Retry-After']) >= 1
+    assert busy.stats()['rejected_busy'] == 2
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tests for ?stream=1 list responses: batches read from the cursor must produce
+the same body (and next_cursor) as the buffered page
+"""
+
+import dataclasses
+import json
+from datetime import datetime, timedelta
+
+from flask import Flask, Response, stream_with_context
+
+from db_pool import ConnectionPool
+from pagination import Page, decode_cursor
+from streaming import json_chunks, release_on_close
+
+FIELDS = {'id': 'id', 'title': 'title', 'created_at': 'created_at'}
+START = datetime(2024, 1, 1)
+
+
+def make_rows(count):
+    return [{'id': count - i, 'title': f'art {count - i}', 'created_at': START - timedelta(hours=i)}
+            for i in range(count)]
+
+
+def as_selected(page, rows):
+    """Tuples in the page's SELECT order, as a plain cursor returns them"""
+    return [tuple(row[name] for name in page.selected) for row in rows]
+
+
+class FakeCursor:
+    """Unbuffered cursor stand-in that records how it was read"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetches = 0
+        self.closed = False
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        self.fetches += 1
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.invalidated = False
+        self.closed = False
+
+    def invalidate(self):
+        self.invalidated = True
+
+    def close(self):
+        self.closed = True
+
+
+def dumps(value):
+    return json.dumps(value, default=lambda o: dataclasses.asdict(o) if dataclasses.is_dataclass(o) else str(o))
+
+
+def stream(args, rows, batch_size=3):
+    page = Page(args, FIELDS)
+    cursor, conn = FakeCursor(as_selected(page, rows[:page.fetch_size])), FakeConnection()
+    body = ''.join(json_chunks('items', conn, cursor, page, dumps=dumps, batch_size=batch_size))
+    return json.loads(body), cursor, conn
+
+
+def test_streams_every_row_without_limit():
+    body, cursor, conn = stream({'stream': '1'}, make_rows(10))
+    assert [row['id'] for row in body['items']] == list(range(10, 0, -1))
+    assert body['next_cursor'] is None
+    assert cursor.fetches == 5  # four batches of at most 3, then the empty read
+    assert cursor.closed and conn.closed and not conn.invalidated
+
+
+def test_limit_matches_buffered_page():
+    rows = make_rows(10)
+    for limit in ('1', '3', '4', '9', '10', '25'):
+        page = Page({'limit': limit}, FIELDS)
+        expected, expected_cursor = page.finish(as_selected(page, rows[:page.fetch_size]))
+        body, _, _ = stream({'stream': '1', 'limit': limit}, rows)
+        assert [row['id'] for row in body['items']] == [row.id for row in expected], limit
+        assert body['next_cursor'] == expected_cursor, limit
+
+
+def test_hidden_sort_columns_are_dropped():
+    body, _, _ = stream({'stream': '1', 'limit': '4', 'fields': 'title'}, make_rows(10))
+    assert body['items'][0] == {'title': 'art 10'}
+    assert decode_cursor(body['next_cursor'])[1] == 7
+
+
+def test_abandoned_stream_discards_connection():
+    page = Page({'stream': '1'}, FIELDS)
+    cursor, conn = FakeCursor(as_selected(page, make_rows(10))), FakeConnection()
+    chunks = json_chunks('items', conn, cursor, page, dumps=dumps, batch_size=3)
+    next(chunks)
+    next(chunks)
+    chunks.close()  # client went away
+    assert conn.invalidated and conn.closed
+
+
+class RawConnection:
+    """What the pool hands out: a connection whose cursor serves 10 rows"""
+
+    def __init__(self, page):
+        self.page = page
+
+    def cursor(self, buffered=True):
+        return FakeCursor(as_selected(self.page, make_rows(10)))
+
+    def ping(self, reconnect=False):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_unstarted_stream_returns_its_connection():
+    """HEAD (or a client gone before the first chunk) never runs the body"""
+    page = Page({'stream': '1'}, FIELDS)
+    pool = ConnectionPool(lambda: RawConnection(page), size=1, max_overflow=0, timeout=0.1)
+    app = Flask(__name__)
+
+    @app.route('/items')
+    def items():
+        conn = pool.connection()
+        body = json_chunks('items', conn, conn.cursor(buffered=False), page, dumps=dumps)
+        return release_on_close(Response(stream_with_context(body), mimetype='application/json'), conn)
+
+    client = app.test_client()
+    for _ in range(3):  # the pool has one slot, so a leak would time out here
+        response = client.head('/items')
+        response.close()  # as the WSGI server does once it has sent the headers
+        assert response.status_code == 200 and pool.status()['in_use'] == 0
+    assert pool.status()['opened'] == 0  # unread rows: discarded, not pooled
+
+    assert len(json.loads(client.get('/items').data)['items']) == 10
+    status = pool.status()
+    assert status['in_use'] == 0 and status['idle'] == 1  # a finished stream goes back to the pool
+
+
+if __name__ == '__main__':
+    for test in (test_streams_every_row_without_limit, test_limit_matches_buffered_page,
+                 test_hidden_sort_columns_are_dropped, test_abandoned_stream_discards_connection,
+                 test_unstarted_stream_returns_its_connection):
+        test()
+        print(f"{test.__name__}: ok")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for token verification in auth.py: the verified-token LRU, revocation
+shared between forked workers, and the session fallback.
+(test_auth.py exercises the live HTTP endpoints instead.)
+"""
+
+import hashlib
+import os
+import time
+
+import jwt
+from flask import Flask, g, jsonify, session
+
+from auth import Authenticator, SharedRevocations, VerifiedTokenCache
+
+SECRET = 'test-secret-of-at-least-32-bytes!!'
+
+
+def digest(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+def make_app(authenticator):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+
+    @app.route('/login-session')
+    def login_session():
+        session['user_id'], session['role'] = 5, 'artist'
+        return '', 204
+
+    @app.route('/me')
+    @authenticator.require_auth
+    def me():
+        return jsonify({'user_id': g.user_id, 'role': g.user_role})
+
+    return app
+
+
+def test_cache_drops_expired_and_least_recent_tokens():
+    cache = VerifiedTokenCache(max_entries=2)
+    now = time.time()
+    cache.put(b'a', {'user_id': 1, 'exp': now + 60})
+    cache.put(b'b', {'user_id': 2, 'exp': now + 60})
+    assert cache.get(b'a')['user_id'] == 1  # a is now the most recent
+    cache.put(b'c', {'user_id': 3, 'exp': now + 60})
+    assert cache.get(b'b') is None and len(cache) == 2
+
+    cache.put(b'd', {'user_id': 4, 'exp': now - 1})
+    assert cache.get(b'd') is None and len(cache) == 1  # dropped on read
+    cache.put(b'e', {'user_id': 5})  # no exp: never cached rather than a KeyError later
+    assert cache.get(b'e') is None
+
+
+def test_repeat_verifications_hit_the_cache():
+    authenticator = Authenticator(SECRET)
+    token = authenticator.create_token(7, 'user')
+    assert authenticator.verify_token(token)['user_id'] == 7
+    assert authenticator.verify_token(token)['user_id'] == 7
+    stats = authenticator.stats()
+    assert stats['cache_misses'] == 1 and stats['cache_hits'] == 1
+
+    expired = jwt.encode({'user_id': 7, 'role': 'user', 'exp': int(time.time()) - 1}, SECRET, algorithm='HS256')
+    forged = jwt.encode({'user_id': 7, 'role': 'user', 'exp': int(time.time()) + 60}, 'another-secret-of-at-least-32-bytes', algorithm='HS256')
+    assert authenticator.verify_token(expired) is None and authenticator.verify_token(forged) is None
+    assert authenticator.stats()['rejected'] == 2
+
+    # Signed by us but without exp: verified, just not cached
+    no_exp = jwt.encode({'user_id': 8, 'role': 'user'}, SECRET, algorithm='HS256')
+    assert authenticator.verify_token(no_exp)['user_id'] == 8
+    assert authenticator.verified.get(digest(no_exp)) is None
+
+
+def test_revocation_reaches_every_forked_worker():
+    authenticator = Authenticator(SECRET, denylist_backend=SharedRevocations(slots=64))
+    token = authenticator.create_token(7, 'user')
+    assert authenticator.verify_token(token) is not None  # cached before the revocation
+
+    pid = os.fork()
+    if pid == 0:  # another worker handles the logout
+        authenticator.revoke(token)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert authenticator.verify_token(token) is None
+    assert authenticator.stats()['revoked'] == 1
+
+
+def test_shared_revocations_expire_and_reuse_slots():
+    revocations = SharedRevocations(slots=4, probes=4)
+    for i in range(4):
+        revocations.set(f'revoked:{i}', 1, 0.05)
+    assert all(revocations.get(f'revoked:{i}') for i in range(4))
+    time.sleep(0.06)
+    assert revocations.get('revoked:0') is None
+    revocations.set('revoked:new', 1, 60)  # reuses an expired slot
+    assert revocations.get('revoked:new') and revocations.get('revoked:missing') is None
+
+
+def test_session_is_the_fallback_for_a_missing_or_bad_token():
+    authenticator = Authenticator(SECRET)
+    client = make_app(authenticator).test_client()
+    assert client.get('/me').status_code == 401
+
+    token = authenticator.create_token(7, 'user')
+    assert client.get('/me', headers={'Authorization': f'Bearer {token}'}).json == {'user_id': 7, 'role': 'user'}
+
+    client.get('/login-session')
+    assert client.get('/me').json == {'user_id': 5, 'role': 'artist'}
+    # The token wins when both are valid; a revoked one falls back to the session
+    assert client.get('/me', headers={'Authorization': f'Bearer {token}'}).json['user_id'] == 7
+    authenticator.revoke(token)
+    assert client.get('/me', headers={'Authorization': f'Bearer {token}'}).json['user_id'] == 5
+
+
+if __name__ == '__main__':
+    print("=== Token Cache Tests ===\n")
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"{name}: ok")
+    print("\n=== Test Complete ===")
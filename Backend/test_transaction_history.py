@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the transaction history query (transaction_history.py): param
+order across the buyer and seller branches, and paging through a fake
+cursor that runs the two branches the way MySQL would
+"""
+
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+import transaction_history
+from pagination import encode_cursor
+
+USER_ID = 7
+START = datetime(2026, 5, 1, 9, 0)
+
+
+def transaction(id, buyer_id, seller_id, minutes):
+    return {'id': id, 'buyer_id': buyer_id, 'seller_id': seller_id, 'amount': id * 10,
+            'transaction_date': START + timedelta(minutes=minutes)}
+
+
+# Bought and sold by USER_ID, interleaved, with tied dates, plus other users' sales
+TRANSACTIONS = [
+    transaction(1, 7, 2, 0), transaction(2, 3, 7, 5), transaction(3, 7, 4, 5),
+    transaction(4, 3, 7, 5), transaction(5, 7, 7, 10), transaction(6, 3, 4, 12),
+    transaction(7, 3, 7, 15), transaction(8, 7, 2, 20), transaction(9, 2, 3, 25),
+]
+
+
+def run_history(sql, params):
+    """The bound history statement, evaluated over TRANSACTIONS"""
+    buyer = int(re.search(r'WHERE t\.buyer_id = (\d+) AND', sql).group(1))
+    seller, not_buyer = map(int, re.search(r't\.seller_id = (\d+) AND t\.buyer_id != (\d+)', sql).groups())
+    limits = [int(n) for n in re.findall(r'LIMIT (\d+)', sql)]
+    after = re.search(r"t\.transaction_date < '([^']+)' OR \(t\.transaction_date = '[^']+' AND t\.id < (\d+)\)", sql)
+
+    def side(matches, limit):
+        rows = [t for t in TRANSACTIONS if matches(t)]
+        if after:
+            key = (datetime.fromisoformat(after.group(1)), int(after.group(2)))
+            rows = [t for t in rows if (t['transaction_date'], t['id']) < key]
+        return sorted(rows, key=lambda t: (t['transaction_date'], t['id']), reverse=True)[:limit]
+
+    merged = (side(lambda t: t['buyer_id'] == buyer, limits[0])
+              + side(lambda t: t['seller_id'] == seller and t['buyer_id'] != not_buyer, limits[1]))
+    merged.sort(key=lambda t: (t['transaction_date'], t['id']), reverse=True)
+    columns = re.findall(r' AS (\w+)', sql.split(' FROM ')[0])
+    you = int(re.search(r'IF\(t\.buyer_id = (\d+)', sql).group(1))
+    return [tuple('You' if c == 'buyer_name' and t['buyer_id'] == you else t.get(c, 'someone')
+                  for c in columns) for t in merged[:limits[2]]]
+
+
+def test_params_follow_both_branches(fake_cursor):
+    cursor = fake_cursor()
+    page = transaction_history.page_for({'limit': '2', 'fields': 'id,buyer_name,seller_name',
+                                         'cursor': encode_cursor(START + timedelta(minutes=5), 4)})
+    cursor.execute(*transaction_history.history_query(USER_ID, page))
+    sql = cursor.statements[-1]
+    keyset = "(t.transaction_date < '2026-05-01 09:05:00' OR (t.transaction_date = '2026-05-01 09:05:00' AND t.id < 4))"
+    assert "IF(t.buyer_id = 7, 'You', u1.name) AS buyer_name, IF(t.seller_id = 7, 'You', u2.name) AS seller_name" in sql
+    assert f'WHERE t.buyer_id = 7 AND {keyset} ORDER BY t.transaction_date DESC, t.id DESC LIMIT 3)' in sql
+    assert f'WHERE t.seller_id = 7 AND t.buyer_id != 7 AND {keyset} ORDER BY t.transaction_date DESC, t.id DESC LIMIT 3)' in sql
+    assert sql.endswith('ORDER BY t.transaction_date DESC, t.id DESC LIMIT 3')
+
+    # Without a cursor or the name fields there are no keyset or IF() params to shift the rest
+    cursor.execute(*transaction_history.history_query(USER_ID, transaction_history.page_for({'fields': 'id'})))
+    sql = cursor.statements[-1]
+    assert 'WHERE t.buyer_id = 7 AND 1 = 1' in sql and 't.seller_id = 7 AND t.buyer_id != 7 AND 1 = 1' in sql
+    assert sql.count('LIMIT 51') == 3
+
+
+def test_pages_continue_without_gaps_or_repeats(fake_cursor):
+    cursor = fake_cursor(respond=run_history)
+    args = {'limit': '2', 'fields': 'id,buyer_name'}
+    ids, names = [], {}
+    while True:
+        rows, next_cursor = transaction_history.fetch_page(cursor, USER_ID, transaction_history.page_for(args))
+        ids += [row.id for row in rows]
+        names.update((row.id, row.buyer_name) for row in rows)
+        if next_cursor is None:
+            break
+        args = dict(args, cursor=next_cursor)
+
+    # The self-sale (5) matches both branches but is listed once; other users' sales (6, 9) never
+    assert ids == [8, 7, 5, 4, 3, 2, 1]
+    assert len(cursor.statements) == 4
+    assert names[8] == names[5] == 'You' and names[7] == 'someone'
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process typeahead index behind GET /typeahead
+"""
+
+from typeahead import TypeaheadIndex
+
+ENTRIES = [
+    ('artwork', 1, 'Starry Night'),
+    ('artwork', 2, 'Night Watch'),
+    ('artwork', 3, 'Water Lilies'),
+    ('artist', 1, 'Vincent van Gogh'),
+    ('artist', 2, 'Rembrandt van Rijn'),
+    ('category', 1, 'Night Scenes'),
+]
+
+
+def labels(results):
+    return [r['label'] for r in results]
+
+
+def test_prefix_search_in_label_order():
+    index = TypeaheadIndex()
+    index.rebuild(ENTRIES)
+    assert labels(index.search('nig')) == ['Night Scenes', 'Night Watch', 'Starry Night']
+    assert labels(index.search('night w')) == ['Night Watch']
+    assert labels(index.search('van', kinds=('artist',))) == ['Rembrandt van Rijn', 'Vincent van Gogh']
+    assert labels(index.search('rembrandt')) == ['Rembrandt van Rijn']  # longer than the indexed key
+    assert labels(index.search('nig', limit=1)) == ['Night Scenes']
+    assert index.search('xyz') == [] and index.search('  ') == []
+
+
+def test_incremental_add_update_and_remove():
+    index = TypeaheadIndex()
+    index.rebuild(ENTRIES)
+    index.add('artwork', 4, 'Nighthawks')
+    index.add('artwork', 2, 'The Night Watch')  # renamed
+    index.remove('category', 1)
+    # Writes go after the loaded entries until the next rebuild re-sorts them
+    assert labels(index.search('night')) == ['Starry Night', 'Nighthawks', 'The Night Watch']
+    assert labels(index.search('watch')) == ['The Night Watch']
+    assert index.stats()['entries'] == 6
+
+
+def test_writes_during_rebuild_are_kept():
+    index = TypeaheadIndex()
+
+    def load():
+        index.add('artwork', 9, 'Sunflowers')  # a request that commits while the load runs
+        yield from ENTRIES
+
+    index.rebuild(load())
+    assert labels(index.search('sun')) == ['Sunflowers']
+    assert index.loaded
+
+
+if __name__ == '__main__':
+    for test in (test_prefix_search_in_label_order, test_incremental_add_update_and_remove,
+                 test_writes_during_rebuild_are_kept):
+        test()
+        print(f"{test.__name__}: ok")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the user_stats rollup counters (user_stats.py): the delta
+upsert, applied by a fake cursor the way ON DUPLICATE KEY UPDATE would,
+and the reconcile statement
+"""
+
+import re
+from decimal import Decimal
+
+import pytest
+
+import user_stats
+
+
+def stats_table(fake_cursor):
+    """Cursor applying user_stats upserts to cursor.table, {user_id: {counter: value}}"""
+    def respond(sql, params):
+        upsert = re.fullmatch(r'INSERT INTO user_stats \(user_id, (.+?)\) VALUES \(.+?\) '
+                              r'ON DUPLICATE KEY UPDATE (.+)', sql)
+        if upsert is None:
+            return []
+        columns = upsert.group(1).split(', ')
+        # Every column must add to the stored counter, not overwrite it
+        assert upsert.group(2).split(', ') == [f'{c} = {c} + VALUES({c})' for c in columns]
+        user_id, *deltas = params
+        row = cursor.table.setdefault(user_id, {c: 0 for c in user_stats.COUNTERS})
+        for column, delta in zip(columns, deltas):
+            row[column] += delta
+        return []
+
+    cursor = fake_cursor(respond=respond)
+    cursor.table = {}
+    return cursor
+
+
+def test_deltas_create_then_add_to_the_row(fake_cursor):
+    cursor = stats_table(fake_cursor)
+    user_stats.apply_delta(cursor, 3, artwork_count=1, total_value=user_stats.as_amount('120.50'))
+    user_stats.apply_delta(cursor, 3, artwork_count=1, total_value=user_stats.as_amount(79.5))
+    user_stats.apply_delta(cursor, 3, sales_count=1, total_earnings=Decimal('250.00'))
+    # Deleting an artwork with a sale takes everything back out
+    user_stats.apply_delta(cursor, 3, artwork_count=-1, total_value=-Decimal('120.50'),
+                           sales_count=-1, total_earnings=-Decimal('250.00'))
+    assert cursor.table[3] == {'category_count': 0, 'artist_count': 0, 'artwork_count': 1,
+                               'total_value': Decimal('79.5'), 'sales_count': 0, 'total_earnings': 0}
+    assert cursor.statements[0] == (
+        'INSERT INTO user_stats (user_id, artwork_count, total_value) VALUES (3, 1, 120.50) '
+        'ON DUPLICATE KEY UPDATE artwork_count = artwork_count + VALUES(artwork_count), '
+        'total_value = total_value + VALUES(total_value)')
+
+
+def test_empty_deltas_and_bad_counters(fake_cursor):
+    cursor = stats_table(fake_cursor)
+    user_stats.apply_delta(cursor, 3, artwork_count=0, total_value=Decimal('0.00'))
+    user_stats.apply_delta(cursor, None, artwork_count=1)
+    assert cursor.statements == []
+
+    # A zero delta is left out of the statement rather than sent as "+ 0"
+    user_stats.apply_delta(cursor, 3, category_count=1, artist_count=0)
+    assert 'VALUES (3, 1)' in cursor.statements[0] and 'artist_count' not in cursor.statements[0]
+    with pytest.raises(ValueError, match='price'):
+        user_stats.apply_delta(cursor, 3, price=1)
+
+    assert user_stats.as_amount(None) == user_stats.as_amount('') == Decimal(0)
+    assert user_stats.as_amount(0.1) == Decimal('0.1')  # via str, so no binary float noise
+
+
+def test_reconcile_one_user_or_everyone(fake_cursor):
+    cursor = fake_cursor()
+    user_stats.reconcile(cursor, 3)
+    user_stats.reconcile(cursor)
+    one, everyone = cursor.statements
+    assert 'FROM users u WHERE u.id = 3 ON DUPLICATE KEY UPDATE' in one
+    assert 'FROM users u ON DUPLICATE KEY UPDATE' in everyone
+    # Reconciling overwrites the counters, so it is safe to repeat
+    for counter in user_stats.COUNTERS:
+        assert f'{counter} = VALUES({counter})' in one
+    # Earnings count only completed sales, like the purchase path's deltas
+    assert one.count("t.status = 'completed'") == 2
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,71 @@
+"""
+Paginated transaction history for one user, as buyer or seller.
+
+`WHERE buyer_id = ? OR seller_id = ?` cannot be served in date order by
+either single-column index, so MySQL reads both sides in full and
+filesorts. Instead each side walks its own (user, transaction_date, id)
+index for at most one page, the two short runs are merged by the outer
+ORDER BY, and only the winning page of ids is joined to artworks/users.
+"""
+
+from pagination import Page
+
+FIELDS = {
+    'id': 't.id',
+    'buyer_id': 't.buyer_id',
+    'seller_id': 't.seller_id',
+    'artwork_id': 't.artwork_id',
+    'amount': 't.amount',
+    'transaction_date': 't.transaction_date',
+    'status': 't.status',
+    'payment_method': 't.payment_method',
+    'notes': 't.notes',
+    'artwork_title': 'a.title',
+    # The requesting user's own side reads 'You'; %s is their id
+    'buyer_name': "IF(t.buyer_id = %s, 'You', u1.name)",
+    'seller_name': "IF(t.seller_id = %s, 'You', u2.name)",
+}
+
+HISTORY_SQL = '''
+    SELECT {select}
+    FROM (
+        (SELECT t.id FROM transactions t
+         WHERE t.buyer_id = %s AND {keyset}
+         ORDER BY t.transaction_date DESC, t.id DESC
+         LIMIT %s)
+        UNION ALL
+        (SELECT t.id FROM transactions t
+         WHERE t.seller_id = %s AND t.buyer_id != %s AND {keyset}
+         ORDER BY t.transaction_date DESC, t.id DESC
+         LIMIT %s)
+    ) side
+    JOIN transactions t ON t.id = side.id
+    JOIN artworks a ON t.artwork_id = a.id
+    JOIN users u1 ON t.buyer_id = u1.id
+    JOIN users u2 ON t.seller_id = u2.id
+    ORDER BY {order_by}
+    LIMIT %s
+'''
+
+
+def page_for(args):
+    """Page over the history; raises InvalidPageRequest for bad parameters"""
+    return Page(args, FIELDS, sort_field='transaction_date')
+
+
+def history_query(user_id, page):
+    """(sql, params) for one page of the user's history"""
+    keyset_sql, keyset_params = page.keyset()
+    select = page.select_list()
+    sql = HISTORY_SQL.format(select=select, keyset=keyset_sql, order_by=page.order_by())
+    params = ((user_id,) * select.count('%s')
+              + (user_id,) + keyset_params + (page.fetch_size,)
+              + (user_id, user_id) + keyset_params + (page.fetch_size,)
+              + (page.fetch_size,))
+    return sql, params
+
+
+def fetch_page(cursor, user_id, page):
+    """One page of transactions as (rows, next_cursor)"""
+    cursor.execute(*history_query(user_id, page))
+    return page.finish(cursor.fetchall())
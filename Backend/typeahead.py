@@ -0,0 +1,252 @@
+"""
+In-process prefix index behind GET /typeahead.
+
+Every artwork title, artist name and category name is an entry. Each word
+of an entry is indexed under its first one to six characters. The
+posting lists (one set per kind) are sorted arrays of entry numbers.
+Entry numbers are handed out in label order when the index is built, so
+walking a posting gives alphabetical results. Entries added later go at
+the end until the next rebuild. A query leapfrogs through the postings
+of its words, from the shortest one. Only words longer than the key are
+checked against the label itself. MySQL is not involved.
+
+A search stops after `limit` matches. It also stops after MAX_STEPS
+posting steps and returns what it has so far, so a query of several
+common words that almost never occur together cannot stall a keystroke.
+stats() counts how often that happens.
+
+Labels are interned and the postings are array('I'), 4 bytes per entry
+per key. See `python benchmarks.py typeahead` for size and latency at
+1M entries. Each process keeps its own copy. The write handlers update
+it incrementally, and with several workers a periodic rebuild
+(TYPEAHEAD_REFRESH) picks up writes that other processes made.
+"""
+
+import bisect
+import heapq
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+
+log = logging.getLogger(__name__)
+
+KINDS = ('artwork', 'artist', 'category')
+KEY_LENGTH = 6
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Posting steps one search may take; past it, it returns the matches found so far
+MAX_STEPS = int(os.environ.get('TYPEAHEAD_MAX_STEPS', 700))
+
+_WORD = re.compile(r'\w+')
+
+
+def words(text):
+    return _WORD.findall(text.lower())
+
+
+def _intersect(first, others, budget):
+    """Entries of `first` that are in every posting of `others`, ascending"""
+    positions = [0] * len(others)
+    i, end = 0, len(first)
+    while i < end:
+        budget[0] -= 1
+        if budget[0] < 0:
+            return
+        entry = first[i]
+        # Leapfrog: every posting skips ahead to the candidate; a miss becomes the next candidate
+        for n, posting in enumerate(others):
+            position = positions[n] = bisect.bisect_left(posting, entry, positions[n])
+            if position == len(posting):
+                return
+            if posting[position] != entry:
+                i = bisect.bisect_left(first, posting[position], i + 1)
+                break
+        else:
+            i += 1
+            yield entry
+
+
+class TypeaheadIndex:
+    """Prefix index over (kind, id, label) entries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.loaded = False
+        self.built_at = None
+        self._pending = None  # writes seen while a rebuild is running
+        self.searches = 0
+        self.truncated = 0
+
+    def _reset(self):
+        self._kinds = bytearray()      # entry number -> index into KINDS
+        self._ids = array('I')         # entry number -> row id
+        self._labels = []              # entry number -> interned label (None once removed)
+        self._entries = {}             # (kind index, row id) -> entry number
+        self._postings = [{} for _ in KINDS]  # per kind: key -> sorted array('I') of entry numbers
+
+    def _keys(self, label):
+        """Every 1..KEY_LENGTH character prefix of every word"""
+        return {word[:n] for word in words(label) for n in range(1, min(len(word), KEY_LENGTH) + 1)}
+
+    # --- writes ---------------------------------------------------------------
+
+    def _insert(self, kind, row_id, label):
+        key = (kind, row_id)
+        if key in self._entries:
+            self._delete(kind, row_id)
+        # New entries always get the highest number, so postings stay sorted by appending
+        entry = len(self._labels)
+        self._kinds.append(kind)
+        self._ids.append(row_id)
+        self._labels.append(sys.intern(label))
+        self._entries[key] = entry
+        postings = self._postings[kind]
+        for prefix in self._keys(label):
+            posting = postings.get(prefix)
+            if posting is None:
+                posting = postings[prefix] = array('I')
+            posting.append(entry)
+
+    def _delete(self, kind, row_id):
+        entry = self._entries.pop((kind, row_id), None)
+        if entry is None:
+            return
+        postings = self._postings[kind]
+        for prefix in self._keys(self._labels[entry]):
+            posting = postings[prefix]
+            del posting[bisect.bisect_left(posting, entry)]
+            if not posting:
+                del postings[prefix]
+        self._labels[entry] = None  # the slot is reclaimed by the next rebuild
+
+    def add(self, kind, row_id, label):
+        """Add an entry, or replace the label of an existing one"""
+        if not label:
+            return self.remove(kind, row_id)
+        kind = KINDS.index(kind)
+        with self._lock:
+            self._insert(kind, row_id, label)
+            if self._pending is not None:
+                self._pending.append((kind, row_id, label))
+
+    def remove(self, kind, row_id):
+        kind = KINDS.index(kind)
+        with self._lock:
+            self._delete(kind, row_id)
+            if self._pending is not None:
+                self._pending.append((kind, row_id, None))
+
+    def rebuild(self, entries):
+        """Replace the contents with (kind, row_id, label) entries, without blocking searches"""
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = TypeaheadIndex()
+            rows = sorted(((label.lower(), KINDS.index(kind), row_id, label)
+                           for kind, row_id, label in entries if label), key=lambda r: r[0])
+            for _, kind, row_id, label in rows:
+                fresh._insert(kind, row_id, label)
+            del rows
+            with self._lock:
+                # Writes that raced with the load are replayed on top of it
+                for kind, row_id, label in self._pending:
+                    if label is None:
+                        fresh._delete(kind, row_id)
+                    else:
+                        fresh._insert(kind, row_id, label)
+                (self._kinds, self._ids, self._labels, self._entries, self._postings) = (
+                    fresh._kinds, fresh._ids, fresh._labels, fresh._entries, fresh._postings)
+                self.loaded = True
+                self.built_at = time.time()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    # --- reads ----------------------------------------------------------------
+
+    def _matches(self, kind, terms, budget):
+        """Matching entries of one kind, in entry order"""
+        postings = []
+        for prefix in {term[:KEY_LENGTH] for term in terms}:
+            posting = self._postings[kind].get(prefix)
+            if posting is None:
+                return
+            postings.append(posting)
+        postings.sort(key=len)
+        long_terms = [term for term in terms if len(term) > KEY_LENGTH]
+        for entry in _intersect(postings[0], postings[1:], budget):
+            if long_terms:
+                label_words = words(self._labels[entry])
+                if not all(any(word.startswith(term) for word in label_words) for term in long_terms):
+                    continue
+            yield entry
+
+    def search(self, query, kinds=KINDS, limit=DEFAULT_LIMIT):
+        """Up to `limit` entries whose words start with every word of `query`, by label"""
+        terms = words(query)
+        if not terms:
+            return []
+        results = []
+        with self._lock:
+            budget = [MAX_STEPS]  # shared by every kind
+            matches = [self._matches(KINDS.index(kind), terms, budget) for kind in kinds]
+            for entry in heapq.merge(*matches):
+                results.append({'type': KINDS[self._kinds[entry]], 'id': self._ids[entry],
+                                'label': self._labels[entry]})
+                if len(results) >= limit:
+                    break
+            self.searches += 1
+            if budget[0] < 0:
+                self.truncated += 1
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'entries': len(self._entries),
+                'removed_slots': len(self._labels) - len(self._entries),
+                'keys': sum(len(postings) for postings in self._postings),
+                'postings': sum(len(p) for postings in self._postings for p in postings.values()),
+                'built_at': self.built_at,
+                'searches': self.searches,
+                'truncated': self.truncated,
+            }
+
+
+def start_refresh(index, load, interval, build_now=True):
+    """Rebuild `index` from load() now and then every `interval` seconds (0 = only once).
+
+    With build_now=False the first rebuild waits `interval` seconds, for an
+    index that is already built (e.g. inherited from a preloading parent).
+    """
+    if not build_now and interval <= 0:
+        return None
+
+    def run():
+        if not build_now:
+            time.sleep(interval)
+        while True:
+            started = time.perf_counter()
+            try:
+                index.rebuild(load())
+                log.info("Typeahead index built: %s entries in %.1fs", len(index._entries),
+                         time.perf_counter() - started)
+            except Exception as e:
+                log.error("Typeahead index build failed: %s", e)
+            if interval <= 0:
+                return
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='typeahead-refresh', daemon=True)
+    thread.start()
+    return thread
+
+
+def refresh_interval():
+    return float(os.environ.get('TYPEAHEAD_REFRESH', 0))
@@ -1,6 +1,14 @@
 import mysql.connector
+import importlib
+import logging
 import os
+import re
+import sys
 from dotenv import load_dotenv
+import app_logging
+import user_stats
+
+log = logging.getLogger('update_database')
 
 # Load environment variables
 load_dotenv()
@@ -13,99 +21,119 @@ DB_CONFIG = {
     'database': os.environ.get('DB_NAME', 'art_space')
 }
 
-def update_database():
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+def discover_migrations():
+    """All migrations on disk as (version, name, module) tuples, in order"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            version, name = int(match.group(1)), match.group(2)
+            migrations.append((version, name, f'migrations.{filename[:-3]}'))
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return migrations
+
+def applied_versions(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+def update_database(target=None):
+    """Apply every pending migration (up to `target`) in version order"""
     try:
         # Connect to the database
         conn = mysql.connector.connect(**DB_CONFIG)
         cursor = conn.cursor()
-        
-        print("Connected to database successfully!")
-        
-        # Check if status column exists in artworks table
-        cursor.execute("SHOW COLUMNS FROM artworks LIKE 'status'")
-        status_exists = cursor.fetchone()
-        
-        if not status_exists:
-            print("Adding status column to artworks table...")
-            cursor.execute("""
-                ALTER TABLE artworks 
-                ADD COLUMN status ENUM('available', 'sold', 'reserved') DEFAULT 'available'
-            """)
-            print("Status column added successfully!")
-        else:
-            print("Status column already exists in artworks table")
-        
-        # Check if transactions table exists
-        cursor.execute("SHOW TABLES LIKE 'transactions'")
-        transactions_exists = cursor.fetchone()
-        
-        if not transactions_exists:
-            print("Creating transactions table...")
-            cursor.execute("""
-                CREATE TABLE transactions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    buyer_id INT NOT NULL,
-                    seller_id INT NOT NULL,
-                    artwork_id INT NOT NULL,
-                    amount DECIMAL(10,2) NOT NULL,
-                    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status ENUM('pending', 'completed', 'cancelled') DEFAULT 'pending',
-                    payment_method VARCHAR(50),
-                    notes TEXT,
-                    FOREIGN KEY (buyer_id) REFERENCES users(id) ON DELETE CASCADE,
-                    FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE,
-                    FOREIGN KEY (artwork_id) REFERENCES artworks(id) ON DELETE CASCADE
-                )
-            """)
-            print("Transactions table created successfully!")
-        else:
-            print("Transactions table already exists")
-        
-        # Check if artist_portfolios table exists
-        cursor.execute("SHOW TABLES LIKE 'artist_portfolios'")
-        portfolios_exists = cursor.fetchone()
-        
-        if not portfolios_exists:
-            print("Creating artist_portfolios table...")
-            cursor.execute('''
-                CREATE TABLE artist_portfolios (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    artist_id INT NOT NULL,
-                    title VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    image_url VARCHAR(500),
-                    external_link VARCHAR(500),
-                    portfolio_type ENUM('gallery', 'exhibition', 'award', 'publication') DEFAULT 'gallery',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (artist_id) REFERENCES artists(id) ON DELETE CASCADE
-                )
-            ''')
-            print("Artist portfolios table created successfully!")
-        else:
-            print("Artist portfolios table already exists")
-            
-            # Check if external_link column exists
-            cursor.execute("SHOW COLUMNS FROM artist_portfolios LIKE 'external_link'")
-            external_link_exists = cursor.fetchone()
-            
-            if not external_link_exists:
-                print("Adding external_link column to artist_portfolios table...")
-                cursor.execute("ALTER TABLE artist_portfolios ADD COLUMN external_link VARCHAR(500)")
-                print("external_link column added successfully!")
-            else:
-                print("external_link column already exists")
-        
-        # Update existing artworks to have 'available' status
-        cursor.execute("UPDATE artworks SET status = 'available' WHERE status IS NULL")
-        print("Updated existing artworks with 'available' status")
-        
+
+        log.info("Connected to database successfully!")
+
+        applied = applied_versions(cursor)
+        pending = [m for m in discover_migrations()
+                   if m[0] not in applied and (target is None or m[0] <= target)]
+
+        if not pending:
+            log.info("Database is up to date")
+
+        for version, name, module in pending:
+            log.info("Applying migration %04d_%s...", version, name)
+            importlib.import_module(module).upgrade(cursor)
+            cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                           (version, name))
+            conn.commit()
+            log.info("Migration %04d_%s applied successfully!", version, name)
+
+        log.info("Database update completed successfully!")
+        return True
+
+    except Exception as e:
+        log.exception("Error updating database: %s", e)
+        return False
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+def migration_status():
+    """Print which migrations are applied and which are pending"""
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        applied = applied_versions(cursor)
+        conn.commit()
+        for version, name, _ in discover_migrations():
+            state = 'applied' if version in applied else 'pending'
+            print(f"{version:04d}_{name}: {state}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+def reconcile_user_stats(user_id=None):
+    """Rebuild user_stats counters from the base tables"""
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        target = f"user {user_id}" if user_id is not None else "all users"
+        log.info("Reconciling user_stats for %s...", target)
+        cursor.execute(user_stats.CREATE_TABLE_SQL)
+        user_stats.reconcile(cursor, user_id)
         conn.commit()
-        print("Database update completed successfully!")
-        
+        log.info("user_stats reconciled successfully!")
+
     except Exception as e:
-        print(f"Error updating database: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error reconciling user_stats: %s", e)
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+def check_query_plans(min_rows=100):
+    """EXPLAIN the hot queries; False if any regressed to a full scan or filesort"""
+    import query_plans
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(dictionary=True)
+        log.info("Checking query plans...")
+        failures = query_plans.check_plans(cursor, min_rows)
+        if failures:
+            log.error("%s hot queries regressed", len(failures))
+        else:
+            log.info("All hot queries use indexes")
+        return not failures
     finally:
         if 'cursor' in locals():
             cursor.close()
@@ -113,4 +141,18 @@ def update_database():
             conn.close()
 
 if __name__ == "__main__":
-    update_database() 
\ No newline at end of file
+    # python update_database.py [migrate [version] | status | reconcile-stats [user_id] | check-plans [min_rows]]
+    app_logging.configure()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    argument = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    if command == 'migrate':
+        sys.exit(0 if update_database(argument) else 1)
+    elif command == 'status':
+        migration_status()
+    elif command == 'reconcile-stats':
+        reconcile_user_stats(argument)
+    elif command == 'check-plans':
+        sys.exit(0 if check_query_plans(100 if argument is None else argument) else 1)
+    else:
+        log.error("Unknown command: %s", command)
+        sys.exit(2)
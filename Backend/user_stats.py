@@ -0,0 +1,98 @@
+"""
+Per-user rollup counters in the `user_stats` table.
+
+Write handlers call apply_delta() inside their own transaction so the
+counters commit or roll back together with the row they describe;
+reconcile() rebuilds them from the base tables.
+"""
+
+from decimal import Decimal
+
+COUNTERS = ('category_count', 'artist_count', 'artwork_count',
+            'total_value', 'sales_count', 'total_earnings')
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INT NOT NULL PRIMARY KEY,
+        category_count INT NOT NULL DEFAULT 0,
+        artist_count INT NOT NULL DEFAULT 0,
+        artwork_count INT NOT NULL DEFAULT 0,
+        total_value DECIMAL(14,2) NOT NULL DEFAULT 0,
+        sales_count INT NOT NULL DEFAULT 0,
+        total_earnings DECIMAL(14,2) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+'''
+
+RECONCILE_SQL = '''
+    INSERT INTO user_stats (user_id, category_count, artist_count, artwork_count,
+                            total_value, sales_count, total_earnings)
+    SELECT u.id,
+           (SELECT COUNT(*) FROM categories WHERE created_by = u.id),
+           (SELECT COUNT(*) FROM artists WHERE created_by = u.id),
+           (SELECT COUNT(*) FROM artworks WHERE created_by = u.id),
+           (SELECT COALESCE(SUM(price), 0) FROM artworks WHERE created_by = u.id),
+           (SELECT COUNT(*) FROM transactions t JOIN artworks a ON t.artwork_id = a.id
+            WHERE a.created_by = u.id AND t.status = 'completed'),
+           (SELECT COALESCE(SUM(t.amount), 0) FROM transactions t JOIN artworks a ON t.artwork_id = a.id
+            WHERE a.created_by = u.id AND t.status = 'completed')
+    FROM users u
+    {where}
+    ON DUPLICATE KEY UPDATE
+        category_count = VALUES(category_count),
+        artist_count = VALUES(artist_count),
+        artwork_count = VALUES(artwork_count),
+        total_value = VALUES(total_value),
+        sales_count = VALUES(sales_count),
+        total_earnings = VALUES(total_earnings)
+'''
+
+
+def as_amount(value):
+    """Request price/amount as a Decimal, treating missing values as 0"""
+    if value is None or value == '':
+        return Decimal(0)
+    return Decimal(str(value))
+
+
+def apply_delta(cursor, user_id, **deltas):
+    """Add deltas to a user's counters, creating the row on first write"""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if user_id is None or not deltas:
+        return
+    for name in deltas:
+        if name not in COUNTERS:
+            raise ValueError(f'Unknown user_stats counter: {name}')
+    columns = ', '.join(deltas)
+    placeholders = ', '.join(['%s'] * len(deltas))
+    updates = ', '.join(f'{name} = {name} + VALUES({name})' for name in deltas)
+    cursor.execute(
+        f'INSERT INTO user_stats (user_id, {columns}) VALUES (%s, {placeholders}) '
+        f'ON DUPLICATE KEY UPDATE {updates}',
+        (user_id, *deltas.values())
+    )
+
+
+def lock_artwork(cursor, artwork_id):
+    """(created_by, price) of an artwork, row-locked for the rest of the transaction"""
+    cursor.execute('SELECT created_by, price FROM artworks WHERE id = %s FOR UPDATE', (artwork_id,))
+    return cursor.fetchone()
+
+
+def artwork_sales(cursor, artwork_id):
+    """(count, total) of completed sales that cascade away with an artwork"""
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM transactions
+        WHERE artwork_id = %s AND status = 'completed'
+    ''', (artwork_id,))
+    return cursor.fetchone()
+
+
+def reconcile(cursor, user_id=None):
+    """Recompute counters from the base tables for one user, or everyone"""
+    if user_id is None:
+        cursor.execute(RECONCILE_SQL.format(where=''))
+    else:
+        cursor.execute(RECONCILE_SQL.format(where='WHERE u.id = %s'), (user_id,))
+    return cursor.rowcount